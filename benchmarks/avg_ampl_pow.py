@@ -0,0 +1,89 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Micro-benchmark comparing the previous row-by-row implementation of `avg_ampl_pow`
+with the vectorised implementation in `maths.num_utils`.
+
+Usage:
+    python benchmarks/avg_ampl_pow.py [rows] [columns]
+
+The default size (500 x 1e6) requires roughly 4GB of memory for the input array.
+"""
+import os
+import sys
+import warnings
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from maths.num_utils import avg_ampl_pow
+
+
+def avg_ampl_pow_loop(amplitude):
+    """The previous implementation, which loops over each row."""
+    length = len(amplitude)
+
+    avg_ampl = np.empty(length, dtype=np.float64)
+    avg_pow = np.empty(length, dtype=np.float64)
+
+    for i in range(length):
+        arr = amplitude[i]
+        row = arr[np.isfinite(arr)]
+
+        avg_ampl[i] = np.mean(row)
+        avg_pow[i] = np.mean(np.square(row))
+
+    return avg_ampl, avg_pow
+
+
+def main():
+    rows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 500
+    cols = int(float(sys.argv[2])) if len(sys.argv) > 2 else int(1e6)
+
+    # Fill row-by-row, to avoid temporary copies of the whole array.
+    amplitude = np.empty((rows, cols), dtype=np.float64)
+    for i in range(rows):
+        amplitude[i] = np.abs(np.random.randn(cols))
+
+    # NaNs at the edges, like the cone of influence of a wavelet transform.
+    edge = cols // 10
+    amplitude[:, :edge] = np.nan
+    amplitude[:, -edge:] = np.nan
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+
+        start = timer()
+        expected = avg_ampl_pow_loop(amplitude)
+        t_loop = timer() - start
+
+    start = timer()
+    result = avg_ampl_pow(amplitude)
+    t_vec = timer() - start
+
+    for a, b in zip(expected, result):
+        assert np.allclose(a, b, equal_nan=True)
+
+    print(f"Array size: {rows} x {cols}")
+    print(f"Loop:       {t_loop:.2f} seconds")
+    print(f"Vectorised: {t_vec:.2f} seconds")
+    print(f"Speedup:    x{t_loop / t_vec:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark comparing the previous implementation of `fcast` (predictive padding), which
+searches for each frequency with one least-squares fit per trial frequency, with the
+vectorised implementation in `maths.algorithms.windowed_fourier`.
+
+Usage:
+    python benchmarks/fcast.py [length] [padding]
+"""
+
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from maths.algorithms.windowed_fourier import fcast
+
+
+def fcast_loop(sig, fs, NP, fint, *args):
+    """The previous implementation, with one least-squares fit per trial frequency."""
+    NP = int(NP)
+    sig = np.asarray(sig, dtype=np.float64)
+
+    MaxOrder = len(sig)
+    if len(args) > 0:
+        MaxOrder = args[0] or MaxOrder
+
+    w = np.ones(len(sig))
+    if len(args) > 1 and args[1] is not None:
+        w = np.asarray(args[1], dtype=np.float64)
+
+    rw = np.sqrt(w)
+    Y = rw * sig
+
+    # Samples with negligible weight are ignored.
+    WTol = 1e-8
+    L = int(np.count_nonzero(rw / np.max(rw) >= WTol))
+    T = L / fs
+    t = np.arange(L) / fs
+
+    rw = rw[-L:]
+    Y = Y[-L:]
+
+    MaxOrder = int(min(MaxOrder, np.floor(L / 3)))
+
+    FTol = 0.01 / T  # Accuracy of the frequencies.
+    rr = (1 + np.sqrt(5)) / 2  # Golden ratio, for the golden-section search.
+    eps = np.finfo(np.float64).eps
+
+    Nq = int(np.ceil((L + 1) / 2))
+    ftfr = np.concatenate((np.arange(Nq), -np.arange(L - Nq, 0, -1))) * fs / L
+    orstd = np.std(Y)
+
+    def fit(f):
+        FM = np.stack(
+            (np.ones(L), np.cos(2 * np.pi * f * t), np.sin(2 * np.pi * f * t)), axis=1
+        )
+        FM *= rw[:, None]
+
+        b = np.linalg.lstsq(FM, Y, rcond=None)[0]
+        return b, np.std(Y - FM @ b), FM
+
+    def search(f, step, stop):
+        """
+        Searches for the minimum error starting from frequency f, in the direction of
+        `step` (positive or negative), without passing `stop`.
+        """
+        nb, nerr, _ = fit(f)
+        nf, df = f, step
+        pf, perr, pb = nf, np.inf, nb
+
+        while nerr < perr:
+            if abs(nf - stop) < eps:
+                break
+
+            pf, perr, pb = nf, nerr, nb
+            nf = min(pf + df, stop) if step > 0 else max(pf + df, stop)
+            nb, nerr, _ = fit(nf)
+            df *= rr
+
+        if nerr < perr:
+            return nf, nb, nerr
+        if abs(abs(nf - pf) - FTol) < eps:
+            return pf, pb, perr
+
+        # Golden-section search within the bracket around pf. Each point is
+        # (frequency, coefficients, error), ordered by frequency.
+        cf = pf - df / rr ** 2
+        points = sorted(
+            [(cf, *fit(cf)[:2]), (pf, pb, perr), (nf, nb, nerr)], key=lambda p: p[0]
+        )
+        (f1, b1, e1), (f2, b2, e2), (f3, b3, e3) = points
+
+        while f2 - f1 > FTol and f3 - f2 > FTol:
+            tf = f1 + f3 - f2
+            tb, terr, _ = fit(tf)
+            new = (tf, tb, terr)
+
+            if terr < e2:
+                # The new point is the best so far, so it becomes the middle.
+                points = (
+                    [points[0], new, points[1]]
+                    if tf < f2
+                    else [points[1], new, points[2]]
+                )
+            else:
+                # The new point replaces the outer point on its side.
+                points = (
+                    [new, points[1], points[2]]
+                    if tf < f2
+                    else [points[0], points[1], new]
+                )
+
+            (f1, b1, e1), (f2, b2, e2), (f3, b3, e3) = points
+
+        return f2, b2, e2
+
+    # The first component is the constant term, which accumulates each fit's offset.
+    frq, amp, phi = [0.0], [0.0], [0.0]
+    ic = []
+
+    for itn in range(1, MaxOrder + 1):
+        aftsig = np.abs(np.fft.fft(Y))
+        imax = np.argmax(aftsig[1:Nq]) + 1
+
+        forward = search(ftfr[imax], FTol, fs / 2 - FTol)
+        backward = search(ftfr[imax], -FTol, FTol)
+        cf, cb, cerr = forward if forward[2] < backward[2] else backward
+
+        frq.append(cf)
+        amp.append(np.sqrt(cb[1] ** 2 + cb[2] ** 2))
+        phi.append(np.arctan2(-cb[2], cb[1]))
+        amp[0] += cb[0]
+
+        Y = Y - fit(cf)[2] @ cb
+
+        # Bayesian information criterion.
+        ic.append(L * np.log(cerr) + (3 * itn + 1) * np.log(L))
+
+        if cerr / orstd < 2 * eps:
+            break
+        if itn > 2 and ic[-1] > ic[-2] > ic[-3]:
+            break
+
+    nt = T + np.arange(NP) / fs
+
+    fsig = np.zeros(NP)
+    for f, a, p in zip(frq, amp, phi):
+        if fint[0] < f < fint[1]:
+            fsig += a * np.cos(2 * np.pi * f * nt + p)
+        else:
+            fsig += a * np.cos(2 * np.pi * f * (T - 1 / fs) + p)
+
+    return fsig
+
+
+def main():
+    L = int(float(sys.argv[1])) if len(sys.argv) > 1 else int(1e5)
+    NP = int(float(sys.argv[2])) if len(sys.argv) > 2 else 1000
+
+    fs = 100
+    t = np.arange(L) / fs
+    rng = np.random.default_rng(0)
+
+    signals = {
+        "sines": np.sin(2 * np.pi * 1.3 * t) + 0.5 * np.cos(2 * np.pi * 4.71 * t + 1),
+        "sines + noise": np.sin(2 * np.pi * 1.3 * t) + 0.3 * rng.standard_normal(L),
+    }
+
+    # Weights as used by the WFT with the Gaussian window (f0 = 1), which emphasise the end
+    # of the signal; and no weights, so that all L samples are fitted.
+    weights = {
+        "weighted": 2 ** (-(L / fs - np.arange(1, L + 1) / fs) / 1.35),
+        "unweighted": None,
+    }
+
+    print(f"Signals of {L} samples, predicting {NP} samples")
+
+    for name, sig in signals.items():
+        for wname, w in weights.items():
+            args = (20, w)
+            fint = (fs / L, fs / 2)
+
+            start = timer()
+            expected = fcast_loop(sig, fs, NP, fint, *args)
+            t_loop = timer() - start
+
+            start = timer()
+            result = fcast(sig, fs, NP, fint, *args)
+            t_vec = timer() - start
+
+            diff = np.max(np.abs(result - expected)) / np.std(sig)
+
+            print(
+                f"{name:>14}, {wname:>10}: loop {t_loop:6.2f}s, vectorised {t_vec:6.2f}s, "
+                f"speedup x{t_loop / t_vec:.1f}, max relative difference {diff:.1e}"
+            )
+
+
+if __name__ == "__main__":
+    main()
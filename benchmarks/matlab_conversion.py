@@ -0,0 +1,94 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark comparing the previous conversions between numpy and MATLAB arrays (via Python
+lists) with `numpy_to_matlab` and `matlab_to_numpy` in `maths.num_utils`.
+
+Requires the MATLAB Runtime, with the `matlab` package importable.
+
+Usage:
+    python benchmarks/matlab_conversion.py [rows] [columns]
+
+By default, a real array of 1e6 elements and a complex array of 500 x 1e5 elements are
+converted. The complex array uses about 800MB, and the previous conversion needs several
+times more.
+"""
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from maths.num_utils import matlab_to_numpy, numpy_to_matlab
+
+
+def previous_to_matlab(arr):
+    import matlab
+
+    if arr.ndim < 2:
+        arr = arr.reshape(1, -1)
+
+    return matlab.double(arr.tolist(), is_complex=np.iscomplexobj(arr))
+
+
+def previous_to_numpy(arr):
+    try:
+        return np.array(arr._data).reshape(arr.size, order="F")
+    except:
+        return np.array(arr)
+
+
+def run(name, arr):
+    start = timer()
+    m = previous_to_matlab(arr)
+    t_to_old = timer() - start
+
+    start = timer()
+    previous_to_numpy(m)
+    t_from_old = timer() - start
+    del m
+
+    start = timer()
+    m = numpy_to_matlab(arr)
+    t_to = timer() - start
+
+    start = timer()
+    result = matlab_to_numpy(m)
+    t_from = timer() - start
+
+    assert np.array_equal(result, arr.reshape(result.shape))
+
+    print(
+        f"{name}: to MATLAB {t_to_old:.2f}s -> {t_to:.2f}s, "
+        f"to numpy {t_from_old:.2f}s -> {t_from:.2f}s"
+    )
+
+
+def main():
+    rows = int(float(sys.argv[1])) if len(sys.argv) > 1 else 500
+    cols = int(float(sys.argv[2])) if len(sys.argv) > 2 else int(1e5)
+
+    run("1e6 real", np.random.rand(int(1e6)))
+    run(
+        f"{rows} x {cols} complex",
+        np.random.rand(rows, cols) + 1j * np.random.rand(rows, cols),
+    )
+
+
+if __name__ == "__main__":
+    main()
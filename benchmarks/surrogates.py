@@ -0,0 +1,201 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark comparing the previous per-surrogate loops in `surrogate_calc` with the
+batched implementation in `maths.algorithms.surrogates`.
+
+Usage:
+    python benchmarks/surrogates.py [surrogates] [length] [methods...]
+
+At the default size (1000 surrogates of 1e5 samples), the previous AAFT implementation
+needs more than 5GB of memory; the batched implementation needs about 1GB.
+"""
+import os
+import random
+import sys
+import warnings
+from timeit import default_timer as timer
+
+import numpy as np
+from numpy.random import permutation as randperm
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from maths.algorithms.surrogates import surrogate_calc
+
+
+def rp_loop(sig, N):
+    L = len(sig)
+    surr = np.empty((N, L))
+
+    for k in range(N):
+        surr[k, :] = sig[randperm(L)]
+
+    return surr
+
+
+def ft_loop(sig, N):
+    """The previous implementation, with the FFT of the N x L matrix along axis 0."""
+    L = len(sig)
+    L2 = int(np.ceil(L / 2))
+
+    eta = 2 * np.pi * np.random.rand(N, L2 - 1)
+
+    ftsig = np.fft.fft(sig, axis=0)
+    ftrp = np.zeros((N, len(ftsig)), dtype=np.complex64)
+    ftrp[:, 0] = ftsig[0]
+
+    F = np.tile(ftsig[1:L2], (N, 1))
+
+    ftrp[:, 1:L2] = F * np.exp(1j * eta)
+    ftrp[:, 1 + L - L2 : L] = np.conj(np.fliplr(ftrp[:, 1:L2]))
+
+    return np.real(np.fft.ifft(ftrp, axis=0))
+
+
+def aaft_loop(sig, N):
+    L = len(sig)
+    L2 = int(np.ceil(L / 2))
+    eta = 2 * np.pi * np.random.rand(N, L2 - 1)
+
+    val = np.sort(sig)
+    ind = np.argsort(sig)
+    rankind = np.empty(ind.shape, dtype=int)
+    rankind[ind] = np.arange(0, L)
+
+    gn = np.sort(np.random.randn(N, L), 1)
+    for j in range(N):
+        gn[j, :] = gn[j, rankind]
+
+    ftgn = np.fft.fft(gn, axis=0)
+    F = ftgn[:, 1:L2]
+
+    surr = np.zeros((N, L), dtype=complex)
+    surr[:, 0] = gn[:, 0]
+    surr[:, 1:L2] = np.multiply(F, np.exp(1j * eta))
+    surr[:, 1 + L - L2 : L] = np.conj(np.fliplr(surr[:, 1:L2]))
+    surr = np.fft.ifft(surr, axis=0)
+
+    ind2 = np.argsort(surr, axis=1)
+    rrank = np.zeros((1, L), dtype=int)
+    for k in range(N):
+        rrank[:, ind2[k, :]] = np.arange(0, L)
+        surr[k, :] = val[rrank]
+
+    return np.real(surr)
+
+
+def tshift_loop(sig, N):
+    L = len(sig)
+    surr = np.empty((N, L))
+
+    for sn in range(N):
+        startp = random.randint(1, L - 1)
+        surr[sn, :] = np.hstack([sig[startp:L], sig[:startp]])
+
+    return surr
+
+
+def cpp_loop(sig, N):
+    L = len(sig)
+    surr = np.empty((N, L))
+
+    signal = np.mod(sig, 2 * np.pi)
+    dcpoints = ((signal[1:] - signal[:-1]) < -np.pi).nonzero()[0]
+    NC = len(dcpoints) - 1
+
+    cycles = [signal[dcpoints[k] : dcpoints[k + 1]] for k in range(NC)]
+    stcycle = signal[: dcpoints[0]]
+    endcycle = signal[dcpoints[NC] :]
+
+    for sn in range(N):
+        rand_cycles = [cycles[i] for i in randperm(NC)]
+        surr[sn, :] = np.unwrap(np.concatenate((stcycle, *rand_cycles, endcycle)))
+
+    return surr
+
+
+loops = {
+    "RP": rp_loop,
+    "FT": ft_loop,
+    "AAFT": aaft_loop,
+    "tshift": tshift_loop,
+    "CPP": cpp_loop,
+}
+
+
+def check(method, sig, surr):
+    """Checks properties which every surrogate of the given type must have."""
+    if method in ("RP", "AAFT"):
+        # Same values as the signal, in a different order.
+        assert np.allclose(np.sort(surr, axis=1), np.sort(sig))
+
+    elif method == "FT":
+        # Same amplitude spectrum as the signal, apart from the Nyquist term.
+        L2 = int(np.ceil(len(sig) / 2))
+        expected = np.abs(np.fft.rfft(sig))[:L2]
+        assert np.allclose(np.abs(np.fft.rfft(surr, axis=1))[:, :L2], expected)
+
+    elif method == "tshift":
+        assert np.allclose(np.sort(surr, axis=1), np.sort(sig))
+
+    elif method == "CPP":
+        # Unwrapping only adds multiples of 2pi, so the wrapped phases are unchanged.
+        wrapped = np.sort(np.mod(surr, 2 * np.pi), axis=1)
+        assert np.allclose(wrapped, np.sort(np.mod(sig, 2 * np.pi)), atol=1e-6)
+
+
+def main():
+    N = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1000
+    L = int(float(sys.argv[2])) if len(sys.argv) > 2 else int(1e5)
+    methods = sys.argv[3:] or list(loops.keys())
+
+    fs = 100
+    t = np.arange(L) / fs
+    noise = np.random.randn(L)
+
+    print(f"{N} surrogates of {L} samples")
+
+    for method in methods:
+        if method == "CPP":
+            # A phase signal, with cycles of varying length.
+            sig = np.cumsum(2 * np.pi * (1 + 0.2 * np.sin(0.1 * t)) / fs)
+        else:
+            sig = np.sin(2 * np.pi * t) + noise
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+
+            start = timer()
+            loops[method](sig, N)
+            t_loop = timer() - start
+
+        start = timer()
+        surr, _ = surrogate_calc(sig, N, method, False, fs, seed=0)
+        t_vec = timer() - start
+
+        check(method, sig, surr)
+
+        print(
+            f"{method:>6}: loop {t_loop:6.2f}s, batched {t_vec:6.2f}s, "
+            f"speedup x{t_loop / t_vec:.1f}"
+        )
+
+        del surr
+
+
+if __name__ == "__main__":
+    main()
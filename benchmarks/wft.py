@@ -0,0 +1,129 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Benchmark comparing the windowed Fourier transform in `maths.algorithms.windowed_fourier`,
+which selects frequencies with boolean masks, with the same transform when the frequencies
+are selected with `matlab_utils.find` (as in the original port), which calls a Python
+function for each element.
+
+Usage:
+    python benchmarks/wft.py [log2(length)]
+"""
+
+import contextlib
+import io
+import os
+import sys
+from timeit import default_timer as timer
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from maths.algorithms import windowed_fourier as wf
+from maths.algorithms.matlab_utils import find
+
+
+def wft_find(signal, fs, fmin, fmax, f0=1, window=wf.gaussian, rel_tol=0.01):
+    """The transform calculated by `wft`, with every frequency selection using `find`."""
+    L = len(signal)
+    wp = wf.parcalc(wf.window_functions(window, f0), rel_tol)
+
+    fstep = wf._round_down(wp.xi_h / (10 * np.pi))
+    freq = np.arange(np.ceil(fmin / fstep), np.floor(fmax / fstep) + 1) * fstep
+    SN = len(freq)
+
+    # Pre-processing, as in `_preprocess`.
+    X = np.arange(1, L + 1) / fs
+    XM = np.ones((L, 4), dtype=np.float64)
+    for pn in range(1, 4):
+        CX = X ** pn
+        XM[:, pn] = (CX - np.mean(CX)) / np.std(CX)
+
+    signal = signal - XM @ np.linalg.lstsq(XM, signal, rcond=None)[0]
+    fx = np.fft.fft(signal)
+    ff = np.abs(np.fft.fftfreq(L, 1 / fs))
+    fx[find(ff, lambda i: i <= max(fmin, fs / L) or i >= fmax)] = 0
+    signal = np.real(np.fft.ifft(fx))
+
+    coib = int(np.ceil(abs(wp.t_e * fs)))
+    NL = int(2 ** np.ceil(np.log2(L + 2 * coib)))
+    n1 = (NL - L) // 2
+    n2 = NL - L - n1
+
+    w = 2 ** (-(L / fs - np.arange(1, L + 1) / fs) / (2 * wp.t_h))
+    fint = (max(fmin, fs / L), fmax)
+    order = min(np.ceil(SN / 2) + 5, np.round(L / 3))
+    padleft = wf.fcast(signal[::-1], fs, n1, fint, order, w)[::-1]
+    padright = wf.fcast(signal, fs, n2, fint, order, w)
+    padded = np.concatenate((padleft, signal, padright))
+
+    Nq = int(np.ceil((NL + 1) / 2))
+    ff = np.concatenate((np.arange(Nq), -np.arange(NL - Nq, 0, -1))) * fs / NL
+
+    fx = np.fft.fft(padded)
+    fx[find(ff, lambda i: i <= max(fmin, fs / L) or i >= fmax)] = 0
+
+    transform = np.empty((SN, L), dtype=np.complex128)
+    block = max(1, wf._block_elements // NL)
+    df = wp.xi_max / (2 * np.pi)
+
+    for start in range(0, SN, block):
+        rows = slice(start, min(SN, start + block))
+        lo, hi = freq[rows][0] - df, freq[rows][-1] + df
+        used = find(ff, lambda i: lo < i < hi)
+
+        fw = wp.fwt(2 * np.pi * (freq[rows, None] - ff[None, used]))
+        fw[~np.isfinite(fw)] = 0
+
+        spectrum = np.zeros((len(freq[rows]), NL), dtype=np.complex128)
+        spectrum[:, used] = fx[used] * fw
+
+        transform[rows] = np.fft.ifft(spectrum, axis=1)[:, n1 : n1 + L]
+
+    return transform, freq
+
+
+def main():
+    L = 2 ** int(sys.argv[1]) if len(sys.argv) > 1 else 2 ** 20
+
+    fs = 100
+    fmin, fmax = 0.5, 1.5
+    t = np.arange(L) / fs
+    rng = np.random.default_rng(0)
+    signal = np.sin(2 * np.pi * t) + 0.5 * rng.standard_normal(L)
+
+    print(f"Signal of {L} samples, frequencies {fmin}-{fmax} Hz, Gaussian window")
+
+    start = timer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        expected, _ = wft_find(signal, fs, fmin, fmax)
+    t_find = timer() - start
+
+    start = timer()
+    result, freq = wf.wft(signal, fs, fmin, fmax)
+    t_mask = timer() - start
+
+    diff = np.max(np.abs(result - expected)) / np.max(np.abs(expected))
+
+    print(
+        f"{len(freq)} frequencies: find {t_find:.2f}s, boolean masks {t_mask:.2f}s, "
+        f"speedup x{t_find / t_mask:.1f}, max relative difference {diff:.1e}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,7 +14,7 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
 import asyncio
-from typing import Tuple, Union, Dict, List
+from typing import Tuple, Union, Dict, List, Optional
 
 import numpy as np
 from PyQt5.QtWidgets import QListWidgetItem
@@ -27,6 +27,7 @@ from maths.signals.SignalPairs import SignalPairs
 from maths.signals.TimeSeries import TimeSeries
 from maths.signals.data.BAOutputData import BAOutputData
 from processes.MPHandler import MPHandler
+from utils import args
 from utils.decorators import override
 from utils.dict_utils import sanitise
 
@@ -70,6 +71,11 @@ class BAPresenter(BaseTFPresenter):
         for d in data:
             self.on_bispectrum_completed(*d)
 
+        grid = args.biphase_grid()
+        if data and grid > 0 and self.params.implementation == "python":
+            # Biphases at the frequencies of the transform can be calculated in one batch.
+            await self.coro_calculate_biphases(self.biphase_grid_points(grid))
+
         self.enable_save_data(True)
 
         self.view.on_calculate_stopped()
@@ -83,24 +89,74 @@ class BAPresenter(BaseTFPresenter):
         self.enable_save_data(False)
         self.mp_handler.stop()
 
-        fs = self.params.fs
-        f0 = self.params.f0
         fr = self.view.get_selected_freq_pair()
         x, y = fr
 
         if x is not None and y is not None:
-            data = await self.mp_handler.coro_biphase(
-                self.signals, fs, f0, fr, self.on_progress_updated
-            )
-
-            for d in data:
-                self.on_biphase_completed(*d)
+            if not self.use_precalculated_biphase(fr):
+                await self.coro_calculate_biphases([fr])
 
             self.enable_save_data(True)
 
             self.view.on_calculate_stopped()
             self.update_side_plots(self.get_selected_signal_pair()[0].output_data)
 
+    async def coro_calculate_biphases(self, points: List[Tuple[float, float]]):
+        """
+        Calculates the biphase and biamplitude of every signal pair at several points.
+
+        :param points: the 'x' and 'y' frequencies of each point
+        """
+        data = await self.mp_handler.coro_biphase(
+            self.signals, self.params, points, self.on_progress_updated
+        )
+
+        for d in data:
+            self.on_biphase_completed(*d)
+
+    def biphase_grid_points(self, size: int) -> List[Tuple[float, float]]:
+        """
+        Returns a grid of points at the frequencies of the wavelet transform, whose biphase
+        can be calculated after the bispectra.
+
+        :param size: the number of frequencies on each axis
+        :return: the 'x' and 'y' frequencies of each point
+        """
+        freq = self.get_selected_signal_pair()[0].output_data.freq
+        index = np.unique(np.round(np.linspace(0, len(freq) - 1, size)).astype(int))
+
+        grid = [float(f) for f in freq[index]]
+        return [(x, y) for x in grid for y in grid if x + y <= freq[-1]]
+
+    def use_precalculated_biphase(self, fr: Tuple[float, float]) -> bool:
+        """
+        Uses a biphase from the precalculated grid if it is identical to the biphase at
+        the selected frequencies. With the Python implementation, this is the case when
+        both frequencies are nearest to the same frequencies of the wavelet transform.
+
+        :param fr: the selected 'x' and 'y' frequencies
+        :return: whether a precalculated biphase was used
+        """
+        if self.params.implementation != "python":
+            return False
+
+        key = ", ".join([str(f) for f in fr])
+        for s, _ in self.signals.get_pairs():
+            data = s.output_data
+            if key in data.biamp:
+                continue
+
+            x, y = [float(data.freq[np.argmin(np.abs(data.freq - f))]) for f in fr]
+            grid_key = f"{x}, {y}"
+
+            if grid_key not in data.biamp:
+                return False
+
+            data.biamp[key] = data.biamp[grid_key]
+            data.biphase[key] = data.biphase[grid_key]
+
+        return True
+
     def update_plots(self):
         """
         Updates all plots according to the currently selected plot type and current data.
@@ -299,13 +355,13 @@ class BAPresenter(BaseTFPresenter):
     ) -> Tuple[ndarray, ndarray, ndarray, bool]:
         fx, fy, bisp, b = tup
 
-        K = np.int(np.floor((self.params.surr_count + 1) * self.params.alpha))
+        # The significance threshold is calculated from the surrogates during the analysis.
         surr = {
-            "b111": data.surrxxx,
-            "b222": data.surrppp,
-            "b122": data.surrxpp,
-            "b211": data.surrpxx,
-        }.get(plot_type)[:, :, K]
+            "b111": data.thrxxx,
+            "b222": data.thrppp,
+            "b122": data.thrxpp,
+            "b211": data.thrpxx,
+        }.get(plot_type)
 
         bisp = bisp.copy()
 
@@ -330,11 +386,12 @@ class BAPresenter(BaseTFPresenter):
         bispppp: ndarray,
         bispxpp: ndarray,
         bisppxx: ndarray,
-        surrxxx: ndarray,
-        surrppp: ndarray,
-        surrxpp: ndarray,
-        surrpxx: ndarray,
+        thrxxx: ndarray,
+        thrppp: ndarray,
+        thrxpp: ndarray,
+        thrpxx: ndarray,
         opt: Dict,
+        surrogates: Optional[Tuple[ndarray, ndarray, ndarray, ndarray]] = None,
     ) -> None:
         self.opt: Dict = opt
 
@@ -356,13 +413,14 @@ class BAPresenter(BaseTFPresenter):
             bispppp,
             bispxpp,
             bisppxx,
-            surrxxx,
-            surrppp,
-            surrxpp,
-            surrpxx,
+            thrxxx,
+            thrppp,
+            thrxpp,
+            thrpxx,
             opt,
             {},
             {},
+            surrogates,
         )
 
     def on_biphase_completed(
@@ -453,6 +511,14 @@ class BAPresenter(BaseTFPresenter):
             "preprocessing": "on" if self.params.preprocess else "off",
             "sampling_frequency": self.params.fs,
         }
+
+        if all(d.surrogates is not None for d in output_data):
+            # The surrogate bispectra are only kept when `keep_surrogates` is set in the params.
+            for i, key in enumerate(("b111", "b222", "b122", "b211")):
+                ba_data[f"{key}_surrogates"] = np.stack(
+                    [d.surrogates[i] for d in output_data], axis=-1
+                )
+
         return {"BAData": sanitise(ba_data)}
 
     def load_data(self):
@@ -511,4 +577,7 @@ class BAPresenter(BaseTFPresenter):
             surr_count=self.view.get_surr_count(),
             alpha=self.view.get_alpha(),
             opt={},
+            surr_seed=args.surr_seed(),
+            implementation="python" if args.python_wt() else "matlab",
+            keep_surrogates=args.keep_surrogates(),
         )
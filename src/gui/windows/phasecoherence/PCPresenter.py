@@ -27,6 +27,7 @@ from maths.signals.SignalPairs import SignalPairs
 from maths.signals.TimeSeries import TimeSeries
 from maths.signals.data.TFOutputData import TFOutputData
 from processes.MPHandler import MPHandler
+from utils import args
 from utils.decorators import override
 from utils.dict_utils import sanitise
 
@@ -94,21 +95,17 @@ class PCPresenter(BaseTFPresenter):
         print("Finished wavelet transform. Calculating phase coherence...")
         return await self.mp_handler.coro_phase_coherence(signals, params, on_progress)
 
-    def on_transform_completed(
-        self, name, times, freq, values, ampl, powers, avg_ampl, avg_pow, opt=None
-    ) -> None:
+    def on_transform_completed(self, name, times, freq, values, opt=None) -> None:
         print(f"Calculated wavelet transform for '{name}'")
 
         if opt:
             self.params.set_item("fmin", opt.get("fmin"))
 
         t = self.signals.get(name)
-        t.output_data = TFOutputData(
-            times, values, ampl, freq, powers, avg_ampl, avg_pow
-        )
+        t.output_data = TFOutputData(times, values, freq)
 
     def on_phase_coherence_completed(
-        self, signal_pair, tpc, pc, pdiff, surrogate_avg
+        self, signal_pair, tpc, pc, pdiff, surrogate_avg, surrogate_threshold=None
     ) -> None:
         s1, s2 = signal_pair
 
@@ -116,6 +113,7 @@ class PCPresenter(BaseTFPresenter):
         d.overall_coherence = pc
         d.phase_coherence = tpc
         d.surrogate_avg = surrogate_avg
+        d.surrogate_threshold = surrogate_threshold
 
         sig = self.signals.get(s1.name)
         sig.output_data = d
@@ -172,6 +170,7 @@ class PCPresenter(BaseTFPresenter):
         avg_coh = np.empty((first.overall_coherence.shape[0], cols))
 
         avg_surrogates = np.empty((len(first.surrogate_avg), cols))
+        surrogate_thresholds = np.full((len(first.surrogate_avg), cols), np.NAN)
 
         amp = np.empty((*first.ampl.shape, cols))
         avg_amp = np.empty((first.avg_ampl.shape[0], cols))
@@ -192,6 +191,9 @@ class PCPresenter(BaseTFPresenter):
                 except:
                     avg_surrogates[:, index] = np.NAN
 
+                if d.surrogate_threshold is not None:
+                    surrogate_thresholds[:, index] = d.surrogate_threshold[:, 0]
+
                 coh[:, :, index] = d.phase_coherence[:, :]
                 avg_coh[:, index] = d.overall_coherence[:, index]
 
@@ -210,6 +212,7 @@ class PCPresenter(BaseTFPresenter):
             "coherence": coh,
             "avg_coherence": avg_coh,
             "avg_surrogates": avg_surrogates,
+            "surrogate_thresholds": surrogate_thresholds,
             "amplitude": amp,
             "avg_amplitude": avg_amp,
             "frequency": freq,
@@ -265,4 +268,6 @@ class PCPresenter(BaseTFPresenter):
             surr_count=self.view.get_surr_count(),
             surr_method=self.view.get_surr_method(),
             surr_enabled=self.view.get_surr_enabled(),
+            surr_percentile=args.surr_percentile(),
+            surr_seed=args.surr_seed(),
         )
@@ -73,8 +73,9 @@ class REPresenter(TFPresenter):
         params = self.get_re_params()
         self.re_params = params
 
+        # The ridges are extracted from the transforms which were calculated with `self.params`.
         data: tuple = await self.mp_handler.coro_ridge_extraction(
-            params, on_progress=self.on_progress_updated
+            params, on_progress=self.on_progress_updated, transform_params=self.params
         )
 
         for d in data:
@@ -85,33 +86,19 @@ class REPresenter(TFPresenter):
     def on_ridge_completed(
         self,
         name,
-        times,
-        freq,
-        values,
-        ampl,
-        powers,
-        avg_ampl,
-        avg_pow,
         interval,
         filtered_signal,
         iphi,
         ifreq,
     ) -> None:
+        """
+        Called when the ridge in one interval has been extracted from a signal's transform.
+        The transform itself is unchanged, so it is not returned.
+        """
         sig = self.signals.get(name)
 
         d: TFOutputData = sig.output_data
-
         d.set_ridge_data(interval, filtered_signal, ifreq, iphi)
-        d.values = values
-
-        d.ampl = ampl
-        d.powers = powers
-
-        d.avg_ampl = avg_ampl
-        d.avg_pow = avg_pow
-
-        d.freq = freq
-        d.times = times
 
     def on_all_ridge_completed(self) -> None:
         print("All ridge extraction completed.")
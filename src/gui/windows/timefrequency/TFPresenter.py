@@ -90,9 +90,7 @@ class TFPresenter(BaseTFPresenter):
         for d in all_data:
             self.on_transform_completed(*d)
 
-    def on_transform_completed(
-        self, name, times, freq, values, ampl, powers, avg_ampl, avg_pow, opt=None
-    ) -> None:
+    def on_transform_completed(self, name, times, freq, values, opt=None) -> None:
         """
         Called when the calculation of the desired transform(s) is completed.
         """
@@ -103,9 +101,7 @@ class TFPresenter(BaseTFPresenter):
             self.params.set_item("fmin", opt.get("fmin"))
 
         t = self.signals.get(name)
-        t.output_data = TFOutputData(
-            times, values, ampl, freq, powers, avg_ampl, avg_pow
-        )
+        t.output_data = TFOutputData(times, values, freq)
 
         print(f"Finished calculation for '{name}'.")
 
@@ -32,7 +32,7 @@ import qasync
 
 import utils
 from gui.Application import Application
-from processes import mp_utils
+from processes import mp_utils, shared_arrays
 from utils import errorhandling, stdout_redirect, args, log_utils, launcher
 
 if __name__ == "__main__":
@@ -64,6 +64,9 @@ if __name__ == "__main__":
     errorhandling.init()
     stdout_redirect.init()
 
+    # Delete any shared arrays left by a previous instance which did not exit cleanly.
+    shared_arrays.sweep()
+
     app = Application(sys.argv)
 
     # Setup asyncio to work with PyQt.
@@ -0,0 +1,210 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Tuple, Dict, Optional
+
+import numpy as np
+import pymodalib
+from numpy import ndarray
+
+"""
+Python implementation of the wavelet bispectrum, as calculated by `bispecWavNew` in MODA.
+
+The bispectrum of two signals x and p at the frequencies (f1, f2) is the time-average of
+WT_x(f1) * WT_p(f2) * conj(WT_p(f1 + f2)). Unlike the MATLAB-packaged function, the
+wavelet transform of each signal is calculated once and reused by every bispectrum which
+contains it, so the four bispectra of a pair of signals need only two transforms.
+"""
+
+# The maximum number of elements in the temporary arrays of triple products.
+_block_elements = 2 ** 22
+
+
+def bispectrum_transform(
+    signal: ndarray,
+    fs: float,
+    fmin: float = None,
+    fmax: float = None,
+    f0: float = None,
+    nv: float = None,
+    preprocess: bool = False,
+) -> Tuple[ndarray, ndarray, Dict]:
+    """
+    Calculates the wavelet transform used by `wavelet_bispectrum`, with the Morlet wavelet
+    and the coefficients outside the cone of influence set to NaN.
+
+    :param signal: the signal
+    :param fs: the sampling frequency
+    :param fmin: the minimum frequency; determined automatically if not specified
+    :param fmax: the maximum frequency; defaults to fs/2
+    :param f0: the resolution parameter; defaults to 1
+    :param nv: the number of voices; determined automatically if not specified
+    :param preprocess: whether to pre-process the signal
+    :return: the wavelet transform, the frequencies and the options used
+    """
+    fmin = fmin if fmin and np.isfinite(fmin) else None
+
+    wt, freq, opt = pymodalib.wavelet_transform(
+        signal=np.asarray(signal, dtype=np.float64).flatten(),
+        fs=fs,
+        fmin=fmin,
+        fmax=fmax or fs / 2,
+        resolution=f0 or 1,
+        nv=nv or None,
+        wavelet="Morlet",
+        cut_edges=True,
+        preprocess=preprocess,
+        implementation="python",
+        return_opt=True,
+    )
+
+    return wt, np.asarray(freq, dtype=np.float64).flatten(), opt
+
+
+def wavelet_bispectrum(wt1: ndarray, wt2: ndarray, freq: ndarray) -> ndarray:
+    """
+    Calculates the wavelet bispectrum from the wavelet transforms of two signals.
+
+    The frequency f1 + f2 is matched to the highest frequency in `freq` which does not
+    exceed it. Pairs of frequencies whose sum is above the highest frequency are zero,
+    and pairs without any coefficients inside the cone of influence are NaN.
+
+    :param wt1: the wavelet transform of the first signal
+    :param wt2: the wavelet transform of the second signal
+    :param freq: the frequencies of the wavelet transforms, in ascending order
+    :return: the complex bispectrum, whose rows correspond to f1 and columns to f2
+    """
+    nfreq, L = wt1.shape
+
+    f3 = freq[:, None] + freq[None, :]
+    index3 = np.searchsorted(freq, f3, side="right") - 1
+
+    # Frequencies are ascending, so the valid values of f2 in each row are a prefix.
+    valid_count = (f3 <= freq[-1]).sum(axis=1)
+
+    finite1, finite2 = np.isfinite(wt1), np.isfinite(wt2)
+    wt1 = np.where(finite1, wt1, 0)
+    wt2 = np.where(finite2, wt2, 0)
+    conj2 = np.conj(wt2)
+
+    intervals1, intervals2 = _finite_intervals(finite1), _finite_intervals(finite2)
+    contiguous = intervals1 is not None and intervals2 is not None
+    if not contiguous:
+        masks1, masks2 = finite1.astype(np.float64), finite2.astype(np.float64)
+
+    bisp = np.zeros((nfreq, nfreq), dtype=np.complex128)
+
+    # Each row is calculated in blocks of f2, so that the temporary arrays stay small.
+    block = max(1, _block_elements // max(L, 1))
+
+    for j in range(nfreq):
+        for start in range(0, valid_count[j], block):
+            k = slice(start, min(valid_count[j], start + block))
+            k3 = index3[j, k]
+
+            # The sum over time of the triple product, as a matrix-vector product.
+            total = (wt2[k] * conj2[k3]) @ wt1[j]
+
+            if contiguous:
+                (s1, e1), (s2, e2) = intervals1[:, j], intervals2
+                first = np.maximum(np.maximum(s1, s2[k]), s2[k3])
+                last = np.minimum(np.minimum(e1, e2[k]), e2[k3])
+                count = np.maximum(last - first, 0)
+            else:
+                count = (masks2[k] * masks2[k3]) @ masks1[j]
+
+            bisp[j, k] = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+
+    return bisp
+
+
+def _finite_intervals(finite: ndarray) -> Optional[ndarray]:
+    """
+    Finds the range of finite coefficients in each row of a wavelet transform, which is
+    contiguous when the coefficients outside the cone of influence are NaN.
+
+    :param finite: whether each coefficient is finite
+    :return: array containing the start and end (exclusive) of the range in each row,
+    or None if the finite coefficients in any row are not contiguous
+    """
+    L = finite.shape[1]
+    count = finite.sum(axis=1)
+
+    start = np.where(count > 0, np.argmax(finite, axis=1), 0)
+    end = np.where(count > 0, L - np.argmax(finite[:, ::-1], axis=1), 0)
+
+    if np.any(end - start != count):
+        return None
+
+    return np.stack((start, end))
+
+
+def wavelet_biphase(
+    wt1: ndarray, wt2: ndarray, freq: ndarray, points: ndarray
+) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates the biamplitude and biphase at several pairs of frequencies from the
+    wavelet transforms of two signals. These are the amplitude and unwrapped phase of the
+    triple product which is averaged by `wavelet_bispectrum`.
+
+    Each frequency is matched to the nearest frequency in `freq`, and their sum is matched
+    in the same way as in `wavelet_bispectrum`.
+
+    :param wt1: the wavelet transform of the first signal
+    :param wt2: the wavelet transform of the second signal
+    :param freq: the frequencies of the wavelet transforms, in ascending order
+    :param points: array containing a pair of frequencies (f1, f2) in each row
+    :return: the biamplitude and biphase, with a row for each pair of frequencies; values
+    outside the cone of influence are NaN
+    """
+    points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+
+    index1, index2 = _nearest(freq, points[:, 0]), _nearest(freq, points[:, 1])
+    index3 = np.searchsorted(freq, freq[index1] + freq[index2], side="right") - 1
+    index3 = np.clip(index3, 0, len(freq) - 1)
+
+    product = wt1[index1] * wt2[index2] * np.conj(wt2[index3])
+
+    return np.abs(product), _unwrap(np.angle(product))
+
+
+def _nearest(freq: ndarray, values: ndarray) -> ndarray:
+    """
+    Returns the index of the nearest frequency to each value.
+    """
+    index = np.clip(np.searchsorted(freq, values), 1, len(freq) - 1)
+    lower_is_nearer = values - freq[index - 1] <= freq[index] - values
+
+    return np.where(lower_is_nearer, index - 1, index)
+
+
+def _unwrap(phase: ndarray) -> ndarray:
+    """
+    Unwraps each row of phases, skipping NaN values (which are kept).
+    """
+    finite = np.isfinite(phase)
+    L = phase.shape[-1]
+    positions = np.arange(L)
+
+    # Each NaN is replaced by the previous finite value, or by the first finite value if
+    # there is none, so that it does not affect the unwrapping.
+    previous = np.maximum.accumulate(np.where(finite, positions, 0), axis=-1)
+    first = np.argmax(finite, axis=-1)[..., None]
+    previous = np.where(positions < first, first, previous)
+
+    filled = np.take_along_axis(phase, previous, axis=-1)
+    filled = np.where(np.isfinite(filled), filled, 0)
+
+    return np.where(finite, np.unwrap(filled, axis=-1), np.nan)
@@ -17,6 +17,8 @@
 from multiprocess import Queue
 
 from gui.windows.bayesian.ParamSet import ParamSet
+from maths.algorithms.matlabwrappers.packages import get_package
+from maths.num_utils import numpy_to_matlab
 from maths.signals.TimeSeries import TimeSeries
 
 
@@ -30,13 +32,10 @@ def _moda_dynamic_bayesian_inference(
     Unused because it causes a serious error on Linux. Check the Python implementation
     of Bayesian inference instead (`bayesian.py`).
     """
-    import full_bayesian
-    import matlab
+    package = get_package("full_bayesian")
 
-    package = full_bayesian.initialize()
-
-    sig1 = matlab.double(signal1.signal.tolist())
-    sig2 = matlab.double(signal2.signal.tolist())
+    sig1 = numpy_to_matlab(signal1.signal)
+    sig2 = numpy_to_matlab(signal2.signal)
 
     int1 = list(params.freq_range1)
     int2 = list(params.freq_range2)
@@ -23,7 +23,8 @@ from typing import Tuple
 from numpy import ndarray
 from pymodalib.utils.decorators import matlabwrapper
 
-from maths.num_utils import matlab_to_numpy
+from maths.algorithms.matlabwrappers.packages import get_package
+from maths.num_utils import matlab_to_numpy, numpy_to_matlab
 
 
 @matlabwrapper(module="biphaseWavNew")
@@ -33,17 +34,14 @@ def calculate(
     """
     Calculates the biphase and biamplitude from the bispectrum using the MATLAB-packaged function.
     """
-    import biphaseWavPython
-    import matlab
-
-    package = biphaseWavPython.initialize()
+    package = get_package("biphaseWavPython")
 
     result = package.biphaseWavPython(
-        matlab.double(signal1),
-        matlab.double(signal2),
+        numpy_to_matlab(signal1),
+        numpy_to_matlab(signal2),
         fs,
         f0,
-        matlab.double(list(fr)),
+        numpy_to_matlab(fr),
         opt,
         nargout=2,
     )
@@ -0,0 +1,88 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import atexit
+import importlib
+import threading
+from timeit import default_timer as timer
+from typing import Any, Dict
+
+"""
+Registry of the MATLAB-packaged libraries which have been initialised in the current process.
+
+Initialising a package starts an instance of the MATLAB Runtime, which can take longer than
+the calculation itself. Each package is initialised the first time it is needed, and the
+same instance is used by every later call in the process; in a worker of the `WorkerPool`,
+this includes later tasks. The packages are terminated when the process exits.
+
+Importing this module does not import any MATLAB-packaged library, so it is safe to
+import in the main process.
+"""
+
+_packages: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+# Time spent initialising each package in this process, in seconds.
+init_times: Dict[str, float] = {}
+
+
+def get_package(name: str) -> Any:
+    """
+    Returns the initialised instance of a MATLAB-packaged library, initialising it if
+    this is the first call in the current process.
+
+    :param name: the name of the module, e.g. "bispecWavPython"
+    :return: the value returned by the module's `initialize()`
+    """
+    package = _packages.get(name)
+    if package is not None:
+        return package
+
+    with _lock:
+        package = _packages.get(name)
+
+        if package is None:
+            start = timer()
+            package = importlib.import_module(name).initialize()
+            init_times[name] = timer() - start
+
+            print(
+                f"Initialised MATLAB package '{name}' in {init_times[name]:.1f} seconds."
+            )
+            _packages[name] = package
+
+    return package
+
+
+def total_init_time() -> float:
+    """
+    Returns the total time spent initialising packages in the current process, in seconds.
+    """
+    return sum(init_times.values())
+
+
+@atexit.register
+def terminate_all() -> None:
+    """
+    Terminates all packages which have been initialised in the current process.
+    """
+    with _lock:
+        for package in _packages.values():
+            try:
+                package.terminate()
+            except Exception:
+                pass
+
+        _packages.clear()
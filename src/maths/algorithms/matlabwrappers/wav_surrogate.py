@@ -16,6 +16,9 @@
 
 from numpy import ndarray
 
+from maths.algorithms.matlabwrappers.packages import get_package
+from maths.num_utils import numpy_to_matlab
+
 
 def calculate(signal: ndarray, surr_type: str, adj: int) -> ndarray:
     """
@@ -27,14 +30,8 @@ def calculate(signal: ndarray, surr_type: str, adj: int) -> ndarray:
     :param adj: ?
     :return: [1D array] the surrogate signal
     """
-    import matlab
-    import wavsurrogate
-
-    package = wavsurrogate.initialize()
-
-    if isinstance(signal, ndarray):
-        signal = signal.tolist()
+    package = get_package("wavsurrogate")
 
-    result = package.wavsurrogate(matlab.double(signal), surr_type, adj)
+    result = package.wavsurrogate(numpy_to_matlab(signal), surr_type, adj)
 
     return result
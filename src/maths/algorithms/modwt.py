@@ -0,0 +1,134 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Tuple
+
+import numpy as np
+from numpy import ndarray
+
+"""
+Maximal overlap discrete wavelet transform (MODWT), which is required by WIAAFT surrogates.
+
+Each level is a circular convolution, calculated as a product of real FFTs. The transform
+operates on the last axis, so a batch of signals can be transformed at once.
+"""
+
+# Orthonormal scaling filters, named as in MATLAB's `modwt`.
+_scaling_filters = {
+    "haar": np.array([1, 1]) / np.sqrt(2),
+    "db2": np.array([1 + np.sqrt(3), 3 + np.sqrt(3), 3 - np.sqrt(3), 1 - np.sqrt(3)])
+    / (4 * np.sqrt(2)),
+    "sym4": np.array(
+        [
+            -0.07576571478927333,
+            -0.02963552764599851,
+            0.49761866763201545,
+            0.8037387518059161,
+            0.29785779560527736,
+            -0.09921954357684722,
+            -0.012603967262037833,
+            0.0322231006040427,
+        ]
+    ),
+}
+
+
+def modwt(x: ndarray, wavelet: str = "sym4", levels: int = None) -> ndarray:
+    """
+    Calculates the maximal overlap discrete wavelet transform, with periodic boundaries.
+
+    :param x: the signal, or an array of signals along the last axis
+    :param wavelet: the name of the wavelet: "haar", "db2" or "sym4"
+    :param levels: the number of levels; defaults to floor(log2(L)), where L is the length
+    of the signal
+    :return: array with shape (..., levels + 1, L), containing the wavelet coefficients at
+    each level followed by the scaling coefficients at the last level
+    """
+    x = np.asarray(x, dtype=np.float64)
+    L = x.shape[-1]
+    levels = levels or int(np.floor(np.log2(L)))
+
+    out = np.empty((*x.shape[:-1], levels + 1, L), dtype=np.float64)
+
+    fv = np.fft.rfft(x, axis=-1)
+    for j in range(1, levels + 1):
+        h, g = modwt_filters(L, j, wavelet)
+
+        out[..., j - 1, :] = np.fft.irfft(h * fv, n=L, axis=-1)
+        fv = g * fv
+
+    out[..., levels, :] = np.fft.irfft(fv, n=L, axis=-1)
+    return out
+
+
+def imodwt(w: ndarray, wavelet: str = "sym4") -> ndarray:
+    """
+    Calculates the inverse of `modwt`.
+
+    :param w: the coefficients returned by `modwt`
+    :param wavelet: the name of the wavelet
+    :return: the reconstructed signal(s)
+    """
+    w = np.asarray(w, dtype=np.float64)
+    levels = w.shape[-2] - 1
+    L = w.shape[-1]
+
+    fv = np.fft.rfft(w[..., levels, :], axis=-1)
+    for j in range(levels, 0, -1):
+        fv = imodwt_step(fv, np.fft.rfft(w[..., j - 1, :], axis=-1), L, j, wavelet)
+
+    return np.fft.irfft(fv, n=L, axis=-1)
+
+
+def imodwt_step(
+    fv: ndarray, fw: ndarray, L: int, level: int, wavelet: str = "sym4"
+) -> ndarray:
+    """
+    Performs one level of the inverse MODWT in the frequency domain. This allows the
+    coefficients at each level to be calculated and discarded one level at a time.
+
+    :param fv: the real FFT of the scaling coefficients at the level
+    :param fw: the real FFT of the wavelet coefficients at the level
+    :param L: the length of the signal
+    :param level: the level, starting from 1
+    :param wavelet: the name of the wavelet
+    :return: the real FFT of the scaling coefficients at the previous level
+    """
+    h, g = modwt_filters(L, level, wavelet)
+    return np.conj(h) * fw + np.conj(g) * fv
+
+
+def modwt_filters(L: int, level: int, wavelet: str = "sym4") -> Tuple[ndarray, ndarray]:
+    """
+    Returns the frequency responses of the MODWT wavelet and scaling filters at a level,
+    at the frequencies of the real FFT of a signal with length L.
+    """
+    try:
+        g = _scaling_filters[wavelet]
+    except KeyError:
+        raise ValueError(
+            f"Unknown wavelet '{wavelet}'; expected one of {list(_scaling_filters)}."
+        )
+
+    # Quadrature mirror filter, rescaled for the MODWT.
+    h = g[::-1] * (-1) ** np.arange(len(g))
+    g, h = g / np.sqrt(2), h / np.sqrt(2)
+
+    # The filter at level j is upsampled by 2^(j-1), so its response at frequency k
+    # is the response of the original filter at frequency 2^(j-1) * k.
+    k = (2 ** (level - 1) * np.arange(L // 2 + 1)) % L
+    phase = np.exp(-2j * np.pi * np.outer(k, np.arange(len(g))) / L)
+
+    return phase @ h, phase @ g
@@ -14,117 +14,268 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
 import math
-from typing import Tuple
+from typing import Tuple, List, Optional, Dict
 
 from numpy import ndarray
 
+from maths.algorithms.bispectrum import (
+    bispectrum_transform,
+    wavelet_bispectrum,
+    wavelet_biphase,
+)
 from maths.algorithms.matlab_utils import *
-from maths.algorithms.multiprocessing.time_frequency import avg_ampl_pow
-from maths.num_utils import matlab_to_numpy, multi_matlab_to_numpy
+from maths.algorithms.running_stats import RunningOrderStatistic
+from maths.algorithms.surrogates import spawn_seeds, surrogate_stream
+from maths.num_utils import (
+    avg_ampl_pow,
+    matlab_to_numpy,
+    multi_matlab_to_numpy,
+    numpy_to_matlab,
+)
 from maths.params.BAParams import BAParams
-from maths.signals.TimeSeries import TimeSeries
 from processes.mp_utils import process
 
+# The pairs of signals whose bispectra are calculated, as indices into (sig1, sig2):
+# "xxx", "ppp", "xpp" and "pxx". When a single signal is analysed, only "xxx" is calculated.
+bispectrum_combinations = ((0, 0), (1, 1), (0, 1), (1, 0))
+
+
+def is_unique_pair(sig1: ndarray, sig2: ndarray) -> bool:
+    """
+    Returns whether a pair of signals is unique. If a single signal was loaded, it is
+    duplicated, and only its autobispectrum is calculated.
+    """
+    return np.sum(np.abs(sig1 - sig2)) != 0
+
 
 @process
-def _biphase(
-    sig1: TimeSeries, sig2: TimeSeries, fs: float, f0: float, fr: float, opt: dict
-) -> Tuple[
-    str,
-    Tuple[float, float],
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-]:
+def _bispectra(
+    sig1: ndarray, sig2: ndarray, params: BAParams, combinations: Tuple
+) -> List[Tuple[ndarray, ndarray, ndarray, ndarray, dict]]:
     """
-    Calculates biphase and biamplitude. Used in bispectrum analysis.
+    Calculates bispectra of a pair of signals. With the Python implementation, the wavelet
+    transform of each signal is only calculated once.
 
     :param sig1: the first signal
     :param sig2: the second signal
-    :param fs:  sampling frequency
-    :param f0: resolution parameter
-    :param fr:
-    :param opt: dictionary with params from MATLAB
-    :return:
+    :param params: the params object containing parameters for the algorithm
+    :param combinations: the combinations of signals to calculate, from `bispectrum_combinations`
+    :return: list containing, for each combination, the absolute value of the bispectrum;
+    the frequencies; the amplitudes of the wavelet transforms of both signals; and the
+    options used by the algorithm
     """
-    # We need to import a Matlab module such as WT, in order to be able to use "import matlab".
-    import WT
+    return _calculate_bispectra((sig1, sig2), params, combinations)
 
-    # To avoid the "import WT" being removed by the auto-import optimiser, we assign a dummy variable to it.
-    dummy_variable = WT
 
-    import matlab
-    from maths.algorithms.matlabwrappers import biphase_wav_new
+@process
+def _surrogate_bispectra(
+    sig1: ndarray,
+    sig2: ndarray,
+    params: BAParams,
+    seed: np.random.SeedSequence,
+    chunks: range,
+) -> List[Tuple[RunningOrderStatistic, Optional[ndarray]]]:
+    """
+    Calculates the bispectra of a range of chunks of surrogates (see `surrogate_stream`).
 
-    name = sig1.name
-    sig1list = sig1.signal.tolist()
-    sig2list = sig2.signal.tolist()
+    Only the largest values needed for the significance threshold are kept, unless
+    `params.keep_surrogates` is set.
 
-    opt["PadLR1"] = matlab.double(opt["PadLR1"].tolist())
-    opt["PadLR2"] = matlab.double(opt["PadLR2"].tolist())
+    :param sig1: the first signal
+    :param sig2: the second signal
+    :param params: the params object containing parameters for the algorithm
+    :param seed: the seed of the surrogates of this pair of signals, which is shared by all tasks
+    :param chunks: the chunks of surrogates to calculate in this task
+    :return: list containing, for each combination of signals, the running order statistic
+    of the surrogate bispectra; and a 3D array containing every surrogate bispectrum along
+    the last axis if `params.keep_surrogates` is set, otherwise None
+    """
+    ns = params.surr_count
+    fs = params.fs
 
-    twf1 = [complex(i) for i in opt["twf1"]]
-    twf2 = [complex(i) for i in opt["twf2"]]
+    combinations = bispectrum_combinations
+    if not is_unique_pair(sig1, sig2):
+        combinations = combinations[:1]
 
-    twf1r = [i.real for i in twf1]
-    twf2r = [i.real for i in twf2]
-    twf1i = [i.imag for i in twf1]
-    twf2i = [i.imag for i in twf2]
+    # Wavelet-based IAAFT surrogates, as calculated by MODA's `wavsurrogate`.
+    seed1, seed2 = spawn_seeds(seed, 2)
+    surrogates1 = surrogate_stream(sig1, ns, "WIAAFT", False, fs, seed1, chunks)
+    surrogates2 = surrogate_stream(sig2, ns, "WIAAFT", False, fs, seed2, chunks)
 
-    del opt["twf1"]
-    del opt["twf2"]
+    stats = [RunningOrderStatistic(significance_rank(params)) for _ in combinations]
+    kept = [[] for _ in combinations]
 
-    opt["twf1r"] = matlab.double(twf1r)
-    opt["twf2r"] = matlab.double(twf2r)
-    opt["twf1i"] = matlab.double(twf1i)
-    opt["twf2i"] = matlab.double(twf2i)
+    for surr1, surr2 in zip(surrogates1, surrogates2):
+        bispectra = _calculate_bispectra((surr1, surr2), params, combinations)
 
-    biamp1, biphase1 = biphase_wav_new.calculate(sig1list, sig1list, fs, f0, fr, opt)
-    biamp2, biphase2 = biphase_wav_new.calculate(sig2list, sig2list, fs, f0, fr, opt)
-    biamp3, biphase3 = biphase_wav_new.calculate(sig1list, sig2list, fs, f0, fr, opt)
-    biamp4, biphase4 = biphase_wav_new.calculate(sig2list, sig1list, fs, f0, fr, opt)
+        for i, bisp in enumerate(bispectra):
+            stats[i].add(bisp[0])
 
-    biamp1, biphase1 = multi_matlab_to_numpy(biamp1, biphase1)
-    biamp2, biphase2 = multi_matlab_to_numpy(biamp2, biphase2)
-    biamp3, biphase3 = multi_matlab_to_numpy(biamp3, biphase3)
-    biamp4, biphase4 = multi_matlab_to_numpy(biamp4, biphase4)
+            if params.keep_surrogates:
+                kept[i].append(bisp[0])
 
-    l = biamp1.shape[1]
+    return [
+        (s, np.stack(k, axis=-1) if params.keep_surrogates else None)
+        for s, k in zip(stats, kept)
+    ]
 
-    biamp1 = biamp1.reshape(l)
-    biphase1 = biphase1.reshape(l)
 
-    biamp2 = biamp2.reshape(l)
-    biphase2 = biphase2.reshape(l)
+def significance_rank(params: BAParams) -> int:
+    """
+    Returns the rank of the surrogate bispectrum which is used as the significance
+    threshold, where 1 is the largest; as in MODA, this is floor((ns + 1) * alpha),
+    limited to the range [1, ns].
+    """
+    ns = params.surr_count
+    return int(np.clip(math.floor((ns + 1) * params.alpha), 1, ns))
 
-    biamp3 = biamp3.reshape(l)
-    biphase3 = biphase3.reshape(l)
 
-    biamp4 = biamp4.reshape(l)
-    biphase4 = biphase4.reshape(l)
+def _calculate_bispectra(
+    sigs: Tuple[ndarray, ndarray], params: BAParams, combinations: Tuple
+) -> List[Tuple[ndarray, ndarray, ndarray, ndarray, dict]]:
+    if params.implementation == "python":
+        transforms = _python_transforms(sigs, params, combinations)
 
-    return (
-        name,
-        *fr,
-        biamp1,
-        biphase1,
-        biamp2,
-        biphase2,
-        biamp3,
-        biphase3,
-        biamp4,
-        biphase4,
-    )
+        result = []
+        for a, b in combinations:
+            (wt1, freq, opt), (wt2, _, _) = transforms[a], transforms[b]
+            bisp = wavelet_bispectrum(wt1, wt2, freq)
+
+            result.append((np.abs(bisp), freq, np.abs(wt1), np.abs(wt2), dict(opt)))
+
+        return result
+
+    from maths.algorithms.matlabwrappers import bispec_wav_new
+
+    return [
+        bispec_wav_new.calculate(sigs[a], sigs[b], params.fs, _matlab_params(params))
+        for a, b in combinations
+    ]
+
+
+def _python_transforms(
+    sigs: Tuple[ndarray, ndarray], params: BAParams, combinations: Tuple
+) -> Dict[int, Tuple[ndarray, ndarray, dict]]:
+    """
+    Calculates the wavelet transform of each signal which is used by the combinations,
+    using the Python implementation.
+
+    :return: dictionary containing the transform, frequencies and options of each signal,
+    by its index in `sigs`
+    """
+    # The automatic minimum frequency depends only on the length of the signal,
+    # so both transforms have the same frequencies.
+    return {
+        i: bispectrum_transform(
+            sigs[i],
+            params.fs,
+            fmin=params.fmin,
+            fmax=params.fmax,
+            f0=params.f0,
+            nv=params.nv,
+            preprocess=params.preprocess,
+        )
+        for i in sorted({i for c in combinations for i in c})
+    }
 
 
 @process
-def _bispectrum_analysis(
-    sig1: TimeSeries, sig2: TimeSeries, params: BAParams
+def _biphases(
+    sig1: ndarray,
+    sig2: ndarray,
+    params: BAParams,
+    points: List[Tuple[float, float]],
+    opt: dict,
+) -> List[
+    Tuple[
+        float,
+        float,
+        ndarray,
+        ndarray,
+        ndarray,
+        ndarray,
+        ndarray,
+        ndarray,
+        ndarray,
+        ndarray,
+    ]
+]:
+    """
+    Calculates the biamplitude and biphase of each combination of signals at several pairs
+    of frequencies. With the Python implementation, the wavelet transforms are calculated
+    once and all pairs of frequencies are calculated together.
+
+    :param sig1: the first signal
+    :param sig2: the second signal
+    :param params: the params which were used to calculate the bispectra
+    :param points: the pairs of frequencies (x, y)
+    :param opt: the options returned by the bispectrum calculation
+    :return: list containing, for each pair of frequencies, the frequencies followed by the
+    biamplitude and biphase of each combination of signals
+    """
+    if params.implementation == "python":
+        transforms = _python_transforms((sig1, sig2), params, bispectrum_combinations)
+
+        results = []
+        for a, b in bispectrum_combinations:
+            (wt1, freq, _), (wt2, _, _) = transforms[a], transforms[b]
+            results.append(wavelet_biphase(wt1, wt2, freq, points))
+
+        return [
+            (*fr, *[r[n][p] for r in results for n in (0, 1)])
+            for p, fr in enumerate(points)
+        ]
+
+    # We need to import a Matlab module such as WT, in order to be able to use "import matlab".
+    import WT
+
+    # To avoid the "import WT" being removed by the auto-import optimiser, we assign a dummy variable to it.
+    dummy_variable = WT
+
+    from maths.algorithms.matlabwrappers import biphase_wav_new
+
+    sigs = (sig1, sig2)
+
+    opt = dict(opt)
+    opt["PadLR1"] = numpy_to_matlab(opt["PadLR1"])
+    opt["PadLR2"] = numpy_to_matlab(opt["PadLR2"])
+
+    for key in ("twf1", "twf2"):
+        twf = np.asarray(opt.pop(key), dtype=np.complex128).flatten()
+        opt[f"{key}r"] = numpy_to_matlab(twf.real)
+        opt[f"{key}i"] = numpy_to_matlab(twf.imag)
+
+    output = []
+    for fr in points:
+        result = []
+        for a, b in bispectrum_combinations:
+            biamp, biphase = biphase_wav_new.calculate(
+                sigs[a], sigs[b], params.fs, params.f0, fr, opt
+            )
+            result.extend(
+                [np.asarray(x).flatten() for x in multi_matlab_to_numpy(biamp, biphase)]
+            )
+
+        output.append((*fr, *result))
+
+    return output
+
+
+def _matlab_params(params: BAParams) -> dict:
+    fs = params.fs
+    return {
+        "nv": params.nv,
+        "fmin": params.fmin or math.nan,
+        "fmax": params.fmax or fs / 2,
+        "f0": params.f0 or 1,
+    }
+
+
+def _bispectrum_output(
+    name: str,
+    params: BAParams,
+    bispectra: List[Tuple],
+    surrogates: List[List[Tuple[RunningOrderStatistic, Optional[ndarray]]]],
 ) -> Tuple[
     str,
     ndarray,
@@ -145,115 +296,64 @@ def _bispectrum_analysis(
     ndarray,
     ndarray,
     dict,
+    Optional[Tuple[ndarray, ndarray, ndarray, ndarray]],
 ]:
     """
-    Performs bispectrum analysis.
-
-    :param sig1: the first signal
-    :param sig2: the second signal
-    :param params: the params object containing parameters for the MATLAB-packaged function
-    :return:
+    Combines the results of `_bispectra` and `_surrogate_bispectra` for a pair of signals.
+
+    :param name: the name of the first signal
+    :param params: the params object
+    :param bispectra: the results of `_bispectra` for each combination of signals; a single
+    result if the signals are not unique
+    :param surrogates: the results of `_surrogate_bispectra` for each task
+    :return: the output of bispectrum analysis, where the significance threshold of each
+    bispectrum replaces its surrogates; the surrogate bispectra are returned at the end
+    if `params.keep_surrogates` is set
     """
-    from maths.algorithms.matlabwrappers import bispec_wav_new, wav_surrogate
-
-    name = sig1.name
-    sig1 = sig1.signal
-    sig2 = sig2.signal
-
-    sig1list = sig1.tolist()
-    sig2list = sig2.tolist()
-
-    # Whether the signals are unique; if a single signal was loaded, it would have been duplicated and
-    # passed to this function, making this boolean False.
-    unique_signals = np.sum(np.abs(sig1 - sig2)) != 0
-
-    fs = params.fs
-    preprocess = params.preprocess
-
     ns = params.surr_count or 0
-    nv = params.nv
 
-    fmax = params.fmax or fs / 2
-    fmin = params.fmin or math.nan
-    f0 = params.f0 or 1
+    if len(bispectra) == len(bispectrum_combinations):
+        # The frequencies, transforms and options are returned by the cross-bispectrum.
+        _, freq, amp_wt1, amp_wt2, opt = bispectra[2]
+    else:
+        _, freq, amp_wt1, amp_wt2, opt = bispectra[0]
 
-    params = {"nv": nv, "fmin": fmin, "fmax": fmax, "f0": f0}
+        if params.preprocess:
+            # Create NaN array for WT2.
+            amp_wt2 = np.empty(amp_wt1.shape)
+            amp_wt2.fill(NAN)
 
-    # If a unique pair of signals is being analysed, perform autobispectral and crossbispectral analysis.
-    if unique_signals:
+    bisp_size = bispectra[0][0].shape
 
-        # Note: Previously attempted to calculate bispec_wav_new in a process each. Did not work
-        # due to some strange problem with the Matlab runtime. Processes would
-        # hang at the `package.initialize()` stage for unknown reasons.
+    bisp = []
+    thresholds = []
+    surr = []
+    for i in range(len(bispectrum_combinations)):
+        if i >= len(bispectra):
+            # Only the autobispectrum was calculated, so the remaining bispectra are NaN.
+            bisp.append(np.full(bisp_size, NAN))
+            thresholds.append(np.full(bisp_size, NAN))
 
-        print(
-            "Multiple signals; performing autobispectral and crossbispectral analysis..."
-        )
-        bispxxx, _, _, _, _ = bispec_wav_new.calculate(sig1list, sig1list, fs, params)
-        bispppp, _, _, _, _ = bispec_wav_new.calculate(sig2list, sig2list, fs, params)
-        bispxpp, freq, amp_wt1, amp_wt2, opt = bispec_wav_new.calculate(
-            sig1list, sig2list, fs, params
-        )
-        bisppxx, _, _, _, _ = bispec_wav_new.calculate(sig2list, sig1list, fs, params)
+            if params.keep_surrogates:
+                surr.append(np.full(bisp_size + (ns,), NAN))
+            continue
 
-        bisp_size = bispxxx.shape + (ns,)
-        surrxxx = zeros(bisp_size)
-        surrppp = zeros(bisp_size)
-        surrxpp = zeros(bisp_size)
-        surrpxx = zeros(bisp_size)
+        bisp.append(abs(bispectra[i][0]))
 
-        for j in range(ns):
-            surr1 = wav_surrogate.calculate(sig1list, "IAAFT2", 1)
-            surr2 = wav_surrogate.calculate(sig2list, "IAAFT2", 1)
+        if surrogates:
+            stats = RunningOrderStatistic(significance_rank(params))
+            for s in surrogates:
+                stats.merge(s[i][0])
 
-            surrxxx[:, :, j] = abs(
-                bispec_wav_new.calculate(surr1, surr1, fs, params)[0]
-            )
-            surrppp[:, :, j] = abs(
-                bispec_wav_new.calculate(surr2, surr2, fs, params)[0]
-            )
-            surrxpp[:, :, j] = abs(
-                bispec_wav_new.calculate(surr1, surr2, fs, params)[0]
-            )
-            surrpxx[:, :, j] = abs(
-                bispec_wav_new.calculate(surr2, surr1, fs, params)[0]
-            )
-
-    # If only one signal is being analysed, instead of a pair, perform autobispectral analysis only.
-    elif not unique_signals:
-        print("1 signal; performing autobispectral analysis only...")
+            thresholds.append(stats.value())
 
-        bispxxx, freq, amp_wt1, amp_wt2, opt = bispec_wav_new.calculate(
-            sig1list, sig1list, fs, params
-        )
-        bispxxx = abs(bispxxx)
+            if params.keep_surrogates:
+                surr.append(np.concatenate([s[i][1] for s in surrogates], axis=-1))
+        else:
+            thresholds.append(zeros(bisp_size))
 
-        if preprocess:
-            # Create NaN array for WT2.
-            amp_wt2 = np.empty(amp_wt1.shape)
-            amp_wt2.fill(NAN)
-
-        # Create NaN arrays for remaining bispectra.
-        bisp_size = bispxxx.shape
-        surr_size = bisp_size + (ns,)
-        surrxxx = zeros(surr_size)
-
-        # Create empty arrays and make them all NaN.
-        bispppp = np.empty(bisp_size)
-        bispxpp = np.empty(bisp_size)
-        bisppxx = np.empty(bisp_size)
-        surrppp = zeros(surr_size)
-        surrxpp = zeros(surr_size)
-        surrpxx = zeros(surr_size)
-        for a in (bispppp, bispxpp, bisppxx, surrppp, surrxpp, surrpxx):
-            a.fill(NAN)
-
-        for i in range(ns):
-            surr1 = wav_surrogate.calculate(sig1list, "IAAFT2", 1)
-
-            surrxxx[:, :, i] = abs(
-                bispec_wav_new.calculate(surr1, surr1, fs, params)[0]
-            )
+    bispxxx, bispppp, bispxpp, bisppxx = bisp
+    thrxxx, thrppp, thrxpp, thrpxx = thresholds
 
     freq = matlab_to_numpy(freq)
     avg_amp_wt1, avg_pow_wt1 = avg_ampl_pow(amp_wt1)
@@ -261,10 +361,10 @@ def _bispectrum_analysis(
 
     pow_wt1, pow_wt2 = np.square(amp_wt1), np.square(amp_wt2)
 
-    opt["PadLR1"] = matlab_to_numpy(opt["PadLR1"])
-    opt["PadLR2"] = matlab_to_numpy(opt["PadLR2"])
-    opt["twf1"] = matlab_to_numpy(opt["twf1"])
-    opt["twf2"] = matlab_to_numpy(opt["twf2"])
+    # These options are only returned by the MATLAB implementation.
+    for key in ("PadLR1", "PadLR2", "twf1", "twf2"):
+        if key in opt:
+            opt[key] = matlab_to_numpy(opt[key])
 
     return (
         name,
@@ -281,9 +381,10 @@ def _bispectrum_analysis(
         bispppp,
         bispxpp,
         bisppxx,
-        surrxxx,
-        surrppp,
-        surrxpp,
-        surrpxx,
+        thrxxx,
+        thrppp,
+        thrxpp,
+        thrpxx,
         opt,
+        tuple(surr) if surrogates and params.keep_surrogates else None,
     )
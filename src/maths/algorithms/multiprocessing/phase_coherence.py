@@ -16,19 +16,20 @@
 from typing import Tuple
 
 import numpy as np
-import pymodalib
-from multiprocess.pool import Pool
 from numpy import ndarray
 from pymodalib.algorithms.coherence import wphcoh
 
-from maths.algorithms.surrogates import surrogate_calc
+from maths.algorithms.multiprocessing.time_frequency import _wt_func
+from maths.algorithms.running_stats import RunningStats
+from maths.algorithms.surrogates import surrogate_stream
 from maths.algorithms.wpc import wpc
 from maths.params.PCParams import PCParams
 from maths.signals.TimeSeries import TimeSeries
+from processes import shared_arrays
 from processes.mp_utils import process
+from processes.shared_arrays import SharedArray
 
 
-@process
 def _wt_surrogate_calc(
     wt_signal: ndarray, surrogate: ndarray, params: PCParams
 ) -> ndarray:
@@ -40,30 +41,78 @@ def _wt_surrogate_calc(
     :param params: the params object with parameters to pass to the wavelet transform function
     :return: [1D array] the wavelet phase coherence between the signal and the surrogate
     """
-    wt_surrogate, _ = pymodalib.wavelet_transform(
-        surrogate, params.fs, **params.get(), Display="off"
-    )
+    # Each surrogate is random, so its transform is not cached.
+    wt_surrogate, _, _ = _wt_func(surrogate, params, False, use_cache=False)
 
     surr_avg, _ = wphcoh(wt_signal, wt_surrogate)
+
+    # A long surrogate is transformed into a memory-mapped file, which is not shared.
+    shared_arrays.discard(wt_surrogate)
+
     return surr_avg
 
 
+@process
+def _surrogate_phase_coherence(
+    wt_signal: SharedArray,
+    signal: SharedArray,
+    params: PCParams,
+    seed: np.random.SeedSequence,
+    chunks: range,
+) -> RunningStats:
+    """
+    Generates surrogates of a signal one chunk at a time, and accumulates the phase coherence
+    between the signal and each surrogate. The memory used does not depend on the number of
+    surrogates.
+
+    The signal and its wavelet transform are exported by the main process, so that they
+    are not pickled for every task.
+
+    :param wt_signal: the exported wavelet transform of the signal
+    :param signal: the exported values of the signal
+    :param params: the params object with parameters for the surrogates and the wavelet transform
+    :param seed: the seed of the surrogates of this signal, which is shared by all tasks
+    :param chunks: the chunks of surrogates to calculate in this task (see `surrogate_stream`)
+    :return: the running statistics of the phase coherence with each surrogate, which can be
+    merged with the results of other tasks
+    """
+    wt = shared_arrays.open_exported(wt_signal)
+    sig = np.asarray(shared_arrays.open_exported(signal))
+
+    stats = RunningStats(track_percentiles=params.surr_percentile is not None)
+
+    surrogates = surrogate_stream(
+        sig,
+        params.surr_count,
+        params.surr_method,
+        params.surr_preproc,
+        params.fs,
+        seed=seed,
+        chunks=chunks,
+    )
+    for surrogate in surrogates:
+        stats.add(_wt_surrogate_calc(wt, surrogate, params))
+
+    return stats
+
+
 @process
 def _phase_coherence(
     signal_pair: Tuple[TimeSeries, TimeSeries], params: PCParams
-) -> Tuple[Tuple[TimeSeries, TimeSeries], ndarray, ndarray, ndarray, ndarray]:
+) -> Tuple[Tuple[TimeSeries, TimeSeries], ndarray, ndarray, ndarray]:
     """
     Function which uses `wpc` to calculate phase coherence for a single pair of signals. The signals must have
     their wavelet transforms attached in their `output_data` member variable.
 
+    Surrogates are calculated separately, by `_surrogate_phase_coherence`.
+
     :param signal_pair: tuple containing 2 signals
     :param params: the params object with parameters for the function
     :return:
     [tuple] the pair of signals;
     [2D array] the time-localised phase coherence;
     [1D array] phase coherence;
-    [1D array] phase difference;
-    [1D array] time-localised phase coherence of surrogates
+    [1D array] phase difference
     """
     s1, s2 = signal_pair
 
@@ -73,21 +122,7 @@ def _phase_coherence(
     freq = s1.output_data.freq
     fs = s1.frequency
 
-    # Calculate surrogates.
-    surr_count = params.surr_count
-    surr_method = params.surr_method
-    surr_preproc = params.surr_preproc
-    surrogates, _ = surrogate_calc(s1, surr_count, surr_method, surr_preproc, fs)
-
-    # Calculate surrogates.
-    pool = Pool()
-    args = [(wt1, surrogates[i], params) for i in range(surr_count)]
-    tpc_surr = pool.starmap(_wt_surrogate_calc, args)
-
-    if len(tpc_surr) > 0:
-        tpc_surr = np.mean(tpc_surr, axis=0)
-
     # Calculate phase coherence.
     tpc, pc, pdiff = wpc(wt1, wt2, freq, fs)
 
-    return signal_pair, tpc, pc, pdiff, tpc_surr
+    return signal_pair, tpc, pc, pdiff
@@ -13,44 +13,89 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-from typing import Tuple
+from typing import Tuple, Dict, Optional
 
 import numpy as np
 from numpy import ndarray
 from pymodalib.utils.decorators import matlabwrapper
 
-from maths.num_utils import matlab_to_numpy
+from maths.algorithms import ridges, windowed_fourier
+from maths.algorithms.matlabwrappers.packages import get_package
+from maths.algorithms.wavelets import wavelet_functions
+from maths.num_utils import matlab_to_numpy, numpy_to_matlab
 from maths.params.REParams import REParams
+from maths.params.TFParams import (
+    TFParams,
+    _wft,
+    _f0,
+    _cut_edges,
+    _preprocess,
+    _window,
+    _wavelet,
+)
 from maths.signals.TimeSeries import TimeSeries
+from processes import shared_arrays
 from processes.mp_utils import process
+from processes.shared_arrays import SharedArray
 
 
-@matlabwrapper(module="ridge_extraction")
+@process
 def _ridge_extraction(
+    name: str,
+    transform: SharedArray,
+    freq: ndarray,
+    interval: Tuple[float, float],
+    params: REParams,
+    norm: Tuple[float, float],
+) -> Tuple[str, Tuple[float, float], ndarray, ndarray, ndarray]:
+    """
+    Extracts the ridge in one frequency interval from the transform of a signal, which was
+    calculated by the time-frequency analysis. Only the rows of the transform inside the
+    interval are read, and the transform is not recalculated.
+
+    :param name: the name of the signal
+    :param transform: the exported transform of the signal
+    :param freq: the frequencies of the transform, in ascending order
+    :param interval: the minimum and maximum frequency of the interval
+    :param params: the params object with the parameters of the ridge extraction
+    :param norm: the constants of the direct reconstruction, returned by `_direct_constants`
+    :return: the name of the signal; the interval; the filtered signal, which is the
+    component reconstructed from the ridge; and the phase and frequency of the component
+    at each time, which are NaN where there is no ridge
+    """
+    fmin, fmax = interval
+    rows = slice(
+        np.searchsorted(freq, fmin, side="left"),
+        np.searchsorted(freq, fmax, side="right"),
+    )
+    values = shared_arrays.open_exported(transform)[rows]
+
+    iamp, iphi, ifreq = ridges.ridge_extraction(
+        values, freq[rows], norm, **_ridge_options(params)
+    )
+
+    return name, interval, iamp * np.cos(iphi), iphi, ifreq
+
+
+@matlabwrapper(module="ridge_extraction")
+def _matlab_ridge_extraction(
     time_series: TimeSeries, params: REParams
-) -> Tuple[
-    str,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    ndarray,
-    Tuple[float, float],
-    ndarray,
-    ndarray,
-    ndarray,
-]:
-    import ridge_extraction
-    import matlab
-
-    package = ridge_extraction.initialize()
+) -> Tuple[str, Tuple[float, float], ndarray, ndarray, ndarray]:
+    """
+    Calculates the wavelet transform of a signal in one frequency interval, and extracts
+    the ridge from it, using the MATLAB-packaged library. The options of `ecurve` are not
+    passed to the library, which always uses its defaults.
+
+    :param time_series: the signal
+    :param params: the params object, whose minimum and maximum frequency are the interval
+    :return: the same values as `_ridge_extraction`
+    """
+    package = get_package("ridge_extraction")
 
     d = params.get()
     result = package.ridge_extraction(
         1,
-        matlab.double(time_series.signal.tolist()),
+        numpy_to_matlab(time_series.signal),
         params.fs,
         d["fmin"],
         d["fmax"],
@@ -60,13 +105,7 @@ def _ridge_extraction(
         nargout=6,
     )
 
-    transform, freq, iamp, iphi, ifreq, filtered_signal = result
-
-    transform = matlab_to_numpy(transform)
-    freq = matlab_to_numpy(freq)
-
-    iamp = matlab_to_numpy(iamp)
-    iamp = iamp.reshape(iamp.shape[1])
+    _, _, _, iphi, ifreq, filtered_signal = result
 
     iphi = matlab_to_numpy(iphi)
     iphi = iphi.reshape(iphi.shape[1])
@@ -77,32 +116,81 @@ def _ridge_extraction(
     filtered_signal = matlab_to_numpy(filtered_signal)
     filtered_signal = filtered_signal.reshape(filtered_signal.shape[1])
 
-    amplitude = np.abs(transform)
-    powers = np.square(amplitude)
-
-    length = len(amplitude)
-
-    avg_ampl = np.empty(length, dtype=np.float64)
-    avg_pow = np.empty(length, dtype=np.float64)
-
-    for i in range(length):
-        arr = amplitude[i]
-        row = arr[np.isfinite(arr)]
-
-        avg_ampl[i] = np.mean(row)
-        avg_pow[i] = np.mean(np.square(row))
-
-    return (
-        time_series.name,
-        time_series.times,
-        freq,
-        transform,
-        amplitude,
-        powers,
-        avg_ampl,
-        avg_pow,
-        (d["fmin"], d["fmax"]),
-        filtered_signal,
-        iphi,
-        ifreq,
-    )
+    return time_series.name, (d["fmin"], d["fmax"]), filtered_signal, iphi, ifreq
+
+
+def _ridge_options(params: REParams) -> Dict:
+    """
+    Returns the options of `ridges.ecurve` which correspond to the parameters of the ridge
+    extraction. Only the default method of MODA, scheme II, is implemented, without
+    normalisation; any other method is rejected rather than replaced, so that the
+    MATLAB-packaged library is used instead.
+
+    :param params: the params object with the parameters of the ridge extraction
+    :return: the keyword arguments of `ridges.ecurve`
+    """
+    method = params.get_item("Method")
+    if str(method) != "2":
+        raise ValueError(
+            f"Ridge extraction only supports method 2 (scheme II of MODA), not '{method}'."
+        )
+    if params.get_item("Normalize") not in (None, False, "off"):
+        raise ValueError("Ridge extraction does not support the 'Normalize' option.")
+
+    return {
+        "max_iterations": params.get_item("MaxIter") or 20,
+        "param": params.get_item("Param"),
+        "path_opt": params.get_item("PathOpt") not in (False, "off"),
+    }
+
+
+def _direct_constants(
+    params: REParams, transform_params: Optional[TFParams]
+) -> Optional[Tuple[float, float]]:
+    """
+    Returns the constants C and D of the window or wavelet of a transform, which are used
+    to reconstruct the components from it.
+
+    Ridges can only be extracted from a transform which was calculated with the transform,
+    window or wavelet, resolution, cutting of the edges and preprocessing which are set for
+    the ridge extraction. If the transform was calculated with different parameters, or its
+    window or wavelet is not implemented in Python, None is returned, and the ridges must be
+    extracted by the MATLAB-packaged library.
+
+    :param params: the params object with the parameters of the ridge extraction
+    :param transform_params: the params object which was used to calculate the transform,
+    or None if it is unknown
+    :return: C and D, or None
+    """
+    if transform_params is None or transform_params.transform != params.transform:
+        return None
+
+    wft = params.transform == _wft
+    keys = [_f0, _cut_edges, _preprocess, _window if wft else _wavelet]
+    if any(params.get_item(k) != transform_params.get_item(k) for k in keys):
+        return None
+
+    f0 = transform_params.get_item(_f0)
+
+    if wft:
+        # As in the calculation of the transform, the resolution is relative to the minimum
+        # frequency.
+        fmin = transform_params.get_item("fmin")
+        if f0 is not None and fmin:
+            f0 = f0 / fmin
+
+        try:
+            window = windowed_fourier.window_functions(
+                params.get_item(_window), f0 or 1
+            )
+        except ValueError:
+            return None
+
+        return ridges.window_constants(window.twf)
+
+    wp = wavelet_functions(params.get_item(_wavelet), f0)
+    if wp is None:
+        return None
+
+    C = wp.C if wp.C is not None else ridges.wavelet_constant(wp.fwt)
+    return C, getattr(wp, "D", np.inf)
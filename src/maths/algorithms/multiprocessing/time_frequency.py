@@ -14,25 +14,29 @@
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
 
-from typing import Tuple, Union, Dict
+import os
+from typing import Tuple, Union, Dict, Optional
 
-import numpy as np
 import pymodalib
 from numpy import ndarray
-from pymodalib.utils.matlab import multi_matlab_to_numpy
 
+from maths.algorithms import windowed_fourier
+from maths.algorithms.streaming_wt import streaming_wavelet_transform
+from maths.num_utils import multi_matlab_to_numpy
 from maths.params.TFParams import TFParams, _wft
 from maths.signals.TimeSeries import TimeSeries
 from processes.mp_utils import process
+from processes.shared_arrays import share_all
 from utils import args
+from utils.cache import Cache
 
 
 @process
 def _time_frequency(
     time_series: TimeSeries, params: TFParams, return_opt: bool = False
 ) -> Union[
-    Tuple[str, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray],
-    Tuple[str, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray, ndarray, Dict],
+    Tuple[str, ndarray, ndarray, ndarray],
+    Tuple[str, ndarray, ndarray, ndarray, Dict],
 ]:
     """
     Performs a wavelet transform or windowed Fourier transform using the MATLAB-packaged libraries.
@@ -42,9 +46,10 @@ def _time_frequency(
     :param return_opt: whether to return the options from the transform function
 
     :return: the name of the input signal; the times associated with the input signal;
-    the frequencies produced by the transform; the values of the transform itself; the amplitudes
-    of the values of the transform; the powers of the values of the transform; the average amplitudes
-    of the transform; and the average powers of the transform.
+    the frequencies produced by the transform; and the values of the transform itself. The
+    amplitudes and powers are not returned, since `TFOutputData` calculates them when needed.
+    Large arrays are returned as `SharedArray` descriptors, which must be opened with
+    `shared_arrays.resolve_all()`.
     """
     wavelet = not params.transform == _wft
 
@@ -57,31 +62,42 @@ def _time_frequency(
         transform, freq = _wft_func(time_series, params)
         opt = {}
 
-    amplitude = np.abs(transform)
-    power = np.square(amplitude)
-    avg_ampl, avg_pow = avg_ampl_pow(amplitude)
-
     out = (
         time_series.name,
         time_series.times,
         freq,
         transform,
-        amplitude,
-        power,
-        avg_ampl,
-        avg_pow,
     )
 
     if return_opt:
-        return out + (opt,)
+        out += (opt,)
+
+    return share_all(out)
+
+
+def _wt_func(
+    signal: ndarray, params: TFParams, return_opt: bool, use_cache: bool = True
+):
+    """
+    Performs the wavelet transform, or loads it from the cache if the same signal has already
+    been transformed with the same parameters.
+
+    :param use_cache: whether to use the cache; should be False for signals which will not be
+    transformed again, such as surrogates
+    """
+    cache = _wt_cache() if use_cache else None
+    block_size = getattr(params, "block_size", None)
 
-    return out
+    if cache:
+        key = Cache.key("wt", signal, params.fs, params.get(), block_size)
+        entry = cache.load(key)
 
+        if entry:
+            return entry["wt"], entry["freq"], entry["opt"]
 
-def _wt_func(signal: ndarray, params: TFParams, return_opt: bool):
     impl = params.get_item("implementation") or "python"
 
-    result = pymodalib.wavelet_transform(
+    kwargs = dict(
         signal=signal,
         fs=params.fs,
         fmin=params.get_item("fmin"),
@@ -92,38 +108,76 @@ def _wt_func(signal: ndarray, params: TFParams, return_opt: bool):
         padding=params.get_item("Padding"),
         preprocess=params.get_item("Preprocess") == "on",
         rel_tolerance=params.get_item("RelTol"),
-        return_opt=return_opt,
         implementation=impl,
     )
 
-    try:
-        wt, freq, opt = result
-    except ValueError:
-        wt, freq = result
-        opt = {}
+    if block_size and len(signal) > block_size:
+        # Long signals are transformed in blocks, and the result is written to disk.
+        wt, freq, opt = streaming_wavelet_transform(block_size=block_size, **kwargs)
+    else:
+        # The options are always returned, so that they can be cached.
+        result = pymodalib.wavelet_transform(return_opt=True, **kwargs)
 
-    return wt, freq, opt
+        try:
+            wt, freq, opt = result
+        except ValueError:
+            wt, freq = result
+            opt = {}
 
+    if cache:
+        source = {"transform": "wt", "fs": params.fs, **params.get()}
+        cache.store(key, source=source, wt=wt, freq=freq, opt=opt)
 
-def _wft_func(signal, params):
-    # Don't move the import statement.
-    from maths.algorithms.matlabwrappers import wft
+    return wt, freq, opt
 
-    transform, freq = wft.calculate(signal, params)
-    return multi_matlab_to_numpy(transform, freq)
 
+def _wt_cache() -> Optional[Cache]:
+    """
+    Returns the cache used for wavelet transforms, or None if caching is disabled.
+    """
+    size = args.wt_cache_size()
+    if not size:
+        return None
+
+    return Cache(max_size=int(size * 1024 * 1024))
 
-def avg_ampl_pow(amplitude) -> Tuple[ndarray, ndarray]:
-    length = len(amplitude)
 
-    avg_ampl = np.empty(length, dtype=np.float64)
-    avg_pow = np.empty(length, dtype=np.float64)
+def _wft_func(time_series: TimeSeries, params: TFParams) -> Tuple[ndarray, ndarray]:
+    """
+    Performs the windowed Fourier transform, using the implementation selected in the params.
+    The MATLAB-packaged library is used unless the Python implementation is selected.
+    """
+    if params.wft_implementation != "python":
+        # Don't move the import statement.
+        from maths.algorithms.matlabwrappers import wft
+
+        transform, freq = wft.calculate(time_series, params)
+        return multi_matlab_to_numpy(transform, freq)
+
+    # The window parameters are stored with the cached wavelet transforms, so that they are
+    # calculated once rather than by every process.
+    cache = _wt_cache()
+    windowed_fourier.set_parameter_table(
+        os.path.join(cache.cache, "window_params.json") if cache else None
+    )
 
-    for i in range(length):
-        arr = amplitude[i]
-        row = arr[np.isfinite(arr)]
+    f0 = params.get_item("f0")
+    fmin = params.get_item("fmin")
 
-        avg_ampl[i] = np.mean(row)
-        avg_pow[i] = np.mean(np.square(row))
+    # As in the MATLAB wrapper, the resolution is relative to the minimum frequency.
+    if f0 is not None and fmin:
+        f0 = f0 / fmin
 
-    return avg_ampl, avg_pow
+    return windowed_fourier.wft(
+        signal=time_series.signal,
+        fs=params.fs,
+        fmin=fmin,
+        fmax=params.get_item("fmax"),
+        f0=f0 or 1,
+        fstep=params.get_item("fstep"),
+        window=params.get_item("Window"),
+        padding=params.get_item("Padding"),
+        rel_tol=params.get_item("RelTol"),
+        preprocess=params.get_item("Preprocess") == "on",
+        cut_edges=params.get_item("CutEdges") == "on",
+    )
@@ -0,0 +1,431 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Tuple, Callable, Sequence
+
+import numpy as np
+from numpy import ndarray
+from scipy.integrate import quad
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+"""
+Python implementation of ridge extraction, as calculated by `ecurve` and `rectfr` in MODA.
+
+The ridge of a component is the curve of amplitude peaks which it produces in a
+time-frequency representation: a wavelet transform or windowed Fourier transform. It is
+found with scheme II of Iatsenko et al. [1]: of all paths through the peaks at each time,
+the ridge maximises the sum of the log-amplitudes, minus penalties on the deviations of
+the frequency and of its changes from their values along the previous ridge. The path is
+the shortest path through the graph of the peaks, and it is optimised repeatedly until the
+ridge does not change.
+
+The component is reconstructed from the ridge with the direct method of MODA, which
+integrates the transform over the peak of each ridge point, or with the ridge method, which
+only uses the peak itself.
+
+The transform is never recalculated, so a transform of the full frequency range can be
+used for any number of frequency intervals by passing the rows of each interval.
+
+[1] D. Iatsenko, P. V. E. McClintock and A. Stefanovska, "Extraction of instantaneous
+frequencies from ridges in time-frequency representations of signals", Signal Processing
+125, 290-303 (2016).
+"""
+
+# Weights of the penalties on the changes of the frequency and on the frequency, relative
+# to the log-amplitude, as in the default scheme of MODA.
+_alpha = 1.0
+_beta = 1.0
+
+# Maximum number of edges in the graph of the peaks which is searched at once.
+_block_edges = 2 ** 22
+
+
+def ridge_extraction(
+    transform: ndarray,
+    freq: ndarray,
+    norm: Tuple[float, float] = None,
+    max_iterations: int = 20,
+    param: Sequence[float] = None,
+    path_opt: bool = True,
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    Extracts the ridge of the dominant component from a time-frequency representation, and
+    reconstructs the component's amplitude, phase and frequency from it.
+
+    :param transform: the wavelet transform or windowed Fourier transform, whose rows
+    correspond to frequencies; coefficients outside the cone of influence may be NaN
+    :param freq: the frequencies of the rows, in ascending order
+    :param norm: the constants C and D of the window or wavelet, which are used by the
+    direct reconstruction; if None, the ridge reconstruction is used
+    :param max_iterations: the maximum number of times the ridge is optimised
+    :param param: the weights of the penalties on the changes of the frequency and on the
+    frequency, as in the 'Param' option of MODA; defaults to (1, 1)
+    :param path_opt: whether the ridge is optimised as a path; otherwise, each point of the
+    ridge is the best peak at its own time
+    :return: the amplitude, unwrapped phase and frequency of the component at each time,
+    which are NaN where the transform has no peaks
+    """
+    ridge = ecurve(transform, freq, max_iterations, param, path_opt)
+    return rectfr(transform, freq, ridge, norm)
+
+
+def ecurve(
+    transform: ndarray,
+    freq: ndarray,
+    max_iterations: int = 20,
+    param: Sequence[float] = None,
+    path_opt: bool = True,
+) -> ndarray:
+    """
+    Finds the ridge of the dominant component in a time-frequency representation.
+
+    :param transform: the wavelet transform or windowed Fourier transform
+    :param freq: the frequencies of the rows, in ascending order
+    :param max_iterations: the maximum number of times the ridge is optimised
+    :param param: the weights of the penalties on the changes of the frequency and on the
+    frequency; defaults to (1, 1)
+    :param path_opt: whether the ridge is optimised as a path; otherwise, each point of the
+    ridge is the best peak at its own time
+    :return: the row of the ridge at each time, which is -1 where there are no peaks
+    """
+    if param is None:
+        alpha, beta = _alpha, _beta
+    elif np.size(param) == 2:
+        alpha, beta = np.asarray(param, dtype=np.float64).flatten()
+    else:
+        raise ValueError(
+            "Ridge extraction needs two parameters, the weights of the penalties on the "
+            f"changes of the frequency and on the frequency; got {param}."
+        )
+
+    ampl = _amplitude(transform)
+    NF, L = ampl.shape
+    ridge = np.full(L, -1, dtype=np.intp)
+
+    if NF == 0:
+        return ridge
+
+    nfreq, step, _ = _frequency_scale(freq)
+    peaks = _find_peaks(ampl)
+
+    # Table of the peaks at each time which has any, padded to the largest number of peaks;
+    # padding has a log-amplitude of -inf, so it is never on the ridge.
+    cols, rows = np.nonzero(peaks.T)
+    times, count = np.unique(cols, return_counts=True)
+    if len(times) == 0:
+        return ridge
+
+    T, M = len(times), count.max()
+    column = np.repeat(np.arange(T), count)
+    position = np.arange(len(cols)) - np.repeat(np.cumsum(count) - count, count)
+
+    peak_rows = np.zeros((T, M), dtype=np.intp)
+    peak_freq = np.zeros((T, M))
+    log_ampl = np.full((T, M), -np.inf)
+
+    pf, pa = _interpolate_peaks(ampl, rows, cols, nfreq)
+    peak_rows[column, position] = rows
+    peak_freq[column, position] = pf
+    log_ampl[column, position] = np.log(pa)
+
+    # The first ridge follows the highest peak at each time.
+    path = np.argmax(log_ampl, axis=1)
+
+    for _ in range(max(1, max_iterations)):
+        fm = peak_freq[np.arange(T), path]
+        dfm = np.diff(fm)
+
+        # The frequency resolution is used as the spread of a constant ridge.
+        mean, std = np.mean(fm), max(np.std(fm), step)
+        dmean = np.mean(dfm) if T > 1 else 0.0
+        dstd = max(np.std(dfm), step) if T > 1 else step
+
+        utility = log_ampl - beta * ((peak_freq - mean) / std) ** 2
+        if path_opt:
+            new_path = _optimal_path(utility, peak_freq, dmean, dstd, alpha)
+        else:
+            new_path = np.argmax(utility, axis=1)
+
+        converged = np.array_equal(new_path, path)
+        path = new_path
+        if converged:
+            break
+
+    ridge[times] = peak_rows[np.arange(T), path]
+    return ridge
+
+
+def rectfr(
+    transform: ndarray,
+    freq: ndarray,
+    ridge: ndarray,
+    norm: Tuple[float, float] = None,
+) -> Tuple[ndarray, ndarray, ndarray]:
+    """
+    Reconstructs a component's amplitude, phase and frequency from its ridge.
+
+    With the direct method of MODA, the transform is integrated over the peak of each ridge
+    point, which extends to the nearest minima of the amplitude on either side; on the
+    logarithmic scale for wavelet transforms and the linear scale for windowed Fourier
+    transforms. The integral is divided by the constant C of the window or wavelet, and the
+    mean frequency of the peak is multiplied by C/D. When D is infinite, as for the Morlet
+    wavelet, the frequency is found as in the ridge method.
+
+    With the ridge method of MODA, the peak of each ridge point is found by parabolic
+    interpolation. The spectra of the windows and wavelets have a peak of 1, so the
+    amplitude of the component is twice the amplitude of the transform at the peak.
+
+    :param transform: the wavelet transform or windowed Fourier transform
+    :param freq: the frequencies of the rows, in ascending order
+    :param ridge: the row of the ridge at each time, as returned by `ecurve`
+    :param norm: the constants C and D of the window or wavelet, as in MODA; if None, the
+    ridge method is used
+    :return: the amplitude, unwrapped phase and frequency of the component at each time,
+    which are NaN where the ridge is -1
+    """
+    L = transform.shape[1]
+    iamp, iphi, ifreq = np.full((3, L), np.nan)
+
+    cols = np.flatnonzero(ridge >= 0)
+    if len(cols) == 0:
+        return iamp, iphi, ifreq
+
+    rows = ridge[cols]
+    nfreq, step, log_scale = _frequency_scale(freq)
+    ampl = _amplitude(transform)
+
+    nf, amp = _interpolate_peaks(ampl, rows, cols, nfreq)
+    ifreq[cols] = np.exp(nf) if log_scale else nf
+
+    if norm is None:
+        iamp[cols] = 2 * amp
+        iphi[cols] = np.unwrap(np.angle(transform[rows, cols]))
+
+        return iamp, iphi, ifreq
+
+    C, D = norm
+    values = np.nan_to_num(np.asarray(transform)[:, cols])
+    support = _peak_support(ampl[:, cols], rows)
+
+    integral = np.sum(values, axis=0, where=support)
+    component = step * integral / C
+
+    iamp[cols] = np.abs(component)
+    iphi[cols] = np.unwrap(np.angle(component))
+
+    if np.isfinite(D):
+        mean_freq = np.sum(values * np.asarray(freq)[:, None], axis=0, where=support)
+        ifreq[cols] = (C / D) * np.real(mean_freq / integral)
+
+    return iamp, iphi, ifreq
+
+
+def window_constants(twf: Callable[[ndarray], ndarray]) -> Tuple[float, float]:
+    """
+    Returns the constants of the direct reconstruction from a windowed Fourier transform.
+
+    The window has unit area, so the integral of its spectrum over frequency is its value at
+    zero; the spectrum of a component with amplitude A is A/2 times the spectrum of the
+    window, so C is half of the window's value at zero. The window is even, so the mean
+    frequency of each peak is the frequency of the component, and D is equal to C.
+
+    :param twf: the window in the time domain
+    :return: the constants C and D
+    """
+    C = float(np.real(twf(0))) / 2
+    return C, C
+
+
+def wavelet_constant(fwt: Callable[[float], float]) -> float:
+    """
+    Returns the constant C of the direct reconstruction from a wavelet transform, which is
+    half of the integral of the wavelet's spectrum over the logarithm of the frequency.
+
+    :param fwt: the wavelet in the frequency domain
+    :return: the constant C
+    """
+    spectrum = lambda u: float(np.real(fwt(np.exp(u))))
+    return quad(spectrum, -np.inf, np.inf)[0] / 2
+
+
+def _amplitude(transform: ndarray) -> ndarray:
+    """
+    Returns the amplitude of a transform, which is 0 where the coefficients are NaN.
+    """
+    ampl = np.abs(np.asarray(transform))
+    ampl[~np.isfinite(ampl)] = 0
+    return ampl
+
+
+def _frequency_scale(freq: ndarray) -> Tuple[ndarray, float, bool]:
+    """
+    Returns the frequencies on the scale where they are evenly spaced, as in MODA: the
+    logarithmic scale for wavelet transforms, and the linear scale for windowed Fourier
+    transforms.
+
+    :return: the frequencies on the scale, the mean distance between them, and whether the
+    scale is logarithmic
+    """
+    freq = np.asarray(freq, dtype=np.float64)
+    if len(freq) < 2:
+        return freq, 1.0, False
+
+    log_scale = freq[0] > 0 and np.std(np.diff(np.log(freq))) < np.std(np.diff(freq))
+    nfreq = np.log(freq) if log_scale else freq
+
+    return nfreq, (nfreq[-1] - nfreq[0]) / (len(nfreq) - 1), log_scale
+
+
+def _find_peaks(ampl: ndarray) -> ndarray:
+    """
+    Finds the local maxima of the amplitude over frequency at each time. The first and
+    last rows are peaks if they are above their only neighbour.
+    """
+    below = np.zeros(ampl.shape, dtype=bool)
+    above = np.zeros(ampl.shape, dtype=bool)
+
+    # Whether each row is strictly above the row below it, and at least the row above it.
+    below[0] = True
+    below[1:] = ampl[1:] > ampl[:-1]
+    above[-1] = True
+    above[:-1] = ampl[:-1] >= ampl[1:]
+
+    return below & above & (ampl > 0)
+
+
+def _interpolate_peaks(
+    ampl: ndarray, rows: ndarray, cols: ndarray, nfreq: ndarray
+) -> Tuple[ndarray, ndarray]:
+    """
+    Refines the position and amplitude of peaks by fitting a parabola to each peak and its
+    neighbours. Peaks in the first or last row are not refined.
+
+    :param ampl: the amplitude of the transform
+    :param rows: the row of each peak
+    :param cols: the column of each peak
+    :param nfreq: the frequencies on the scale returned by `_frequency_scale`
+    :return: the frequency of each peak on the same scale, and its amplitude
+    """
+    NF = ampl.shape[0]
+    inside = (rows > 0) & (rows < NF - 1)
+
+    b = ampl[rows, cols]
+    a = np.where(inside, ampl[np.maximum(rows - 1, 0), cols], b)
+    c = np.where(inside, ampl[np.minimum(rows + 1, NF - 1), cols], b)
+
+    curvature = a - 2 * b + c
+    offset = np.divide(
+        0.5 * (a - c), curvature, out=np.zeros(b.shape), where=curvature < 0
+    )
+    offset = np.clip(offset, -0.5, 0.5)
+
+    # The distance to the next row, in the direction of the offset.
+    next_rows = np.clip(rows + np.sign(offset).astype(np.intp), 0, NF - 1)
+    spacing = np.abs(nfreq[next_rows] - nfreq[rows])
+
+    return nfreq[rows] + offset * spacing, b - 0.25 * (a - c) * offset
+
+
+def _peak_support(ampl: ndarray, rows: ndarray) -> ndarray:
+    """
+    Finds the rows of the peak at each time, which extend from the peak to the nearest
+    minimum of the amplitude, or the first or last row, on either side.
+
+    :param ampl: the amplitude of the transform, with a column for each time
+    :param rows: the row of the peak at each time
+    :return: whether each row of each column is part of the peak
+    """
+    NF = ampl.shape[0]
+    index = np.arange(NF)[:, None]
+
+    minima = np.ones(ampl.shape, dtype=bool)
+    minima[1:-1] = (ampl[1:-1] <= ampl[:-2]) & (ampl[1:-1] <= ampl[2:])
+
+    # The nearest minimum at or below each row, and at or above it.
+    lower = np.maximum.accumulate(np.where(minima, index, 0), axis=0)
+    upper = np.minimum.accumulate(np.where(minima, index, NF - 1)[::-1], axis=0)[::-1]
+
+    cols = np.arange(len(rows))
+    return (index >= lower[rows, cols]) & (index <= upper[rows, cols])
+
+
+def _optimal_path(
+    utility: ndarray, peak_freq: ndarray, dmean: float, dstd: float, alpha: float
+) -> ndarray:
+    """
+    Finds the path through the table of peaks which maximises the sum of the utility of
+    each peak, minus the penalty on each change of frequency.
+
+    The path is the shortest path through the graph whose nodes are the peaks, with an edge
+    from each peak to each peak at the next time, which is found with scipy's implementation
+    of Dijkstra's algorithm. The graph of a long signal is searched in blocks of times,
+    starting from the distances to the peaks at the end of the previous block.
+
+    :param utility: the utility of each peak, with a row for each time; padding is -inf
+    :param peak_freq: the frequency of each peak
+    :param dmean: the mean change of frequency along the previous ridge
+    :param dstd: the standard deviation of the change of frequency along the previous ridge
+    :param alpha: the weight of the penalty on the changes of frequency
+    :return: the column of the table which is on the path at each time
+    """
+    T, M = utility.shape
+    valid = np.isfinite(utility)
+
+    # Every path passes through one peak at each time, so a constant can be added to the
+    # cost of the peaks at each time. This makes all costs positive, as Dijkstra's algorithm
+    # requires.
+    cost = np.max(utility, axis=1, keepdims=True) + 1 - utility
+
+    previous = np.zeros((T, M), dtype=np.intp)
+    distance = cost[0]
+
+    times = max(1, _block_edges // M ** 2)
+    for start in range(0, T - 1, times):
+        stop = min(T, start + times + 1)
+        N = (stop - start) * M
+
+        # Node 0 is the source, and node 1 + k * M + i is peak i at time start + k. The
+        # edges are in the order of their sources, so the graph is built in CSR format.
+        edges = valid[start : stop - 1, :, None] & valid[start + 1 : stop, None, :]
+        jump = (
+            peak_freq[start + 1 : stop, None, :] - peak_freq[start : stop - 1, :, None]
+        )
+        weight = cost[start + 1 : stop, None, :] + alpha * ((jump - dmean) / dstd) ** 2
+        target = np.arange(M + 1, N + 1).reshape(-1, 1, M)
+
+        first = np.flatnonzero(np.isfinite(distance))
+        count = np.concatenate(([len(first)], edges.sum(axis=2).ravel(), np.zeros(M)))
+
+        weight = np.concatenate(
+            (distance[first] - distance[first].min() + 1, weight[edges])
+        )
+        target = np.concatenate(
+            (1 + first, np.broadcast_to(target, edges.shape)[edges])
+        )
+        indptr = np.concatenate(([0], np.cumsum(count))).astype(np.intp)
+
+        graph = csr_matrix((weight, target, indptr), shape=(N + 1, N + 1))
+        dist, pred = dijkstra(graph, indices=0, return_predecessors=True)
+
+        previous[start + 1 : stop] = (pred[M + 1 :].reshape(-1, M) - 1) % M
+        distance = dist[N + 1 - M :]
+
+    path = np.empty(T, dtype=np.intp)
+    path[-1] = np.argmin(distance)
+    for t in range(T - 1, 0, -1):
+        path[t - 1] = previous[t, path[t]]
+
+    return path
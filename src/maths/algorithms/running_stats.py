@@ -0,0 +1,211 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Tuple, Optional
+
+import numpy as np
+from numpy import ndarray
+
+"""
+Running statistics over many arrays of the same shape, such as the phase coherence of each
+surrogate. The memory used does not depend on the number of arrays.
+"""
+
+
+class RunningStats:
+    """
+    Accumulates the element-wise mean of arrays which are added one at a time, and optionally
+    a histogram of their values which is used to estimate percentiles.
+
+    Instances calculated in different processes can be combined with `merge()`, so a large
+    number of arrays can be split between several tasks.
+    """
+
+    def __init__(
+        self,
+        track_percentiles: bool = False,
+        bins: int = 1000,
+        value_range: Tuple[float, float] = (0, 1),
+    ):
+        """
+        :param track_percentiles: whether to keep the histogram required by `percentile()`
+        :param bins: the number of bins in the histogram; percentiles are accurate to the width of one bin
+        :param value_range: the range of the histogram; values outside the range are counted in the first or last bin
+        """
+        self.track_percentiles = track_percentiles
+        self.bins = bins
+        self.value_range = value_range
+
+        # The number of finite values added at each position, and their mean.
+        self.count: Optional[ndarray] = None
+        self._mean: Optional[ndarray] = None
+
+        # Shape is the shape of the arrays, plus the number of bins.
+        self.histogram: Optional[ndarray] = None
+
+    def add(self, values: ndarray) -> None:
+        """
+        Adds an array. NaN values are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+
+        if self.count is None:
+            self.count = np.zeros(values.shape, dtype=np.int64)
+            self._mean = np.zeros(values.shape, dtype=np.float64)
+
+            if self.track_percentiles:
+                self.histogram = np.zeros((*values.shape, self.bins), dtype=np.int32)
+
+        finite = np.isfinite(values)
+        self.count += finite
+
+        delta = np.where(finite, values, self._mean) - self._mean
+        self._mean += np.divide(
+            delta, self.count, out=np.zeros_like(delta), where=finite
+        )
+
+        if self.histogram is not None:
+            lo, hi = self.value_range
+            index = np.floor((values[finite] - lo) / (hi - lo) * self.bins)
+            index = np.clip(index, 0, self.bins - 1).astype(np.intp)
+
+            # Each position receives at most one value, so there are no repeated indices.
+            self.histogram[finite, index] += 1
+
+    def merge(self, other: "RunningStats") -> None:
+        """
+        Adds the arrays accumulated by another instance.
+        """
+        if other.count is None:
+            return
+
+        if self.count is None:
+            self.count = other.count.copy()
+            self._mean = other._mean.copy()
+            self.histogram = None if other.histogram is None else other.histogram.copy()
+            return
+
+        total = self.count + other.count
+        weight = np.divide(
+            other.count, total, out=np.zeros(total.shape), where=total > 0
+        )
+
+        self._mean += (other._mean - self._mean) * weight
+        self.count = total
+
+        if self.histogram is not None and other.histogram is not None:
+            self.histogram += other.histogram
+        else:
+            self.histogram = None
+
+    def mean(self) -> ndarray:
+        """
+        Returns the element-wise mean, which is NaN where no finite values were added.
+        """
+        return np.where(self.count > 0, self._mean, np.nan)
+
+    def percentile(self, q: float) -> ndarray:
+        """
+        Estimates the element-wise percentile, by interpolating linearly within the histogram bin
+        which contains it.
+
+        :param q: the percentile, between 0 and 100
+        :return: the estimated percentile, which is NaN where no finite values were added
+        """
+        if self.histogram is None:
+            raise ValueError(
+                "Percentiles are only available when `track_percentiles` is True."
+            )
+
+        lo, hi = self.value_range
+        width = (hi - lo) / self.bins
+
+        cumulative = np.cumsum(self.histogram, axis=-1)
+        target = q / 100 * self.count
+
+        # The first bin whose cumulative count reaches the target.
+        index = np.argmax(cumulative >= target[..., None], axis=-1)
+
+        in_bin = np.take_along_axis(self.histogram, index[..., None], axis=-1)[..., 0]
+        before = (
+            np.take_along_axis(cumulative, index[..., None], axis=-1)[..., 0] - in_bin
+        )
+
+        fraction = np.divide(
+            target - before, in_bin, out=np.zeros(target.shape), where=in_bin > 0
+        )
+        result = lo + (index + fraction) * width
+
+        return np.where(self.count > 0, result, np.nan)
+
+
+class RunningOrderStatistic:
+    """
+    Keeps the k largest values at each position of arrays which are added one at a time,
+    so that the k-th largest value can be found exactly without storing every array.
+
+    Like `RunningStats`, instances calculated in different processes can be combined with
+    `merge()`.
+    """
+
+    def __init__(self, k: int):
+        """
+        :param k: the rank of the order statistic, where 1 is the maximum
+        """
+        if k < 1:
+            raise ValueError(f"The rank must be at least 1, not {k}.")
+
+        self.k = k
+
+        # The largest values at each position, along the last axis, in no particular order.
+        # NaN values are stored as -inf.
+        self.largest: Optional[ndarray] = None
+
+    def add(self, values: ndarray) -> None:
+        """
+        Adds an array. NaN values are ignored.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        values = np.where(np.isnan(values), -np.inf, values)
+
+        self._update(values[..., None])
+
+    def merge(self, other: "RunningOrderStatistic") -> None:
+        """
+        Adds the arrays accumulated by another instance.
+        """
+        if other.largest is not None:
+            self._update(other.largest)
+
+    def _update(self, values: ndarray) -> None:
+        if self.largest is not None:
+            values = np.concatenate((self.largest, values), axis=-1)
+
+        n = values.shape[-1]
+        if n > self.k:
+            values = np.partition(values, n - self.k, axis=-1)[..., n - self.k :]
+
+        self.largest = values
+
+    def value(self) -> ndarray:
+        """
+        Returns the k-th largest value at each position, which is NaN where fewer than k
+        finite values were added.
+        """
+        if self.largest is None or self.largest.shape[-1] < self.k:
+            raise ValueError(f"Fewer than {self.k} arrays have been added.")
+
+        result = np.min(self.largest, axis=-1)
+        return np.where(np.isfinite(result), result, np.nan)
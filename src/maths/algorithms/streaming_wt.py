@@ -0,0 +1,236 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+from typing import Tuple, Dict
+
+import numpy as np
+import pymodalib
+from numpy import ndarray
+
+from maths.algorithms.wavelets import wavelet_functions
+from processes import shared_arrays
+
+"""
+Wavelet transform for signals which are too long to transform in a single call.
+
+The signal is split into overlapping blocks, and each block is transformed separately.
+The overlap on each side of a block is the width of the cone of influence at the lowest
+frequency, which is calculated from the parameters of the wavelet as in PyMODAlib, so
+every coefficient which is kept lies inside the cone of influence of its block; these
+coefficients match the transform of the whole signal up to the relative tolerance which
+defines the cone of influence. The result is written block-by-block to a
+memory-mapped array, so the whole transform never needs to fit in memory.
+"""
+
+
+def streaming_wavelet_transform(
+    signal: ndarray,
+    fs: float,
+    fmin: float,
+    fmax: float,
+    block_size: int,
+    preprocess: bool = True,
+    cut_edges: bool = False,
+    resolution: float = 1,
+    wavelet: str = "Lognorm",
+    rel_tolerance: float = 0.01,
+    **kwargs,
+) -> Tuple[np.memmap, ndarray, Dict]:
+    """
+    Performs the wavelet transform on overlapping blocks of a signal.
+
+    :param signal: the signal to transform
+    :param fs: the sampling frequency of the signal
+    :param fmin: the minimum frequency; if None, the default of `pymodalib.wavelet_transform` for the
+    whole signal is used, whose cone of influence spans the whole signal, so the signal is
+    transformed without being split into blocks
+    :param fmax: the maximum frequency
+    :param block_size: the length of each block, in samples
+    :param preprocess: whether to perform pre-processing on the whole signal before it is split
+    :param cut_edges: whether to set the coefficients outside the cone of influence of the whole signal to NaN
+    :param resolution: the resolution parameter of the wavelet
+    :param wavelet: the name of the wavelet
+    :param rel_tolerance: the relative tolerance which defines the cone of influence
+    :param kwargs: other keyword arguments to pass to `pymodalib.wavelet_transform`
+    :return: the transform, as a memory-mapped array unless the signal fits in a single block;
+    the frequencies; and the options used
+    """
+    signal = np.asarray(signal).flatten()
+    fmax = fmax or fs / 2
+    length = len(signal)
+
+    resolution = resolution or 1
+    wavelet = wavelet or "Lognorm"
+    rel_tolerance = rel_tolerance or 0.01
+    kwargs.update(resolution=resolution, wavelet=wavelet, rel_tolerance=rel_tolerance)
+
+    wp = _wavelet_parameters(length, fs, fmax, resolution, wavelet, rel_tolerance)
+    default_fmin = not fmin
+    if default_fmin:
+        # The default of the transform: the lowest frequency with any coefficient inside
+        # the cone of influence of the whole signal.
+        fmin = wp.ompeak / (2 * np.pi) * (_time(wp.t2e) - _time(wp.t1e)) * fs / length
+
+    coi_left, coi_right = _coi_samples(wp, fs, np.array([fmin]))
+    overlap_left, overlap_right = coi_left[0], coi_right[0]
+    step = block_size - overlap_left - overlap_right
+
+    if step <= 0 and default_fmin and length > block_size:
+        # The cone of influence at the default minimum frequency spans the whole signal.
+        print(
+            f"The wavelet transform of {length} samples is not calculated in blocks, because "
+            f"the cone of influence at the default minimum frequency ({fmin:.3g} Hz) is wider "
+            f"than a block. Specify a higher minimum frequency to calculate it in blocks."
+        )
+        return _transform(signal, fs, None, fmax, cut_edges, kwargs, preprocess)
+
+    # Pre-processing depends on the whole signal, so it cannot be applied to each block.
+    if preprocess:
+        signal = pymodalib.preprocess(signal, fs, fmin, fmax)
+
+    if length <= block_size:
+        return _transform(signal, fs, fmin, fmax, cut_edges, kwargs)
+
+    if step <= 0:
+        raise ValueError(
+            f"The block size ({block_size} samples) is too short for the cone of influence "
+            f"at {fmin} Hz. Increase the block size or the minimum frequency."
+        )
+
+    wt = None
+    freq = None
+    opt = {}
+
+    start = 0
+    while start < length:
+        end = min(length, start + step)
+
+        # Extend the block so that the coefficients in [start, end) are inside its cone of influence.
+        block_start = max(0, start - overlap_left)
+        block_end = min(length, end + overlap_right)
+
+        block_wt, freq, opt = _transform(
+            signal[block_start:block_end], fs, fmin, fmax, False, kwargs
+        )
+
+        if wt is None:
+            wt = shared_arrays.create((len(freq), length), block_wt.dtype)
+
+        wt[:, start:end] = block_wt[:, start - block_start : end - block_start]
+        wt.flush()
+
+        start = end
+
+    if cut_edges:
+        coi_left, coi_right = _coi_samples(wp, fs, freq)
+        for row in range(wt.shape[0]):
+            left, right = coi_left[row], coi_right[row]
+
+            if left + right >= length:
+                wt[row, :] = np.nan
+            else:
+                wt[row, :left] = np.nan
+                wt[row, length - right :] = np.nan
+
+    opt = dict(opt)
+    opt.update(
+        {
+            "fmin": fmin,
+            "fmax": fmax,
+            "preprocess": preprocess,
+            "cut_edges": cut_edges,
+            "block_size": block_size,
+        }
+    )
+
+    return wt, freq, opt
+
+
+def _transform(
+    signal: ndarray,
+    fs: float,
+    fmin: float,
+    fmax: float,
+    cut_edges: bool,
+    kwargs: Dict,
+    preprocess: bool = False,
+) -> Tuple[ndarray, ndarray, Dict]:
+    result = pymodalib.wavelet_transform(
+        signal=signal,
+        fs=fs,
+        fmin=fmin,
+        fmax=fmax,
+        cut_edges=cut_edges,
+        preprocess=preprocess,
+        return_opt=True,
+        **kwargs,
+    )
+
+    try:
+        wt, freq, opt = result
+    except ValueError:
+        wt, freq = result
+        opt = {}
+
+    return wt, freq, opt
+
+
+def _wavelet_parameters(
+    length: int,
+    fs: float,
+    fmax: float,
+    resolution: float,
+    wavelet: str,
+    rel_tolerance: float,
+):
+    """
+    Calculates the parameters of a wavelet, including its cone of influence, as the Python
+    implementation of the wavelet transform in PyMODAlib does for a signal of the same length.
+
+    :return: the `WindowParams` of the wavelet
+    """
+    from pymodalib.implementations.python.wavelet.wavelet_transform import parcalc
+
+    wp = wavelet_functions(wavelet, resolution)
+    if wp is None:
+        raise ValueError(
+            f"The wavelet transform cannot be calculated in blocks with the '{wavelet}' wavelet."
+        )
+
+    twf = wp.twf if wp.has_twf else []
+    parcalc(rel_tolerance, length, wp, wp.fwt, twf, False, wp.f0, fmax, fs=fs)
+    return wp
+
+
+def _time(value) -> float:
+    return float(np.squeeze(value))
+
+
+def _coi_samples(wp, fs: float, freq: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates the width of the cone of influence at each frequency, in samples, as in
+    PyMODAlib.
+
+    :param wp: the parameters of the wavelet, returned by `_wavelet_parameters`
+    :param fs: the sampling frequency
+    :param freq: the frequencies
+    :return: the widths of the left and right parts of the cone of influence, for each frequency
+    """
+    scale = fs * wp.ompeak / (2 * np.pi * np.asarray(freq, dtype=np.float64))
+
+    left = np.ceil(np.abs(_time(wp.t1e) * scale))
+    right = np.ceil(np.abs(_time(wp.t2e) * scale))
+
+    return left.astype(int), right.astype(int)
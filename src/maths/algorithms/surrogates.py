@@ -13,23 +13,20 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-import random
-from typing import Union, Tuple
+from typing import Union, Tuple, Callable, Iterator, List
 
 import numpy as np
 from numpy import ndarray
-from numpy.random import permutation as randperm
+from numpy.lib.stride_tricks import as_strided
 
+from maths.algorithms.modwt import modwt, imodwt_step
 from maths.signals.TimeSeries import TimeSeries
 
 """
 Translation of `surrcalc` from MODA.
 
 STATUS: 
-- RP, FT, AAFT, IAFFT1, tshift and CPP surrogates are implemented.
-- IAFFT1 needs to be fixed (it crashes). 
-- IAAFT is not implemented yet.
-- WIAAFT requires a function "modwt" which is not implemented in scipy. Not implemented yet.
+- RP, FT, AAFT, IAAFT1, IAAFT2, WIAAFT, tshift and CPP surrogates are implemented.
 - Results may need to be checked for surrogates. 
 """
 
@@ -44,7 +41,13 @@ _CPP = "CPP"
 
 
 def surrogate_calc(
-    time_series: Union[TimeSeries, ndarray], N: int, method: str, pp: bool, fs: float
+    time_series: Union[TimeSeries, ndarray],
+    N: int,
+    method: str,
+    pp: bool,
+    fs: float,
+    seed: Union[int, np.random.SeedSequence, np.random.Generator] = None,
+    max_iterations: int = 1000,
 ) -> Tuple[ndarray, "Params"]:
     """
     Calculates surrogates.
@@ -54,6 +57,10 @@ def surrogate_calc(
     :param method: the required surrogate type
     :param pp: whether to perform preprocessing
     :param fs: the sampling frequency
+    :param seed: the seed, or random number generator, used to generate the surrogates; the same
+    seed always gives the same surrogates
+    :param max_iterations: the maximum number of iterations for IAAFT surrogates; the number
+    of iterations used for each surrogate is stored in `params.iterations`
     :return: the surrogate signal(s) and params
     """
     if isinstance(time_series, TimeSeries):
@@ -61,7 +68,7 @@ def surrogate_calc(
     else:
         sig = time_series
 
-    surr = np.empty((N, len(sig)), dtype=np.float64)
+    rng = np.random.default_rng(seed)
 
     params = Params()
     origsig = sig
@@ -81,198 +88,50 @@ def surrogate_calc(
         params.preprocessing = False
 
     L = len(sig)
-    L2 = np.int(np.ceil(L / 2))
+    surr = np.empty((N, L), dtype=np.float64)
 
     params.time = time
 
     # Random permutation surrogates.
     if method == _RP:
-        for k in range(N):
-            surr[k, :] = sig[randperm(L)]
+        _fill(surr, _random_permutation, sig, rng)
 
     # Fourier transform surrogates.
     elif method == _FT:
-        b = 2 * np.pi
-
-        # Note: removed 'eta' parameter from function.
-        eta = b * np.random.rand(N, L2 - 1)
-
-        ftsig = np.fft.fft(sig, axis=0)
-        ftrp = np.zeros((N, len(ftsig)), dtype=np.complex64)
-        ftrp[:, 0] = ftsig[0]
-
-        F = ftsig[1:L2]
-        F = np.tile(F, (N, 1))
-
-        ftrp[:, 1:L2] = F * np.exp(1j * eta)
-        ftrp[:, 1 + L - L2 : L] = np.conj(np.fliplr(ftrp[:, 1:L2]))
-
-        surr = np.fft.ifft(ftrp, axis=0)
-        surr = np.real(surr)
-
-        params.rphases = eta
+        _fill(surr, _fourier_transform, sig, rng)
 
     # Amplitude-adjusted Fourier transform surrogates.
     elif method == _AAFT:
-        b = 2 * np.pi
-        eta = b * np.random.rand(N, L2 - 1)
-
-        val = np.sort(sig)
-        ind = np.argsort(sig)
-        rankind = np.empty(ind.shape, dtype=np.int)
-        rankind[ind] = np.arange(0, L)
-
-        gn = np.sort(np.random.randn(N, len(sig)), 1)
-        for j in range(N):
-            gn[j, :] = gn[j, rankind]
-
-        ftgn = np.fft.fft(gn, axis=0)
-        F = ftgn[:, 1:L2]
-
-        surr = np.zeros((N, len(sig)), dtype=np.complex)
-        surr[:, 0] = gn[:, 0]
-        surr[:, 1:L2] = np.multiply(F, np.exp(np.complex(0, 1) * eta))
-        surr[:, 1 + L - L2 : L] = np.conj(np.fliplr(surr[:, 1:L2]))
-        surr = np.fft.ifft(surr, axis=0)
-
-        ind2 = np.argsort(surr, axis=1)
-        rrank = np.zeros((1, L), dtype=np.int)
-        for k in range(N):
-            rrank[:, ind2[k, :]] = np.arange(0, L)
-            surr[k, :] = val[rrank]
-
-        surr = np.real(surr)
-
-    # Iterated amplitude-adjusted Fourier transform with exact distribution.
-    elif method == _IAFFT1:
-        maxit = 1000
-        val = np.sort(sig)
-        ind = np.argsort(sig)
-
-        rankind = np.empty(ind.shape, dtype=np.int)
-        rankind[ind] = np.arange(0, L)
-
-        ftsig = np.fft.fft(sig, axis=0)
-        F = np.tile(ftsig, (N, 1))
-        surr = np.zeros((N, L))
-
-        for j in range(N):
-            surr[j, :] = sig[randperm(L)]
-
-        it = 1
-        irank = rankind.copy()
-        irank = np.tile(irank, (N, 1))
-        irank2 = np.zeros((1, L))
-        oldrank = np.zeros((N, L))
-        iind = np.zeros((N, L))
-        iterf = iind.copy()
-
-        while np.max(np.abs(oldrank - irank), axis=1) != 0 and it < maxit:
-            go = np.max(np.abs(oldrank - irank), axis=1)
-            go_c = go.conj().T
-
-            inc = go_c[go_c != 0].nonzero()
-
-            oldrank = irank.copy()
-            iterf[inc, :] = np.real(np.fft.ifft(np.abs(F[inc, :]), axis=0)) * np.exp(
-                1j * np.angle(np.fft.fft(surr[inc, :], axis=1))
-            )
-
-            iind[inc, :] = np.sort(iterf[inc, :], axis=1)
-            for k in range(inc):
-                irank2[iind[k, :]] = np.arange(0, L)
-                irank[k, :] = irank2.copy()
-                surr[k, :] = val[irank2]
-
-            it += 1
-
-    # Iterated amplitude-adjusted Fourier transform with exact spectrum.
-    elif method == _IAFFT2:  # Note: needs testing.
-        maxit = 1000
-
-        val = np.sort(sig)
-        ind = np.argsort(sig)
-
-        rankind = np.empty(L, dtype=np.int64)
-        rankind[ind] = np.arange(0, L)
-
-        ftsig = np.fft.fft(sig, axis=0)
-        F = ftsig[np.ones((1, N)), :]
-        surr = np.zeros((N, L))
-
-        for j in range(N):
-            surr[j, :] = sig[randperm(L)]
-
-        it = 1
-        irank = rankind.copy()
-        irank = irank[np.ones((1, N)), :]
-        irank2 = np.zeros((N, L))
-        oldrank = np.zeros((N, L))
-        iind = np.zeros((N, L))
-        iterf = np.zeros((N, L))
-
-        while np.max(np.abs(oldrank - irank)) != 0 and it < maxit:
-            go = np.max(np.abs(oldrank - irank))
-            inc = (go.T != 0).nonzero()[0]
-
-            oldrank = irank.copy()
-            iterf[inc, :] = np.real(
-                np.fft.ifft(
-                    np.abs(F[inc, :])
-                    * np.exp(1j * np.angle(np.fft.fft(surr[inc, :], axis=1))),
-                    axis=1,
-                )
-            )
-
-            iind[inc, :] = np.argsort(iterf[inc, :], axis=1)
+        _fill(surr, _amplitude_adjusted, sig, rng)
 
-            k = inc
-            irank2[iind[k, :]] = np.arange(0, L)
-            irank[k, :] = irank2.copy()
-            surr[k, :] = val[irank2]
+    # Iterated amplitude-adjusted Fourier transform with exact distribution (IAAFT1), with
+    # exact spectrum (IAAFT2), or constrained by the wavelet coefficients (WIAAFT).
+    elif method in (_IAFFT1, _IAFFT2, _WIAFFT):
+        iterations = []
 
-            it += 1
+        def iterate(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+            if method == _WIAFFT:
+                result, it = _wavelet_iterative_amplitude_adjusted(
+                    sig, n, rng, max_iterations
+                )
+            else:
+                result, it = _iterative_amplitude_adjusted(
+                    sig, n, rng, method == _IAFFT2, max_iterations
+                )
 
-        surr = iterf
+            iterations.append(it)
+            return result
 
-    # Wavelet iterated amplitude adjusted Fourier transform surrogates
-    elif method == _WIAFFT:
-        pass
+        _fill(surr, iterate, sig, rng)
+        params.iterations = np.concatenate(iterations)
 
     # Time-shifted surrogates.
     elif method == _tshift:
-        for sn in range(N):
-            startp = random.randint(1, L - 1)
-            surr[sn, :] = np.hstack([sig[startp:L], sig[:startp]])
+        _fill(surr, _time_shift, sig, rng)
 
     # Cycle phase permutation surrogates.
     elif method == _CPP:
-        signal = np.mod(sig, 2 * np.pi)
-
-        dcpoints = ((signal[1:] - signal[:-1]) < -np.pi).nonzero()
-        dcpoints = dcpoints[0]
-
-        NC = len(dcpoints) - 1
-        if NC > 0:
-            cycles = []
-
-            for k in range(NC):
-                cycles.append(signal[dcpoints[k] : dcpoints[k + 1]])
-
-            stcycle = signal[: dcpoints[0]]
-            endcycle = signal[dcpoints[NC] :]
-
-            rand_cycles = []
-            for i in randperm(NC):
-                rand_cycles.append(cycles[i])
-
-            for sn in range(N):
-                surr[sn, :] = np.unwrap(
-                    np.concatenate((stcycle, *rand_cycles, endcycle))
-                )
-        else:
-            for sn in range(N):
-                surr[sn, :] = np.unwrap(signal)
+        _fill(surr, _cycle_phase_permutation, sig, rng)
 
     params.type = method
     params.numsurr = N
@@ -291,42 +150,396 @@ def surrogate_calc(
     return surr, params
 
 
+# Number of surrogates which `surrogate_stream` generates together. Each chunk has its own
+# random number generator, so the surrogates only depend on the seed, and not on how the
+# chunks are divided between processes.
+surrogate_chunk_size = 4
+
+
+def surrogate_stream(
+    time_series: Union[TimeSeries, ndarray],
+    N: int,
+    method: str,
+    pp: bool,
+    fs: float,
+    seed: Union[int, np.random.SeedSequence] = None,
+    chunks: range = None,
+    **kwargs,
+) -> Iterator[ndarray]:
+    """
+    Generates surrogates lazily, a few at a time.
+
+    The N surrogates are divided into chunks of `surrogate_chunk_size`, and each chunk is generated
+    from an independent child of the seed. To generate surrogates in parallel, pass the same seed to
+    each process with a different range of chunks (see `surrogate_chunks`); the surrogates are the
+    same as if they were generated in a single process.
+
+    :param time_series: the original signal as a TimeSeries
+    :param N: the total number of surrogates
+    :param method: the required surrogate type
+    :param pp: whether to perform preprocessing
+    :param fs: the sampling frequency
+    :param seed: the seed; to generate surrogates in parallel, this must be a `SeedSequence` (or an int)
+    rather than None, so that every process uses the same seed
+    :param chunks: the indices of the chunks to generate; defaults to all chunks
+    :param kwargs: other keyword arguments to pass to `surrogate_calc`
+    :return: iterator which yields each surrogate as a 1D array
+    """
+    if chunks is None:
+        chunks = range(_chunk_count(N))
+
+    seeds = spawn_seeds(seed, _chunk_count(N))
+
+    for c in chunks:
+        size = min(surrogate_chunk_size, N - c * surrogate_chunk_size)
+        surr, _ = surrogate_calc(time_series, size, method, pp, fs, seeds[c], **kwargs)
+
+        yield from surr
+
+
+def surrogate_chunks(N: int, parts: int) -> List[range]:
+    """
+    Divides the chunks of N surrogates into at most `parts` contiguous ranges, which can be
+    passed to `surrogate_stream` by separate tasks.
+    """
+    count = _chunk_count(N)
+    parts = max(1, min(count, parts))
+    size, remainder = divmod(count, parts)
+
+    ranges = []
+    start = 0
+    for i in range(parts):
+        end = start + size + (1 if i < remainder else 0)
+        ranges.append(range(start, end))
+        start = end
+
+    return ranges
+
+
+def spawn_seeds(
+    seed: Union[int, np.random.SeedSequence], count: int
+) -> List[np.random.SeedSequence]:
+    """
+    Returns independent child seeds. Unlike `SeedSequence.spawn`, the result does not depend on
+    how many children were previously spawned, so it is the same in every process.
+
+    :param seed: the parent seed; if None, fresh entropy is used
+    :param count: the number of child seeds
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+
+    return [
+        np.random.SeedSequence(
+            seed.entropy, spawn_key=(*seed.spawn_key, i), pool_size=seed.pool_size
+        )
+        for i in range(count)
+    ]
+
+
+def _chunk_count(N: int) -> int:
+    return int(np.ceil(N / surrogate_chunk_size))
+
+
+# Surrogates are generated in blocks of rows containing approximately this many elements,
+# which limits the size of temporary arrays when there are many long surrogates.
+_block_elements = 2 ** 22
+
+
+def _fill(
+    surr: ndarray,
+    func: Callable[[ndarray, int, np.random.Generator], ndarray],
+    sig: ndarray,
+    rng: np.random.Generator,
+) -> None:
+    """
+    Fills an array of surrogates, block by block.
+
+    :param surr: the N x L array to fill
+    :param func: function which takes the signal, a number of surrogates and the random number
+    generator, and returns that number of surrogates as a 2D array
+    :param sig: the signal
+    :param rng: the random number generator
+    """
+    N, L = surr.shape
+    rows = max(1, _block_elements // max(L, 1))
+
+    for start in range(0, N, rows):
+        end = min(N, start + rows)
+        surr[start:end, :] = func(sig, end - start, rng)
+
+
+def _random_permutation(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+    # Each permutation is O(L), which is much faster than sorting random keys.
+    L = len(sig)
+
+    surr = np.empty((n, L), dtype=np.float64)
+    for k in range(n):
+        surr[k, :] = sig[rng.permutation(L)]
+
+    return surr
+
+
+def _randomise_phases(spectrum: ndarray, L: int, rng: np.random.Generator) -> ndarray:
+    """
+    Randomises the phases of the (real) Fourier spectra of signals with length L, in-place.
+    As in MODA, the zero-frequency term is unchanged and the Nyquist term is removed.
+    """
+    L2 = int(np.ceil(L / 2))
+
+    eta = 2 * np.pi * rng.random((spectrum.shape[0], L2 - 1))
+    spectrum[:, 1:L2] *= np.exp(1j * eta)
+    spectrum[:, L2:] = 0
+
+    return spectrum
+
+
+def _fourier_transform(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+    L = len(sig)
+
+    spectrum = np.tile(np.fft.rfft(sig), (n, 1))
+    return np.fft.irfft(_randomise_phases(spectrum, L, rng), n=L, axis=1)
+
+
+def _amplitude_adjusted(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+    L = len(sig)
+
+    val = np.sort(sig)
+    rankind = np.empty(L, dtype=np.intp)
+    rankind[np.argsort(sig)] = np.arange(L)
+
+    # Gaussian noise with the same rank order as the signal.
+    gn = np.sort(rng.standard_normal((n, L)), axis=1)[:, rankind]
+
+    spectrum = _randomise_phases(np.fft.rfft(gn, axis=1), L, rng)
+    ft_surr = np.fft.irfft(spectrum, n=L, axis=1)
+
+    # Rescale to the values of the signal, keeping the rank order of each surrogate.
+    surr = np.empty((n, L), dtype=np.float64)
+    np.put_along_axis(
+        surr, np.argsort(ft_surr, axis=1), np.broadcast_to(val, (n, L)), axis=1
+    )
+
+    return surr
+
+
+def _iterative_amplitude_adjusted(
+    sig: ndarray,
+    n: int,
+    rng: np.random.Generator,
+    exact_spectrum: bool,
+    max_iterations: int,
+    initial: ndarray = None,
+) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates IAAFT surrogates. All surrogates are iterated together, and each surrogate is
+    removed from the batch when its rank order stops changing.
+
+    :param exact_spectrum: whether to return the surrogates with the exact spectrum of the
+    signal (IAAFT2), rather than the exact distribution (IAAFT1)
+    :param max_iterations: the maximum number of iterations, as in MODA
+    :param initial: [2D array] the n initial surrogates; defaults to random permutations of the signal
+    :return: [2D array] the surrogates; [1D array] the number of iterations used for each surrogate
+    """
+    L = len(sig)
+
+    val = np.sort(sig)
+    amplitude = np.abs(np.fft.rfft(sig))
+
+    if initial is None:
+        surr = np.empty((n, L), dtype=np.float64)
+        for k in range(n):
+            surr[k, :] = sig[rng.permutation(L)]
+    else:
+        surr = np.array(initial, dtype=np.float64)
+
+    iterf = np.empty((n, L), dtype=np.float64)
+    iterations = np.zeros(n, dtype=np.int64)
+
+    # The surrogates which have not converged, and their current values. The rank order
+    # is unchanged exactly when the sorting order is unchanged, so the order is compared.
+    active = np.arange(n)
+    current = surr.copy()
+    order = np.full((n, L), -1, dtype=np.intp)
+    f = current
+
+    it = 1
+    while active.size and it < max_iterations:
+        # Impose the amplitude spectrum of the signal.
+        spectrum = np.fft.rfft(current, axis=1)
+        magnitude = np.abs(spectrum)
+        spectrum *= np.divide(
+            amplitude, magnitude, out=np.ones_like(magnitude), where=magnitude > 0
+        )
+        f = np.fft.irfft(spectrum, n=L, axis=1)
+
+        # Impose the distribution of the signal, keeping the rank order.
+        new_order = np.argsort(f, axis=1)
+        np.put_along_axis(current, new_order, np.broadcast_to(val, f.shape), axis=1)
+
+        changed = np.any(new_order != order, axis=1)
+        iterations[active] += 1
+
+        # Store the surrogates which have converged, and remove them from the batch.
+        if not changed.all():
+            done = ~changed
+            surr[active[done]] = current[done]
+            iterf[active[done]] = f[done]
+
+            active = active[changed]
+            current = current[changed]
+            new_order = new_order[changed]
+            f = f[changed]
+
+        order = new_order
+        it += 1
+
+    # Surrogates which reached the maximum number of iterations.
+    if active.size:
+        surr[active] = current
+        iterf[active] = f
+
+    return (iterf if exact_spectrum else surr), iterations
+
+
+def _wavelet_iterative_amplitude_adjusted(
+    sig: ndarray, n: int, rng: np.random.Generator, max_iterations: int
+) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates WIAAFT surrogates (Keylock, 2006), which preserve the local structure of the
+    signal's wavelet coefficients as well as its spectrum and distribution.
+
+    The wavelet coefficients at each level of the MODWT are replaced by IAAFT2 surrogates, as in
+    MODA, which are circularly shifted to best match the original coefficients; the scaling
+    coefficients are kept. The inverse MODWT of the surrogate coefficients is then used as the starting point of
+    IAAFT iterations, which restore the exact distribution of the signal.
+
+    :return: [2D array] the surrogates; [1D array] the number of final IAAFT iterations used for each surrogate
+    """
+    L = len(sig)
+    w = modwt(sig)
+    levels = w.shape[0] - 1
+
+    # Reconstruct the surrogates one level at a time, in the frequency domain.
+    fv = np.fft.rfft(w[levels])
+    for j in range(levels, 0, -1):
+        coeffs = w[j - 1]
+        surr_coeffs, _ = _iterative_amplitude_adjusted(
+            coeffs, n, rng, True, max_iterations
+        )
+
+        fw = np.fft.rfft(surr_coeffs, axis=1)
+
+        # Circular cross-correlation with the original coefficients, for every shift.
+        correlation = np.fft.irfft(fw * np.conj(np.fft.rfft(coeffs)), n=L, axis=1)
+        shift = np.argmax(correlation, axis=1)
+
+        # Shifting by s samples multiplies the spectrum by a phase ramp.
+        fw *= np.exp(2j * np.pi * np.outer(shift, np.arange(fw.shape[1])) / L)
+
+        fv = imodwt_step(fv, fw, L, j)
+
+    initial = np.fft.irfft(fv, n=L, axis=-1)
+    return _iterative_amplitude_adjusted(
+        sig, n, rng, False, max_iterations, initial=np.broadcast_to(initial, (n, L))
+    )
+
+
+def _time_shift(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+    L = len(sig)
+
+    # Every cyclic shift of the signal is a row of this read-only view, which does not copy data.
+    doubled = np.concatenate((sig, sig))
+    shifts = as_strided(
+        doubled, shape=(L, L), strides=doubled.strides * 2, writeable=False
+    )
+
+    return shifts[rng.integers(1, L, size=n)]
+
+
+def _cycle_phase_permutation(sig: ndarray, n: int, rng: np.random.Generator) -> ndarray:
+    signal = np.mod(sig, 2 * np.pi)
+
+    dcpoints = ((signal[1:] - signal[:-1]) < -np.pi).nonzero()[0]
+    NC = len(dcpoints) - 1
+
+    if NC <= 0:
+        return np.tile(np.unwrap(signal), (n, 1))
+
+    starts = dcpoints[:-1]
+    lengths = np.diff(dcpoints)
+
+    # The cycles of each surrogate, in a random order.
+    order = np.argsort(rng.random((n, NC)), axis=1)
+    cycle_starts = starts[order]
+    cycle_lengths = lengths[order]
+
+    # Index of each value in the permuted cycles, relative to the start of the first cycle.
+    positions = np.cumsum(cycle_lengths, axis=1) - cycle_lengths
+    offsets = np.repeat((cycle_starts - positions).ravel(), cycle_lengths.ravel())
+
+    middle_length = dcpoints[-1] - dcpoints[0]
+    index = offsets.reshape(n, middle_length) + np.arange(middle_length)
+
+    surr = np.empty((n, len(signal)), dtype=np.float64)
+    surr[:, : dcpoints[0]] = signal[: dcpoints[0]]
+    surr[:, dcpoints[0] : dcpoints[-1]] = signal[index]
+    surr[:, dcpoints[-1] :] = signal[dcpoints[-1] :]
+
+    return np.unwrap(surr, axis=1)
+
+
 def preprocessing(sig: ndarray, fs: float) -> Tuple[ndarray, ndarray, ndarray, float]:
-    sig -= np.mean(sig)
-    t = np.linspace(0, len(sig), int(len(sig) // fs))
+    sig = sig - np.mean(sig)
     L = len(sig)
+    t = np.linspace(0, L / fs, L)
 
     # Find pair of points which minimises mismatch between p consecutive points and the beginning and end of the signal
     p = 10
 
-    K1 = np.round(L / 100)  # Proportion of signal to consider at beginning.
+    K1 = int(np.round(L / 100))  # Proportion of signal to consider at beginning.
     k1 = sig[:K1]
-    K2 = np.round(L / 10)  # Proportion of signal to consider at end.
-    k2 = sig[-K2:]
+    K2 = int(np.round(L / 10))  # Proportion of signal to consider at end.
+    k2 = sig[L - K2 :]
 
     # Truncate to match start and end points and first derivatives.
     if len(k1) <= p:
         p = len(k1) - 1
 
-    d = np.zeros((len(k1) - p, len(k2) - p))
+    # The mismatch between the windows starting at j and k is sum(abs(k1[j:j+p]) - k2[k:k+p]),
+    # which is the difference of two moving sums. Instead of calculating it for every pair of
+    # windows, the moving sums at the end are sorted, and the closest one is found for each window
+    # at the beginning.
+    start_sums = _moving_sum(np.abs(k1), p)
+    end_sums = _moving_sum(k2, p)
 
-    for j in range(len(k1) - p):
-        for k in range(len(k2) - p):
-            d[j, k] = np.sum(np.abs(k1[j : j + p]) - k2[k : k + p])
+    order = np.argsort(end_sums, kind="stable")
+    sorted_sums = end_sums[order]
 
-    abs_d = np.abs(d)
-    v = np.min(abs_d, axis=1)
-    I = np.argmin(abs_d, axis=1)
+    right = np.clip(np.searchsorted(sorted_sums, start_sums), 0, len(order) - 1)
+    left = np.clip(right - 1, 0, len(order) - 1)
+
+    v = np.minimum(
+        np.abs(start_sums - sorted_sums[left]), np.abs(start_sums - sorted_sums[right])
+    )
     I2 = np.argmin(v)  # Minimum mismatch.
 
     kstart = I2
-    kend = I[I2] + len(sig[:-k2])
+    kend = np.argmin(np.abs(start_sums[I2] - end_sums)) + L - K2
     cutsig = sig[kstart:kend]  # New truncated time series.
     t2 = t[kstart:kend]  # Corresponding time.
 
     return cutsig, t2, kstart, kend
 
 
+def _moving_sum(x: ndarray, p: int) -> ndarray:
+    """
+    Returns the sums of the len(x) - p windows x[j:j+p].
+    """
+    cumulative = np.concatenate(([0], np.cumsum(x)))
+    return cumulative[p:-1] - cumulative[: -p - 1]
+
+
 class Params:
     def __init__(self):
         self.origsig = None
@@ -0,0 +1,45 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+"""
+Wavelets which are used by the Python implementation of the wavelet transform in PyMODAlib.
+"""
+
+
+def wavelet_functions(wavelet: str, resolution: float):
+    """
+    Returns the PyMODAlib object which defines a wavelet, including its time- and
+    frequency-domain functions, without the derived parameters which are calculated by
+    `parcalc`.
+
+    :param wavelet: the name of the wavelet: Lognorm, Morlet or Morse-a (with a = 3)
+    :param resolution: the resolution parameter of the wavelet
+    :return: the `WindowParams` of the wavelet, or None if the wavelet is not implemented
+    in Python
+    """
+    from pymodalib.implementations.python.wavelet.wavelet_transform import (
+        LognormWavelet,
+        MorletWavelet,
+        MorseWavelet,
+    )
+
+    if wavelet == "Lognorm":
+        return LognormWavelet(resolution)
+    elif wavelet == "Morlet":
+        return MorletWavelet(resolution)
+    elif wavelet == "Morse-a":
+        return MorseWavelet(3, resolution)
+
+    return None
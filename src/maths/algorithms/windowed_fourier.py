@@ -13,1247 +13,666 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-import numpy as np
+import functools
+import json
+import os
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple, Union
 
-# Names of window parameters.
-import scipy
-import scipy.optimize
+import numpy as np
 import scipy.integrate
-from scipy.sparse.linalg.isolve.lsqr import eps
-import matplotlib.pyplot as plt
-
-from maths.algorithms.matlab_utils import *
+import scipy.optimize
+from numpy import ndarray
 
 """
-Translation of WFT into Python.
+Python implementation of the windowed Fourier transform (WFT), as calculated by `wft` in MODA.
 
-STATUS: not finished, many errors. `wavelet_transform` is more complete.
+The WFT at each frequency is the inverse FFT of the padded signal's spectrum, multiplied by
+the spectrum of the window shifted to that frequency. Instead of a loop over frequencies,
+the rows are calculated in blocks, each with a single batched inverse FFT.
 """
 
-fwtmax = "fwtmax"
-twfmax = "twfmax"
-C = "C"
-omg = "omg"
-xi1 = "xi1"
-xi2 = "xi2"
-ompeak = "ompeak"
-t1 = "t1"
-t2 = "t2"
-tpeak = "tpeak"
+# Names of the windows, as shown in the GUI.
+gaussian = "Gaussian"
+hann = "Hann"
+blackman = "Blackman"
+exp = "Exp"
+rect = "Rect"
+kaiser = "Kaiser"
+
+windows = (gaussian, hann, blackman, exp, rect, kaiser)
+
+# The maximum number of elements in the temporary arrays used by the batched inverse FFT.
+_block_elements = 2 ** 22
+
+# Path of the file which stores the window parameters calculated by `parcalc`, if enabled.
+_parameter_table: Optional[str] = None
+_parameter_table_lock = threading.Lock()
 
 
+@dataclass
 class WindowParams:
-    fwtmax = None
-    twfmax = None
-    C = None
-    omg = None
-    ompeak = None
-    tpeak = None
-    xi1 = -np.inf
-    xi2 = np.inf
-    t1 = -np.inf
-    t2 = np.inf
-
-    xi1e = None
-    xi2e = None
-    xi1h = None
-    xi2h = None
+    """
+    The window in the time and frequency domains, and the parameters derived from it.
 
+    Every window is a real, even function with unit area, so its supports are symmetric
+    about zero and only the positive limits are stored.
+    """
 
-gaussian = "Gaussian"
-hann = "Hann"
-blackman = "Blackman"
-exp = "exp"
-rect = "rect"
-kaiser = "kaiser"
-
-
-def wft(signal,
-        fs,
-        on_error=lambda x: print(f"ERROR: {x}"),
-        on_warning=lambda x: print(f"Warning: {x}"),
-        window="Gaussian",
-        f0=1,
-        fmin=0,
-        fmax=None,
-        fstep="auto",
-        padmode="predictive",
-        rel_to_l=0.01,
-        preprocess=False,
-        disp_mode=True,
-        plot_mode=False,
-        cut_edges=False):
-    fmax = fmax or fs / 2
-    L = len(signal)
+    # Window in the frequency domain, as a function of angular frequency.
+    fwt: Callable[[ndarray], ndarray]
+
+    # Window in the time domain.
+    twf: Callable[[ndarray], ndarray]
+
+    # The window resolution parameter, in seconds.
+    f0: float
+
+    # The window is zero outside [-t_support, t_support].
+    t_support: float
+
+    # The window's spectrum is negligible outside [-xi_max, xi_max].
+    xi_max: float = np.inf
+
+    # Half of the window's weight lies within [-xi_h, xi_h] (angular frequency).
+    xi_h: float = None
 
-    if fs <= 0 or not fs:
-        on_error("Sampling frequency should be a positive finite number")
+    # Half of the window's weight lies within [-t_h, t_h].
+    t_h: float = None
 
-    rec_flag = 1  # What is this for?
+    # All but a fraction `rel_tol` of the window's weight lies within [-t_e, t_e].
+    t_e: float = None
 
-    wp = WindowParams()
 
-    fwt = []
-    twf = []
+def window_functions(window: str, f0: float) -> WindowParams:
+    """
+    Returns the time- and frequency-domain functions of a window, without the derived
+    parameters which are calculated by `parcalc`.
 
-    if window == gaussian:
+    :param window: the name of the window: Gaussian, Hann, Blackman, Exp, Rect or Kaiser-a,
+    where a is the shape parameter of the Kaiser window, which must be a number
+    :param f0: the window resolution parameter, in seconds; this is the standard deviation
+    of the Gaussian window, and the half-width of windows with compact support
+    :return: the window functions
+    """
+    name = window.lower()
+    xi_max = np.inf
+
+    if name == gaussian.lower():
         fwt = lambda xi: np.exp(-(f0 ** 2 / 2) * xi ** 2)
-        twf = lambda t: 1 / (f0 * np.sqrt(2 * np.pi)) * np.exp(-t ** 2 / (2 * f0 ** 2))
-        wp.ompeak = 0
-        wp.C = np.pi * twf(0)
-        wp.omg = 0
-        wp.tpeak = 0
-    # TODO: Implement these later!
-    elif window == hann:
-        pass
-    elif window == blackman:
-        pass
-    elif window == exp:
-        pass
-    elif window == rect:
-        pass
-    elif kaiser in window:
-        pass
+        twf = lambda t: np.exp(-(t ** 2) / (2 * f0 ** 2)) / (f0 * np.sqrt(2 * np.pi))
+        support = np.inf
+
+        # The spectrum is below 1e-16 of its peak outside this range.
+        xi_max = np.sqrt(2 * np.log(1e16)) / f0
+
+    elif name == hann.lower():
+        fwt, twf = _cosine_sum_window((0.5, 0.5), f0)
+        support = f0
+
+    elif name == blackman.lower():
+        fwt, twf = _cosine_sum_window((0.42, 0.5, 0.08), f0)
+        support = f0
+
+    elif name == exp.lower():
+        fwt = lambda xi: 1 / (1 + (f0 * xi) ** 2)
+        twf = lambda t: np.exp(-np.abs(t) / f0) / (2 * f0)
+        support = np.inf
+
+    elif name == rect.lower():
+        fwt, twf = _cosine_sum_window((1,), f0)
+        support = f0
+
+    elif name.startswith(kaiser.lower()):
+        try:
+            a = float(name.split("-", 1)[1])
+        except (IndexError, ValueError):
+            raise ValueError(
+                f"The Kaiser window must be given as 'Kaiser-a', where a is its shape "
+                f"parameter (e.g. 'Kaiser-3'), not '{window}'."
+            )
+
+        def fwt(xi):
+            # sinh(r) / r, where r is imaginary (giving sin) when |f0 * xi| > a.
+            r = np.sqrt((a ** 2 - (f0 * np.asarray(xi)) ** 2).astype(np.complex128))
+            r = np.where(r == 0, 1e-300, r)
+            return np.real(np.sinh(r) / r) * a / np.sinh(a)
+
+        def twf(t):
+            x = np.clip(1 - (np.asarray(t) / f0) ** 2, 0, None)
+            out = np.where(np.abs(t) <= f0, np.i0(a * np.sqrt(x)), 0)
+            return out * a / (2 * f0 * np.sinh(a))
+
+        support = f0
+
     else:
-        on_error(f"Invalid window name: {window}")
+        raise ValueError(
+            f"Unknown window '{window}'; expected one of {', '.join(windows)}."
+        )
 
-    if rec_flag == 1:
-        if disp_mode:
-            print("Estimating window parameters.")
-            parcalc(rel_to_l, L, wp, fwt, twf, disp_mode)
+    return WindowParams(fwt=fwt, twf=twf, f0=f0, t_support=support, xi_max=xi_max)
 
-    coib1 = np.ceil(abs(wp.t1e * fs))
-    coib2 = np.ceil(abs(wp.t2e * fs))
 
-    if wp.t2e - wp.t1e > L / fs:
-        print("No WFT coefficients in cone of influence")
-        cut_edges = False
+def _cosine_sum_window(
+    coefficients: Tuple[float, ...], f0: float
+) -> Tuple[Callable, Callable]:
+    """
+    Returns the frequency- and time-domain functions of a window which is a sum of cosines
+    on [-f0, f0], such as the Hann window, normalised to unit area.
 
-    fstepsim = fstep
-    wp.fstep = fstep
-    if fstep == "auto":
-        Nb = 10
-        wp.fstep = (wp.xi2h - wp.xi1h) / (twopi * Nb)
-        c10 = np.floor(np.log10(wp.fstep))
-        fdig = np.floor(wp.fstep / 10 ** c10)
-        fstep = np.floor(wp.fstep / 10 ** c10) * 10 ** c10
+    :param coefficients: the coefficient of cos(k * pi * t / f0) for k = 0, 1, ...
+    :param f0: the half-width of the window
+    """
+    a0 = coefficients[0]
+    sinc = lambda x: np.sinc(x / np.pi)  # sin(x) / x
 
-    freq = np.arange(np.ceil(fmin / fstep) * fstep, np.floor(fmax / fstep) * fstep + fstep, fstep).transpose()
-    SN = len(freq)
+    def fwt(xi):
+        u = f0 * np.asarray(xi)
+        out = a0 * sinc(u)
+        for k, a in enumerate(coefficients[1:], 1):
+            out = out + a / 2 * (sinc(u - k * np.pi) + sinc(u + k * np.pi))
 
-    """Skipped some code (mostly unnecessary?)"""
+        return out / a0
 
-    if preprocess:
-        X = np.arange(1, len(signal) + 1).transpose() / fs
-        XM = np.ones((len(X), 1), dtype=np.float64)
-        for pn in range(0, 4):
-            CX = X ** pn
-            XM[:, pn] = (CX - np.mean(CX)) / np.std(CX)
-            signal = signal - XM * (np.linalg.pinv(XM) * signal)
-
-            fx = np.fft.fft(signal, L)
-            Nq = np.ceil((L + 1) / 2)
-            ff = np.asarray(
-                np.arange(0, Nq),
-                -np.fliplr(np.arange(1, L - Nq + 1))
-            ) * fs / L
-
-            # Filter signal
-            fx[find(ff, lambda i: np.abs(i) <= max(fmin, fs / L))] = 0
-            fx[find(ff, lambda i: abs(i) >= fmax)] = 0
-            signal = np.fft.ifft(fx)
-
-    NL = 2 ** nextpow2(L + coib1[0] + coib2[0])
-    if coib1[0] == 0 and coib2[0] == 0:
-        n1 = np.floor((NL - L) / 2)
-        n2 = np.ceil((NL - L) / 2)
-    else:
-        n1 = np.floor((NL - L) * coib1[0] / (coib1[0] + coib2[0]))
-        n2 = np.ceil((NL - L) * coib1[0] / (coib1[0] + coib2[0]))
-
-    if padmode == "predictive":
-        pow = (-(L / fs - np.arange(1, L + 1) / fs)) / (wp.t2h - wp.t1h)
-        w = 2 ** pow
-        padleft = fcast(np.flip(signal), fs, n1, [max(fmin, fs / L), fmax],
-                        min(np.ceil(SN / 2) + 5, np.round(L / 3)), w)
-        padleft = np.flip(padleft)
-
-        padright = fcast(signal, fs, n2, [max(fmin, fs / L), fmax], min(np.ceil(SN / 2) + 5, np.round(L / 3)), w)
-        dflag = 1
-
-    signal = np.concatenate([padleft, signal, padright])
-
-    Nq = np.ceil((NL + 1) / 2)
-    f1 = np.arange(0, Nq)
-    f2 = -np.arange(1, NL - Nq + 1)
-    ff = np.concatenate((f1, f2)) * fs / NL
-    # ff = ff[:]
-    fx = np.fft.fft(signal, np.int(NL))
-    if preprocess:
-        fx = fx.where(ff >= fmin or ff <= fmax)
-
-    # Windowed Fourier Transform by itself
-    WFT = np.zeros((SN, L), dtype=np.complex64) * np.NaN
-    ouflag = 0
-    if wp.t2e - wp.t1e > L / fs:
-        coib1 = 0
-        coib2 = 0
-
-    for sn in range(0, SN):
-        freqwf = freq[sn] - ff  # TODO: add later
-        ii = find(freqwf, lambda i: wp.xi1 / twopi < i < wp.xi2 / twopi)
-
-        if not isempty(fwt):
-            fw = fwt(twopi * freqwf[ii])
-            nid = find(fw, lambda x: isnan(x) or not np.isfinite(x))
-            if not isempty(nid):
-                fw[nid] = fwt(twopi * freqwf[ii[nid]] + 10 ** -14)
-                nid = find(fw, lambda x: isnan(x) or not np.isfinite(x))
-                fw[nid] = 0
-                if not isempty(nid):
-                    ouflag = 1
-                    ouval = twopi * freqwf(nid[0])
+    def twf(t):
+        t = np.asarray(t)
+        out = sum(a * np.cos(k * np.pi * t / f0) for k, a in enumerate(coefficients))
+        return np.where(np.abs(t) <= f0, out, 0) / (2 * f0 * a0)
 
-        else:
-            timewf = 1 / fs * np.asarray(-np.arange(1, np.ceil((NL - 1) / 2)),
-                                         np.arange(NL + 1 - (np.ceil((NL - 1) / 2) + 1, NL)))
-            jj = None  # TODO
-            tw = np.zeros(NL, 1)
-            tw[jj] = twf(timewf(jj)) * np.exp(np.complex(0, -1 * twopi * freq[sn] * timewf[jj]))
-            nid = find(fw, lambda x: isnan(x) or not np.isfinite(x))
-            if not isempty(nid):
-                tw[nid] = twf(timewf(nid) + 10 ** -14)
-                nid = find(fw, lambda x: isnan(x) or not np.isfinite(x))
-                if not isempty(nid):
-                    ouflag = 1
-                    ouval = timewf(nid[0])
-            fw = 1 / fs * np.fft.fft(tw)
-            fw = fw[ii]
-
-        cc = np.zeros((np.int(NL), 1), dtype=np.complex64)
-        fxii = fx[ii]
-        cc = cc.reshape(fxii.shape)
-        cc[ii] = fxii * fw
-
-        out = np.fft.ifft(cc, NL)
-        n1 = np.int(n1)
-        n2 = np.int(n2)
-        NL = np.int(NL)
-
-        WFT[sn, np.arange(0, L)] = out[1 + n1: NL - n2 + 1]
-
-        # Code for plotting.
-
-        return WFT, freq
-
-
-def parcalc(racc, L, wp, fwt, twf, disp_mode):
-    racc = min(racc, 0.5 - 10 ** -10)
-    # level0
-    ctol = max(racc / 1000, 10 ** -12)  # parameter of numerical accuracy
-    MIC = max(10000, 10 * L)  # max interval count
-
-    nt = (1 / (4 * fs)) * np.arange(-8 * L + 1, 8 * L).transpose()  # level1 should be hermitian conjugate?
-    nt = nt[wp.t1 < nt][nt < wp.t2]
-
-    nxi = 2 * np.pi * 4 * fs / (16 * L - 1) * np.arange(-8 * L + 1, 8 * L).transpose()
-    nxi = nxi[nxi > wp.xi1][nxi < wp.xi2]
-
-    if not isempty(fwt):
-        wp.fwt = fwt
-        if isempty(wp.ompeak):
-            values = np.abs(fwt(nxi))
-            ipeak = values.argmax()  # level2
-            wp.ompeak = np.mean(nxi[ipeak])
-            wp.ompeak = scipy.optimize.fmin(func=lambda x: -np.abs(fwt(x)), x0=wp.ompeak)  # level1
-
-        if isempty(wp.fwtmax):
-            wp.fwtmax = fwt(wp.ompeak)
-            if np.isnan(wp.fwtmax):
-                wp.twfmax = fwt[wp.ompeak + 10 ** -14]
-
-        if np.abs(wp.ompeak) > 10 ** -12:
-            print("Warning")
-            fwt = lambda xi: fwt[xi + wp.ompeak]
-            if not isempty(twf):
-                twf = lambda t: twf[t] * np.exp(-1 * np.complex(0, -1) * wp.ompeak * t)
-            wp.xi1 = wp.xi1 - wp.ompeak
-            wp.xi2 = wp.xi2 - wp.ompeak
-            wp.fwt = fwt
-            wp.ompeak = 0
-
-        vfun = lambda u: fwt(u)
-        xp = wp.ompeak
-        lim1 = wp.xi1
-        lim2 = wp.xi2
-
-        QQ, wflag, xx, ss = sqeps(vfun, xp, lim1, lim2, racc, MIC, np.array([-1, 1]) * 8 * (2 * np.pi * fs))
-        wp.xi1e = ss[0, 0]
-        wp.x2e = ss[0, 1]
-        wp.xi1h = ss[1, 0]
-        wp.xi2h = ss[1, 1]
-
-        if isempty(wp.C):
-            if not twf:  # level0
-                wp.C = np.pi * twf(0)
-                if np.isnan(wp.C):
-                    wp.C = np.pi * twf(10 ** -14)
-            else:
-                wp.C = (QQ[0, 0] + QQ[0, 1]) / 2
-
-        if wflag == 1 and not disp_mode:
-            print("Freq domain window not well behaved")
-        if isempty(wp.omg):
-            px1 = np.min(wp.ompeak - xx[0, 0], xx[0, 1] - wp.ompeak)
-            px2 = np.min(wp.ompeak - xx[3, 0], xx[3, 1] - wp.ompeak)
-            [Y1, errY1] = quadgk(lambda u: u * fwt(wp.ompeak + u) - u * fwt(wp.ompeak - u), 0, px1, limit=2 * MIC,
-                                 epsabs=0, epsrel=10 ** -12)
-            [Y2, errY2] = quadgk(lambda u: u * fwt(wp.ompeak + u) - u * fwt(wp.ompeak - u), px1, px2, limit=2 * MIC,
-                                 epsabs=0, epsrel=10 ** -12)
-            [Y3, errY3] = quadgk(lambda u: -u * fwt(wp.ompeak - u), px2, wp.ompeak - xx[3, 0], limit=2 * MIC, epsabs=0,
-                                 epsrel=10 ** -12)
-            [Y4, errY4] = quadgk(lambda u: u * fwt(wp.ompeak + u), px2, xx[3, 1] - wp.ompeak, limit=2 * MIC, epsabs=0,
-                                 epsrel=10 ** -12)
-            if np.abs((errY1 + errY2 + errY3 + errY4) / (Y1 + Y2 + Y3 + Y4)) < 10 ** -4:
-                wp.omg = wp.ompeak + (Y1 + Y2 + Y3 + Y4) / (2 * wp.C)
-            else:
-                wp.omg = np.inf
-
-        if isempty(twf):
-            PP, wflag, xx, ss = sqeps(lambda x: np.abs(fwt(x)) ** 2, wp.ompeak, wp.xi1, wp.xi2, racc, MIC,
-                                      np.asarray([-1, 1], dtype=np.float64) * 8 * twopi * fs)
-            Etot = np.sum(PP[0]) / twopi
-
-            CL = 2 ** (nextpow2(MIC / 8))
-            CT = CL / (2 * abs(ss[0, 1] - ss[0, 0]))
-            CNq = np.ceil((CL + 1) / 2)
-            cxi = (twopi / CT) * np.arange(CNq - CL, CNq - 2).transpose()
-            idm = find(cxi, lambda i: i <= wp.xi1)
-            idc = find(cxi, lambda i: wp.xi1 < i < wp.xi2)
-            idp = find(cxi, lambda i: i >= wp.xi2)
-
-            Cfwt = np.asarray(np.zeros(len(idm), 1), fwt(cxi[idc]), np.zeros(len(idp), 1))
-            idnan = find(Cfwt, lambda i: isnan(i))
-
-            if not isempty(idnan):
-                idnorm = find(Cfwt, lambda i: not isnan(i))
-                Cfwt[idnan] = scipy.interpolate.interp1d(idnorm, Cfwt(idnorm), idnan, 'spline', 'extrap')
-
-            Ctwf = np.fft.ifft(
-                (CL / CT) * Cfwt[np.asarray(np.arange(CL - CNq + 1, CL + 1), np.arange(1, CL - CNq + 1))])
-            Ctwf = Ctwf[np.asarray(np.arange(CNq + 1, CL + 1), np.arange(1, CNq + 1))]
-
-            Etwf = np.abs(Ctwf) ** 2
-            Efwt = np.abs(Cfwt) ** 2
-
-            Iest1 = CT / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-            Iest2 = 1 / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-            Eest = CT / CL * np.sum(Etwf)
-            perr = np.inf
-
-            while (np.abs(Etot - Eest) + Iest1 + Iest2) / Etot < perr:
-                CT /= 2
-                perr = (np.abs(Etot - Eest) + Iest1 + Iest2) / Etot
-
-                CNq = np.ceil((CL + 1) / 2)
-                cxi = (twopi / CT) * np.arange(CNq - CL, CNq - 2).transpose()
-
-                idm = find(cxi, lambda i: i <= wp.xi1)
-                idc = find(cxi, lambda i: wp.xi1 < i < wp.xi2)
-                idp = find(cxi, lambda i: i >= wp.xi2)
-
-                idnan = find(Cfwt, lambda i: isnan(i))
-
-                if not isempty(idnan):
-                    idnorm = find(Cfwt, lambda i: not isnan(i))
-                    Cfwt[idnan] = scipy.interpolate.interp1d(idnorm, Cfwt(idnorm), idnan, 'spline', 'extrap')
-
-                Ctwf = np.fft.ifft(
-                    (CL / CT) * Cfwt[np.asarray(np.arange(CL - CNq + 1, CL + 1), np.arange(1, CL - CNq + 1))])
-                Ctwf = Ctwf[np.asarray(np.arange(CNq + 1, CL + 1), np.arange(1, CNq + 1))]
-
-                Etwf = np.abs(Ctwf) ** 2
-                Efwt = np.abs(Cfwt) ** 2
-
-                Iest1 = CT / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-                Iest2 = 1 / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-                Eest = CT / CL * np.sum(Etwf)
-
-            CL = 16 * CL
-            CT *= 2
-
-            CNq = np.ceil((CL + 1) / 2)
-            cxi = (twopi / CT) * np.arange(CNq - CL, CNq - 2).transpose()
-
-            idm = find(cxi, lambda i: i <= wp.xi1)
-            idc = find(cxi, lambda i: wp.xi1 < i < wp.xi2)
-            idp = find(cxi, lambda i: i >= wp.xi2)
-
-            idnan = find(Cfwt, lambda i: isnan(i))
-
-            if not isempty(idnan):
-                idnorm = find(Cfwt, lambda i: not isnan(i))
-                Cfwt[idnan] = scipy.interpolate.interp1d(idnorm, Cfwt(idnorm), idnan, 'spline', 'extrap')
-
-            Ctwf = np.fft.ifft(
-                (CL / CT) * Cfwt[np.asarray(np.arange(CL - CNq + 1, CL + 1), np.arange(1, CL - CNq + 1))])
-            Ctwf = Ctwf[np.asarray(np.arange(CNq + 1, CL + 1), np.arange(1, CNq + 1))]
-
-            Etwf = np.abs(Ctwf) ** 2
-            Efwt = np.abs(Cfwt) ** 2
-
-            Iest1 = CT / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-            Iest2 = 1 / CL * np.sum(np.abs(Etwf[3:] - 2 * Etwf[2:-1] + Etwf[2:-1] + Etwf[:-2])) / 24
-            Eest = CT / CL * np.sum(Etwf)
+    return fwt, twf
 
-            if (abs(Etot - Eest) + Iest1 + Iest2) / Etot > 0.01:
-                print("Warning: Cannot accurately invert the specified...")
 
-            Ctwf = Ctwf[:2 * CNq - 2]
-            ct = CT / CL * np.arange(-(CNq - 2), CNq - 1).transpose()
+def parcalc(wp: WindowParams, rel_tol: float) -> WindowParams:
+    """
+    Calculates the parameters of a window which determine the frequency step, the length
+    of the padding and the cone of influence.
 
-            wp.twf = [Ctwf, ct]
+    :param wp: the window, as returned by `window_functions`
+    :param rel_tol: the relative tolerance, which determines the cone of influence
+    :return: the same object, with the parameters set
+    """
+    rel_tol = min(rel_tol, 0.5 - 1e-10)
 
-            if isempty(wp.tpeak):
+    # Half of the weight is within [-xi_h, xi_h] if the integral from 0 to xi_h is a
+    # quarter of the total. The integral of the frequency-domain window is 2 * pi * twf(0).
+    wp.xi_h = _integral_crossing(wp.fwt, np.pi / 2 * wp.twf(0.0), 1 / wp.f0, np.inf)
+
+    # The time-domain window has unit area.
+    wp.t_h = _integral_crossing(wp.twf, 0.25, wp.f0, wp.t_support)
+    wp.t_e = _integral_crossing(wp.twf, 0.5 - rel_tol / 2, wp.f0, wp.t_support)
+
+    return wp
+
+
+def window_parameters(window: str, f0: float, rel_tol: float) -> WindowParams:
+    """
+    Returns a window with its parameters set, as calculated by `parcalc`.
+
+    Every window is a function of t / f0, so its parameters are proportional to f0 (or 1 / f0
+    in the frequency domain). The parameters are calculated once for f0 = 1 and scaled, and
+    the result for each window and tolerance is kept for the lifetime of the process, as well
+    as in the parameter table if it is enabled by `set_parameter_table`.
+
+    :param window: the name of the window (see `window_functions`)
+    :param f0: the window resolution parameter, in seconds
+    :param rel_tol: the relative tolerance, which determines the cone of influence
+    :return: the window, with the parameters set
+    """
+    wp = window_functions(window, f0)
+    xi_h, t_h, t_e = _unit_parameters(window.lower(), float(rel_tol))
+
+    wp.xi_h = xi_h / f0
+    wp.t_h = t_h * f0
+    wp.t_e = t_e * f0
+
+    return wp
+
+
+def set_parameter_table(path: Optional[str]) -> None:
+    """
+    Sets the file in which the window parameters are stored, so that they are not
+    recalculated by other processes. The file is a JSON object, which is created if it
+    does not exist.
+
+    :param path: the path to the file, or None to keep the parameters in memory only
+    """
+    global _parameter_table
+    _parameter_table = path
+
+
+@functools.lru_cache(maxsize=64)
+def _unit_parameters(window: str, rel_tol: float) -> Tuple[float, float, float]:
+    """
+    Returns the parameters (xi_h, t_h, t_e) of a window with f0 = 1, loading them from the
+    parameter table or calculating them with `parcalc`.
+    """
+    key = f"{window}|{rel_tol!r}"
+
+    table = _load_parameter_table()
+    if key in table:
+        return tuple(table[key])
+
+    wp = parcalc(window_functions(window, 1.0), rel_tol)
+    params = (wp.xi_h, wp.t_h, wp.t_e)
+
+    _save_parameters(key, params)
+    return params
+
+
+def _load_parameter_table() -> Dict[str, list]:
+    """
+    Returns the contents of the parameter table, which is empty if it is disabled,
+    missing or unreadable.
+    """
+    path = _parameter_table
+    if not path:
+        return {}
+
+    try:
+        with open(path, "r") as f:
+            table = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    return table if isinstance(table, dict) else {}
+
+
+def _save_parameters(key: str, params: Tuple[float, float, float]) -> None:
+    """
+    Adds parameters to the parameter table, if it is enabled. The table is replaced
+    atomically, so other processes never read a partial file; the table must never
+    cause a calculation to fail.
+    """
+    path = _parameter_table
+    if not path:
+        return
+
+    with _parameter_table_lock:
+        table = _load_parameter_table()
+        table[key] = list(params)
+
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(table, f, indent=2, sort_keys=True)
+            os.replace(tmp, path)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
                 pass
-                # TODO: add later
 
-    if not isempty(twf):
-        wp.twf = twf
-        if isempty(wp.tpeak):
-            values = np.abs(twf(nt))
-            ipeak = values.argmax()  # level2
-            wp.tpeak = np.mean(nt[ipeak])
-            wp.tpeak = scipy.optimize.fmin(lambda x: -np.abs(twf(x)), wp.tpeak)
 
-        if isempty(fwt):
-            PP, wflag, xx, ss = sqeps(lambda x: abs(twf(x)) ** 2, wp.tpeak, wp.t1, wp.t2, racc, MIC,
-                                      np.array([-1, 1]) * 8 * (2 * np.pi * fs))
-            Etot = np.sum(PP[1])
+def _integral_crossing(
+    func: Callable, target: float, scale: float, limit: float
+) -> float:
+    """
+    Finds the first x > 0 where the integral of `func` from 0 to x is equal to the target.
+
+    :param func: the function to integrate, which should be positive near 0
+    :param target: the value of the integral
+    :param scale: the approximate width of the function
+    :param limit: the value of x is at most this value
+    :return: the value of x
+    """
+    integral = lambda x: scipy.integrate.quad(
+        func, 0, x, limit=500, epsabs=0, epsrel=1e-10
+    )[0]
+
+    # Expand the bracket until it contains the crossing.
+    lo, hi = 0.0, scale / 64
+    while hi < limit and integral(hi) < target:
+        lo, hi = hi, 2 * hi
+
+    hi = np.minimum(hi, limit)
+    return scipy.optimize.brentq(lambda x: integral(x) - target, lo, hi, xtol=1e-12)
+
+
+def wft(
+    signal: ndarray,
+    fs: float,
+    fmin: float = 0,
+    fmax: float = None,
+    f0: float = 1,
+    fstep: Union[float, str] = "auto",
+    window: str = gaussian,
+    padding: Union[float, str] = "predictive",
+    rel_tol: float = 0.01,
+    preprocess: bool = True,
+    cut_edges: bool = False,
+) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates the windowed Fourier transform of a signal.
+
+    :param signal: the signal
+    :param fs: the sampling frequency
+    :param fmin: the minimum frequency
+    :param fmax: the maximum frequency; defaults to fs/2
+    :param f0: the window resolution parameter, in seconds (see `window_functions`)
+    :param fstep: the frequency step, or "auto" to choose it from the width of the window
+    :param window: the name of the window
+    :param padding: "predictive", "symmetric", "periodic" or a value to pad with
+    :param rel_tol: the relative tolerance, which determines the cone of influence
+    :param preprocess: whether to subtract a cubic fit and filter the signal to [fmin, fmax]
+    :param cut_edges: whether to set the coefficients outside the cone of influence to NaN
+    :return: [2D array] the WFT, whose rows correspond to frequencies; [1D array] the frequencies
+    """
+    if not fs or fs <= 0 or not np.isfinite(fs):
+        raise ValueError("Sampling frequency should be a positive finite number.")
+
+    signal = np.asarray(signal, dtype=np.float64).flatten()
+    L = len(signal)
 
-            CL = 2 ** nextpow2(MIC / 8)
-            CT = 2 * abs(ss[1, 2] - ss[1, 1])
+    fmin = fmin or 0
+    fmax = fmax or fs / 2
+    if fmin >= fmax:
+        raise ValueError(f"The minimum frequency ({fmin}) must be below the maximum.")
 
-            CNq = np.ceil((CL + 1) / 2)
-            ct = (CT / CL) * np.arange(CNq - CL, CNq).transpose()
-            idm = find(ct, lambda x: x <= wp.t1)
-            idc = find(ct, lambda x: wp.t1 < x < wp.t2)
-            idp = find(ct, lambda x: x >= wp.t2)
+    wp = window_parameters(window, f0, rel_tol)
 
-            Ctwf = [np.zeros(len(idm), 1), twf(ct(idc)), np.zeros(len(idp), 1)]
-            idnan = find(Ctwf, lambda i: np.isnan(i))
+    if fstep == "auto" or not fstep:
+        # About 10 frequency bins per half-width of the window, rounded down to one
+        # significant figure.
+        fstep = wp.xi_h / (10 * np.pi)
+        fstep = _round_down(fstep)
 
-            if not isempty(idnan):
-                idnorm = find(Ctwf, lambda x: not isnan(x))
-                Ctwf[idnan] = scipy.interpolate.interp1d(idnorm, Ctwf(idnorm), idnan, 'spline', 'extrap')
+    freq = np.arange(np.ceil(fmin / fstep), np.floor(fmax / fstep) + 1) * fstep
+    SN = len(freq)
 
-            Cfwt = (CT / CL) * np.fft.fft(Ctwf([np.arange(CL - CNq + 1, CL - CNq, CL, 1)]))
-            Cfwt = Cfwt(np.arange(CNq + 1, CNq, CL, 1))
-
-            Etwf = abs(Ctwf) ** 2
-            Efwt = abs(Ctwf) ** 2
-
-            Iest1 = (CT / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-            Iest2 = (1 / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-
-            Eest = (1 / CT) * sum(Efwt)
-            perr = np.inf
-
-            while (abs(Etot - Eest) + Iest1 + Iest2) / Etot <= perr:
-                CT = CT * 2
-                perr = (abs(Etot - Eest) + Iest1 + Iest2) / Etot
-
-                CNq = np.ceil((CL + 1) / 2)
-                ct = ((CT / CL) * (CNq - np.arange(CL, CNq))).transpose()
-                idm = find(ct <= wp.t1)
-                idc = find(ct > wp.t1 & ct < wp.t2)
-                idp = find(ct >= wp.t2)
-
-                Ctwf = [np.zeros(len(idm), 1), twf(ct(idc)), np.zeros(len(idp), 1)]
-                idnan = find(Ctwf, lambda x: isnan(x))
-
-                if not isempty(idnan):
-                    idnorm = find(Ctwf, lambda x: not isnan(x))
-                    Ctwf[idnan] = scipy.interpolate.interp1d(idnorm, Ctwf(idnorm), idnan, 'spline', 'extrap')
-
-                Cfwt = (CT / CL) * np.fft.fft(Ctwf(np.arange(CL - CNq + 1, CL - CNq, CL, 1)))
-                Cfwt = Cfwt(np.arange(CNq + 1, CNq, CL, 1))
-
-                Etwf = abs(Ctwf) ** 2
-                Efwt = abs(Ctwf) ** 2
-
-                Iest1 = (CT / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-                Iest2 = (1 / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-                Eest = (1 / CT) * sum(Efwt)
-
-            CL = 16 * CL
-            CT = CT * 2
-
-            CNq = np.ceil((CL + 1) / 2)
-            ct = ((CT / CL) * (CNq - np.arange(CL, CNq))).transpose()
-            idm = find(ct <= wp.t1)
-            idc = find(ct > wp.t1 & ct < wp.t2)
-            idp = find(ct >= wp.t2)
-
-            Ctwf = [np.zeros(len(idm), 1), twf(ct(idc)), np.zeros(len(idp), 1)]
-            idnan = find(Ctwf, lambda x: isnan(x))
-
-            if not isempty(idnan):
-                idnorm = find(Ctwf, lambda x: not isnan(x))
-                Ctwf[idnan] = scipy.interpolate.interp1d(idnorm, Ctwf(idnorm), idnan, 'spline', 'extrap')
-
-            Cfwt = (CT / CL) * np.fft.fft(Ctwf(np.arange(CL - CNq + 1, CL - CNq, CL, 1)))
-            Cfwt = Cfwt(np.arange(CNq + 1, CNq, CL, 1))
-
-            Etwf = abs(Ctwf) ** 2
-            Efwt = abs(Ctwf) ** 2
-
-            Iest1 = (CT / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-            Iest2 = (1 / CL) * sum(abs(Etwf[3:] - 2 * Etwf[2: -1] + Etwf[1: -2])) / 24
-            Eest = (1 / CT) * sum(Efwt)
-
-            if (abs(Etot - Eest) + Iest1 + Iest2) / Etot > 0.01:
-                print("Cannot accurately ...")
-
-            Cfwt = Cfwt[1:2 * CNq - 3]
-            cxi = ((twopi / CT) * -np.arange(CNq - 2, CNq - 2)).transpose()
-            wp.fwt = np.asarray(Cfwt, cxi)
-
-            if isempty(wp.ompeak):
-                values = np.abs(fwt(nxi))
-                ipeak = values.argmax()  # level2
-                if len(ipeak) == 1:
-                    a1 = abs(Cfwt[ipeak - 1])
-                    a2 = abs(Cfwt[ipeak])
-                    a3 = abs(Cfwt[ipeak + 1])
-
-                    wp.ompeak = cxi[ipeak]
-                    if abs(a1 - 2 * a2 + a3) > 2 * eps:  # quadratic interp
-                        wp.ompeak = wp.ompeak + 1 / 2 * (a1 - a3) / (a1 - 2 * a2 + a3) * (twopi / CT)
-
-                else:
-                    wp.ompeak = np.mean(cxi[ipeak])
-
-            if isempty(wp.fwtmax):
-                _, ipeak = min(abs(cxi - wp.ompeak))
-                wp.fwtmax = scipy.interpolate.interp1d(cxi[ipeak - 1:ipeak + 1], abs(Cfwt[ipeak - 1:ipeak + 1]),
-                                                       wp.ompeak, "spline")
-
-            if isempty(wp.C):
-                wp.C = twopi / 2 * twf(0)
-                if isnan(wp.C):
-                    wp.C = twopi / 2 * twf(10 ** -14)
-            if isempty(wp.omg):
-                wp.omg = sum((twopi / CT) * cxi * Cfwt / (2 * wp.C))
-
-            cxi = np.arange(cxi - np.pi, cxi[-1] + np.pi / CT, cxi[-1])
-            CS = (twopi / CT) * np.cumsum(Cfwt)
-            CS = np.asarray([0], CS) / abs(CS[-1])
-            CS = abs(CS)
-
-            ICS = (twopi / CT) * np.cumsum(Cfwt[::-1])  # level3
-            ICS = ICS[::-1]
-            ICS = np.asarray(ICS, []) / ICS[0]
-            ICS = abs(ICS)
-
-            xid = np.asarray()  # TODO: add later
-            xid = find(CS[:-2], lambda i: i < racc / 2)
-            a = CS[:-1]
-            b = CS[2:]
-            if a.any(a < racc / 2) and b.any(b > racc / 2):
-                wp.x1e = cxi[0]
-            else:
-                a1 = CS[xid] - racc / 2
-                a2 = CS[xid + 1] - racc / 2
-                wp.x1e = cxi[xid] - a1 * (cxi[xid + 1] - cxi[xid]) / (a2 - a1)
-
-            xid = np.asarray()  # TODO: add later
-            if isempty(xid):
-                wp.xi2e = cxi[-1]
-            else:
-                a1 = ICS[xid] - racc / 2
-                a2 = ICS[xid + 1] - racc / 2
-                wp.xi1e = cxi[xid] - a1 * (cxi[xid + 1] - cxi[xid]) / (a2 - a1)
-
-            xid = np.asarray()  # TODO: add later
-            if isempty(xid):
-                wp.xi1h = cxi[0]
-            else:
-                a1 = CS[xid] - 0.25
-                a2 = CS[xid + 1] - 0.25
-                wp.xi1h = cxi[xid] - a1 * (cxi[xid + 1] - cxi[xid]) / (a2 - a1)
-
-            xid = np.asarray()  # TODO: add later
-            if isempty(xid):
-                wp.xi2h = cxi[-1]
-            else:
-                a1 = ICS[xid] - 0.25
-                a2 = ICS[xid + 1] - 0.25
-                wp.xi2h = cxi[xid] - a1 * (cxi[xid + 1] - cxi[xid]) / (a2 - a1)
-
-            if abs(wp.ompeak) > 10 ** -12:
-                wp.xi1 = wp.xi1 - wp.ompeak
-                wp.xi2 = wp.xi2 - wp.ompeak
-                wp.xi1e = wp.xi1e - wp.ompeak
-                wp.xi2e = wp.xi2e - wp.ompeak
-                wp.xi1h = wp.xi1h - wp.ompeak
-                wp.xi2h = wp.xi2h - wp.ompeak
-                wp.omg = wp.omg - wp.ompeak
-
-                twf = lambda t: twf(t) * np.exp(np.complex(-1 * wp.ompeak * t))
-                wp.twf = twf
-
-                Ctwf = [np.zeros(len(idm), 1), twf(ct(idc)), np.zeros(len(idp), 1)]
-                idnan = find(Ctwf, lambda x: isnan(x))
-
-                if not isempty(idnan):
-                    idnorm = find(Ctwf, lambda x: not isnan(x))
-                    Ctwf[idnan] = scipy.interpolate.interp1d(idnorm, Ctwf(idnorm), idnan, 'spline', 'extrap')
-
-                Cfwt = (CT / CL) * np.fft.fft(Ctwf(np.arange(CL - CNq + 1, CL - CNq, CL, 1)))
-                Cfwt = Cfwt(np.arange(CNq + 1, CNq, CL, 1))
-
-                wp.fwt = np.asarray(Cfwt, cxi)
-                wp.ompeak = 0
-
-        if isempty(wp.twfmax):
-            wp.twfmax = twf(wp.tpeak)
-            if isnan(wp.twfmax):
-                wp.twfmax = twf(wp.tpeak + 10 ** -14)
-
-        vfun = twf
-        xp = wp.tpeak
-        lim1 = wp.t1
-        lim2 = wp.t2
-
-        QQ, wflag, xx, ss = sqeps(vfun, xp, lim1, lim2, racc, MIC, np.array([-1, 1]) * 8 * (2 * np.pi * fs))
-        wp.t1e = ss[0, 0]
-        wp.t2e = ss[0, 1]
-        wp.t1h = ss[1, 0]
-        wp.t2h = ss[1, 1]
-        if wflag == 1:
-            print("Time domain window not well behaved...")
-
-
-def sqeps(vfun, xp, lim1, lim2, racc, MIC, nlims):
-    wflag = 0
-    ctol = np.max([racc / 1000, 10 ** -12])
-    nlim1 = nlims[0]
-    nlim2 = nlims[1]
-
-    kk = 1
-    shp = 0.01  # Peak shift - changed from 0 because of scipy algorithm behaving differently to Matlab.
-
-    while np.isnan(vfun(xp + shp) or not np.isfinite(vfun(xp + shp))):
-        shp = kk * 10 ** -14
-        kk *= -2
-        print("Possible incorrect implementation here.")
-    vmax = vfun(xp + shp)
-
-    if np.isfinite(lim1):
-        tx1 = lim1 - 0.01 * (lim1 - xp)
-        qv1 = np.abs(vfun(tx1) / vmax)
-    else:
-        qv1 = np.NaN
+    if preprocess:
+        signal = _preprocess(signal, fs, fmin, fmax)
 
-    if qv1 < 0.5:
-        x1h = scipy.optimize.fsolve(func=lambda x: np.abs(vfun(x) / vmax) - 0.5, x0=[xp + shp, tx1])  # level2
-    elif np.isnan(qv1):
-        x1h = scipy.optimize.fsolve(func=lambda x: np.abs(vfun(xp - np.abs(x)) / vmax) - 0.5, x0=shp)  # level2
-        x1h = xp - np.abs(x1h)
-    else:
-        x1h = xp + (lim1 - xp) / 100
+    # Length of the edges where the coefficients are affected by the padding.
+    coib = int(np.ceil(abs(wp.t_e * fs)))
+    if 2 * wp.t_e > L / fs:
+        print("Warning: no WFT coefficients are within the cone of influence.")
+        cut_edges = False
 
-    if np.isfinite(lim2):
-        tx2 = lim2 - 0.01 * (lim2 - xp)
-        qv2 = np.abs(vfun(tx2) / vmax)
-    else:
-        qv2 = np.NaN
-    if qv2 < 0.5:
-        x2h = scipy.optimize.fsolve(func=lambda u: np.abs(vfun(u) / vmax) - 0.5, x0=[xp + shp, tx2])
-    elif np.isnan(qv2):
-        x2h = scipy.optimize.fsolve(func=lambda u: np.abs(vfun(xp + np.abs(u)) / vmax) - 0.5, x0=shp)
-        x2h = xp + np.abs(x2h)
+    NL = int(2 ** np.ceil(np.log2(L + 2 * coib)))
+    n1 = (NL - L) // 2
+    n2 = NL - L - n1
+
+    if padding == "predictive":
+        # Weights which emphasise the end of the signal being continued.
+        w = 2 ** (-(L / fs - np.arange(1, L + 1) / fs) / (2 * wp.t_h))
+        fint = (max(fmin, fs / L), fmax)
+        order = min(np.ceil(SN / 2) + 5, np.round(L / 3))
+
+        padleft = fcast(signal[::-1], fs, n1, fint, order, w)[::-1]
+        padright = fcast(signal, fs, n2, fint, order, w)
+        padded = np.concatenate((padleft, signal, padright))
+    elif padding in ("symmetric", "periodic"):
+        mode = "symmetric" if padding == "symmetric" else "wrap"
+        padded = np.pad(signal, (n1, n2), mode=mode)
+    elif isinstance(padding, (int, float)):
+        padded = np.pad(signal, (n1, n2), mode="constant", constant_values=padding)
     else:
-        x2h = xp + (lim2 - xp) / 100
-
-    if np.isnan(x1h):
-        x1h = scipy.optimize.fsolve(func=lambda u: np.abs(np.abs(vfun(xp - np.abs(u)) / vmax) - 0.5, x0=shp))
-        x1h = xp - np.abs(x1h) / 100
-    if np.isnan(x2h):
-        x2h = scipy.optimize.fmin(func=lambda u: np.abs(np.abs(vfun(xp + np.abs(u)) / vmax) - 0.5), x0=shp)
-        x2h = xp + np.abs(x2h) / 100
-
-    if np.isfinite(lim1):
-        tx1 = lim1 - 0.01 * (lim1 - xp)
-        qv1 = (np.abs(vfun(tx1)) + np.abs(vfun((tx1 + lim1) / 2)) + np.abs(vfun((tx1 + 3 * lim1) / 4))) / np.abs(
-            vmax)
-    else:
-        qv1 = np.NaN
-
-    if qv1 < 10 ** (-8) / 3:
-        x1e = scipy.optimize.fsolve(
-            func=lambda u: np.abs(vfun(u) / vmax) + np.abs(vfun((u + lim1) / 2) / vmax) + np.abs(
-                vfun((u + 3 * lim1) / 4) / vmax) - 10 ^ (-8), x0=[xp + shp, tx1])
-    elif np.isnan(qv1):
-        x1e = scipy.optimize.fsolve(
-            func=
-            lambda u: (
-                    np.abs(vfun(xp - np.abs(u)) / vmax)
-                    + np.abs(vfun(xp - np.sqrt(3) * np.abs(u)) / vmax)
-                    + np.abs(vfun(xp - np.sqrt(5) * np.abs(u)) / vmax)
-                    - 10 ** (-8)
-            ),
-            x0=shp)
-
-        x1e = xp - np.abs(x1e)
+        raise ValueError(f"Unknown padding '{padding}'.")
 
-    else:
-        x1e = xp + (lim1 - xp) / 2
+    # Frequencies of the FFT, with the Nyquist frequency positive as in MATLAB.
+    Nq = int(np.ceil((NL + 1) / 2))
+    ff = np.concatenate((np.arange(Nq), -np.arange(NL - Nq, 0, -1))) * fs / NL
 
-    if np.isfinite(lim2):
-        tx2 = lim2 - 0.01 * (lim2 - xp)
-        qv2 = (abs(vfun(tx2)) + abs(vfun((tx2 + lim2) / 2)) + abs(vfun((tx2 + 3 * lim2) / 4))) / abs(vmax)
-    else:
-        qv2 = np.NaN
+    fx = np.fft.fft(padded)
+    if preprocess:
+        fx[(ff <= max(fmin, fs / L)) | (ff >= fmax)] = 0
 
-    if qv2 < 10 ^ (-8):
-        x2e = scipy.optimize.fsolve(
-            func=lambda u: np.abs(vfun(u) / vmax) + np.abs(vfun((u + lim2) / 2) / vmax) + np.abs(
-                vfun((u + 3 * lim2) / 4) / vmax) - 10 ** (-8), x0=[xp + shp, tx2])
-    elif np.isnan(qv2):
-        x2e = scipy.optimize.fsolve(
-            func=lambda u: abs(vfun(xp + abs(u)) / vmax) + abs(vfun(xp + np.sqrt(3) * abs(u)) / vmax) + abs(
-                vfun(xp + np.sqrt(5) * np.abs(u)) / vmax) - 10 ** (-8), x0=shp)
+    transform = np.empty((SN, L), dtype=np.complex128)
+    block = max(1, _block_elements // NL)
 
-        x2e = xp + abs(x2e)
+    for start in range(0, SN, block):
+        rows = slice(start, min(SN, start + block))
 
-    else:
-        x2e = xp + (lim2 - xp) / 2
-
-    if np.isnan(x1e):
-        x1e = scipy.optimize.fmin(func=lambda u: abs(abs(vfun(x1h - abs(u)) / vmax) - 10 ** (-8)), x0=0)
-        x1e = x1h - abs(x1e)
-        lim1 = x1e
-        wflag = 1
-    if np.isnan(x2e):
-        x2e = scipy.optimize.fmin(func=lambda u: abs(abs(vfun(x2h + abs(u)) / vmax) - 10 ** (-8)), x0=0)
-        x2e = x2h + abs(x2e)
-        lim2 = x2e
-        wflag = 1
-
-    # Integrate given function to find Q1 and Q2.
-    Q1 = 0  # line1003
-    Q2 = 0
-
-    qv, eb = quadgk(vfun, xp, x1e, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-    qv, eb = quadgk(vfun, xp, x1e, limit=MIC, epsabs=0.1 * abs(ctol * (Q1 + qv)), epsrel=0)
-
-    x1m = x1e
-    q1m = qv
-
-    if abs(eb / (Q1 + qv)) > ctol:
-        wflag = 1
-        qv, eb = quadgk(vfun, xp, x1e, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-        qv, eb = quadgk(vfun, xp, x1e, limit=MIC, epsabs=0.1 * abs(ctol * (Q1 + qv)), epsrel=0)
-        x1m = x1h
-        q1m = qv
-        if abs(eb / (Q1 + qv)) <= ctol:
-            while True:
-                qv, eb = quadgk(vfun, xp, max([xp + (x1m - xp) * 2, x1e]), limit=MIC, epsabs=0,
-                                epsrel=0.1 * ctol)
-                qv, eb = quadgk(vfun, xp, max([xp + (x1m - xp) * 2, x1e]), limit=MIC,
-                                epsabs=0.1 * abs(ctol * (Q1 + qv)), epsrel=0)
-                if abs(eb / (Q1 + qv)) > ctol:
-                    break
-                x1m = max([xp + (x1m - xp) * 2, x1e])
-                q1m = qv
+        # Only the frequencies where the window's spectrum is not negligible are used.
+        if np.isfinite(wp.xi_max):
+            df = wp.xi_max / (2 * np.pi)
+            used = (ff > freq[rows][0] - df) & (ff < freq[rows][-1] + df)
         else:
-            while abs(eb / (Q1 + qv)) > ctol:
-                x1m = xp + (x1m - xp) / 2
-                qv, eb = quadgk(vfun, xp, x1m, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-                qv, eb = quadgk(vfun, xp, x1m, limit=MIC, epsabs=0.1 * abs(ctol * (Q1 + qv)),
-                                epsrel=0)
-                q1m = qv
-        qv, eb = quadgk(vfun, xp, x1e, limit=MIC, epsabs=0.1 * abs(ctol * (Q1 + qv)), epsrel=0)
-        if abs(eb) < 0.5 * abs(qv):
-            Q1 = Q1 + qv
-
-    Q1 = Q1 + q1m
-    if wflag == 0:
-        qv, eb = quadgk(vfun, x1e, lim1, limit=MIC, epsabs=0.1 * abs(ctol * Q1), epsrel=0)
-        if not np.isfinite(lim1) and np.isnan(qv):
-            lim1 = x1e
-            while not np.isnan(vfun(2 * lim1)):
-                lim1 = 2 * lim1
-            qv, eb = quadgk(vfun, x1e, lim1, limit=MIC, epsabs=0.1 * abs(ctol * Q1), epsrel=0)
-        if abs(eb / Q1) > ctol:
-            wflag = 1
-            qv, eb = quadgk(vfun, x1e, max([min([8 * x1e, nlim1]), lim1]), limit=MIC,
-                            epsabs=0.1 * abs(ctol * Q1), epsrel=0)
-        if abs(eb) < 0.5 * abs(qv):
-            Q1 = Q1 + qv
-
-    Q1 = -Q1
-    qv, eb = quadgk(vfun, xp, x2e, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-    qv, eb = quadgk(vfun, xp, x2e, limit=MIC, epsabs=0.1 * abs(ctol * (Q2 + qv)), epsrel=0)
-    x2m = x2e
-    q2m = qv
-    if abs(eb / (Q2 + qv)) > ctol:
-        wflag = 1
-        qv, eb = quadgk(vfun, xp, x2e, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-        qv, eb = quadgk(vfun, xp, x2e, limit=MIC, epsabs=0.1 * abs(ctol * (Q2 + qv)), epsrel=0)
-
-        x2m = x2h
-        q2m = qv
-        if abs(eb / (Q2 + qv)) <= ctol:
-            while True:
-                qv, eb = quadgk(vfun, xp, min([xp + (x2m - xp) * 2, x2e]), limit=MIC, epsabs=0,
-                                epsrel=0.1 * ctol)
-                qv, eb = quadgk(vfun, xp, min([xp + (x2m - xp) * 2, x2e]), limit=MIC,
-                                epsabs=0.1 * abs(ctol * (Q2 + qv)), epsrel=0)
-                if abs(eb / (Q2 + qv)) > ctol:
-                    break
-                x2m = min([xp + (x2m - xp) * 2, x2e])
-                q2m = qv
+            used = slice(None)
 
-        else:
-            while abs(eb / (Q2 + qv)) > ctol:
-                x2m = xp + (x2m - xp) / 2
-                qv, eb = quadgk(vfun, xp, x2m, limit=MIC, epsabs=0, epsrel=0.1 * ctol)
-                qv, eb = quadgk(vfun, xp, x2m, limit=MIC, epsabs=0.1 * abs(ctol * (Q2 + qv)),
-                                epsrel=0)
-                q2m = qv
-        qv, eb = quadgk(vfun, x2m, x2e, limit=MIC, epsabs=0.1 * abs(ctol * (Q2 + qv)), epsrel=0)
-        if abs(eb) < 0.5 * abs(qv):
-            Q2 += qv
-
-    Q2 += q2m
-    if wflag == 0:
-        qv, eb = quadgk(vfun, x2e, lim2, limit=MIC, epsabs=0.1 * abs(ctol * Q2), epsrel=0)
-        if not np.isfinite(lim2) and np.isnan(qv):
-            lim2 = x2e
-            while not np.isnan(vfun(2 * lim2)):
-                lim2 = 2 * lim2
-            qv, eb = quadgk(vfun, x2e, lim2, limit=MIC, epsabs=0.1 * abs(ctol * Q2), epsrel=0)
-        if abs(eb / Q2) > ctol:
-            wflag = 1
-            qv, eb = quadgk(vfun, x2e,
-                            min([max([8 * x2e, nlim2]), lim2]),
-                            limit=MIC,
-                            epsabs=0.1 * abs(ctol * Q2),
-                            epsrel=0)
-            if abs(eb) < 0.5 * abs(qv):
-                Q2 = Q2 + qv
-
-        QQ = np.asarray([[Q1, Q2], [-q1m, q2m]], dtype=np.float64)
-        xx = np.asarray([[x1e, x2e],
-                         [x1h, x2h],
-                         [x1m, x2m],
-                         [lim1, lim2]], dtype=np.float64)
-
-        Q = Q1 + Q2
-
-        def fz(zv):
-            if zv < abs(Q1 / Q):
-                cx1 = x1m
-                cq1 = Q1 + q1m
-                ra = np.exp(-1 / 2)
-                rb = np.exp(1 / 2)
-            else:
-                cx1 = x2m
-                cq1 = Q1 + q2m
-                ra = np.exp(1 / 2)
-                rb = np.exp(-1 / 2)
-
-            if abs(1 - abs((Q - cq1) / Q)) < zv:
-                while True:
-                    nx = xp + ra * (cx1 - xp)
-                    if nx < lim1: nx = (cx1 + lim1) / 2
-                    if nx > lim2: nx = (cx1 + lim2) / 2
-                    [pv, _] = quadgk(vfun, cx1, nx, limit=MIC, epsabs=0.1 * abs(ctol * Q), epsrel=0)
-                    if abs(1 - abs((Q - cq1 - pv) / Q)) >= zv:
-                        cx2 = nx
-                        cq2 = cq1 + pv
-                        break
-                    cx1 = nx
-                    cq1 = cq1 + pv
-            else:
-                while True:
-                    nx = xp + rb * (cx1 - xp)
-                    if nx < lim1:
-                        nx = (cx1 + lim1) / 2
-                    if nx > lim2:
-                        nx = (cx1 + lim2) / 2
-                    [pv, _] = quadgk(vfun, cx1, nx, limit=MIC, epsabs=0.1 * abs(ctol * Q), epsrel=0)
-                    if abs(1 - abs((Q - cq1 - pv) / Q)) >= zv:
-                        cx2 = nx
-                        cq2 = cq1 + pv
-                        break
-                    cx1 = nx
-                    cq1 = cq1 + pv
-
-            [pv, _] = quadgk(vfun, cx1, (cx1 + cx2) / 2, limit=MIC, epsabs=0.1 * abs(ctol * Q), epsrel=0)
-            qfun = lambda x: 1 - abs((Q - (cq1 + pv +
-                                           quadgk(vfun, (cx1 + cx2) / 2, x, limit=MIC // 10,
-                                                  epsabs=0.5 * abs(ctol * Q), epsrel=0)[0])
-                                      ) / Q)
-            x0 = scipy.optimize.fsolve(lambda x: abs(qfun(x)) - zv,
-                                       x0=(cx1 + cx2) / 2)  # Modified to use average of cx1 and cx2.
-            return x0
-
-        s1e = fz(racc / 2)
-        s2e = fz(1 - racc / 2)
-        s1h = fz(0.5 / 2)
-        s2h = fz(1 - 0.5 / 2)
-        ss = np.asarray([[s1e, s2e],
-                         [s1h, s2h]], dtype=np.float64)
-
-        return QQ, wflag, xx, ss
-
-
-def fcast(sig, fs, NP, fint, *args):  # line1145
-    MaxOrder = len(sig)
-    if len(args) > 0:
-        MaxOrder = args[0] or MaxOrder
-    w = []
-    if len(args) > 1:
-        w = np.asarray(args[1], dtype=np.float64)
-    rw = np.sqrt(w)
-    # ignore DispMode
+        fw = wp.fwt(2 * np.pi * (freq[rows, None] - ff[None, used]))
+        fw[~np.isfinite(fw)] = 0
 
-    WTol = 10 ** -8  # tolerance for cutting weighting.
-    Y = sig[:]
-    if not isempty(rw):
-        Y = rw * Y
+        spectrum = np.zeros((len(freq[rows]), NL), dtype=np.complex128)
+        spectrum[:, used] = fx[used] * fw
 
-    max = np.max(rw)
-    L = find(rw, lambda i: i / max >= WTol)[-1]
-    T = L / fs
-    t = np.arange(0, L + 1) / fs
+        transform[rows] = np.fft.ifft(spectrum, axis=1)[:, n1 : n1 + L]
 
-    w = w[-L - 1:]  # level3
-    rw = rw[-L - 1:]  # level3
-    Y = Y[-L - 1:]  # level3
+    if cut_edges and coib > 0:
+        transform[:, :coib] = np.nan
+        transform[:, L - coib :] = np.nan
 
-    MaxOrder = np.min([MaxOrder, np.floor(L + 1 / 3)])
+    return transform, freq
 
-    FTol = 0.01 / T
-    rr = (1 + np.sqrt(5)) / 2
-    Nq = np.ceil((L + 1) / 2)
-    ftfr = np.concatenate([np.arange(0, Nq), -np.flip(np.arange(1, L - Nq + 1))]) * fs / L
-    orstd = np.std(Y)
 
-    v = np.zeros(L, dtype=np.float64)
-    ic = v
-    frq = v
-    amp = v
-    phi = v
-    itn = 0
+def _round_down(value: float) -> float:
+    """
+    Rounds a positive value down to one significant figure.
+    """
+    scale = 10 ** np.floor(np.log10(value))
+    return np.floor(value / scale) * scale
 
-    # Skipped if DispMode
 
-    while itn < MaxOrder:
-        itn += 1
-        aftsig = abs(fft(Y))
+def _preprocess(signal: ndarray, fs: float, fmin: float, fmax: float) -> ndarray:
+    """
+    Subtracts the best-fitting cubic polynomial from the signal, then removes the
+    frequencies outside (fmin, fmax).
+    """
+    L = len(signal)
 
-        a = aftsig[2:np.int(Nq)]
-        m = np.max(a)
-        s = find(a, lambda i: i == m)[0]
+    X = np.arange(1, L + 1) / fs
+    XM = np.ones((L, 4), dtype=np.float64)
+    for pn in range(1, 4):
+        CX = X ** pn
+        XM[:, pn] = (CX - np.mean(CX)) / np.std(CX)
 
-        imax = np.int(s) + 1
+    signal = signal - XM @ np.linalg.lstsq(XM, signal, rcond=None)[0]
 
-        # Forward search
-        nf = ftfr[imax]
+    fx = np.fft.fft(signal)
+    ff = np.abs(np.fft.fftfreq(L, 1 / fs))
+    fx[(ff <= max(fmin, fs / L)) | (ff >= fmax)] = 0
 
-        FM1 = np.ones(L + 1, dtype=np.float64)
-        FM2 = np.cos(2 * np.pi * nf * t)
-        FM3 = np.sin(2 * np.pi * nf * t)
-        FM = np.asarray([FM1, FM2, FM3], dtype=np.float64)
+    return np.real(np.fft.ifft(fx))
 
-        if not isempty(rw):
-            temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-            FM = FM.transpose() * temp
 
-        nb = backslash(FM, Y)  # level3
+def fcast(
+    sig: ndarray, fs: float, NP: int, fint: Tuple[float, float], *args
+) -> ndarray:
+    """
+    Predictive padding. Fits the main sinusoidal components of the signal using weighted
+    least squares, and uses them to continue the signal for `NP` samples.
 
-        s = FM @ nb
-        nerr = np.std(Y - s)
+    The number of sinusoids is determined using the Bayesian information criterion.
 
-        df = FTol
-        perr = np.inf
-        while nerr < perr:
-            if abs(nf - fs / 2 + FTol) < eps:  # level3 eps
-                break
-            pf = nf
-            perr = nerr
-            pb = nb
-            nf = min([pf + df, fs / 2 - FTol])
+    :param sig: the signal
+    :param fs: the sampling frequency
+    :param NP: the number of samples to predict
+    :param fint: the allowed frequency range; sinusoids outside it are continued as constants
+    :param args: the maximum number of sinusoids, and the weight of each sample
+    :return: the predicted samples
+    """
+    NP = int(NP)
+    sig = np.asarray(sig, dtype=np.float64)
 
-            FM1 = np.ones(L + 1, dtype=np.float64)
-            FM2 = np.cos(2 * np.pi * nf * t)
-            FM3 = np.sin(2 * np.pi * nf * t)
-            FM = np.asarray([FM1, FM2, FM3], dtype=np.float64)
+    MaxOrder = len(sig)
+    if len(args) > 0:
+        MaxOrder = args[0] or MaxOrder
 
-            if not isempty(rw):
-                temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-                FM = FM.transpose() * temp
+    w = np.ones(len(sig))
+    if len(args) > 1 and args[1] is not None:
+        w = np.asarray(args[1], dtype=np.float64)
 
-            nb = backslash(FM, Y)  # level3
-            nerr = np.std(Y - s)
-            df = df * rr
+    rw = np.sqrt(w)
+    Y = rw * sig
 
-        # Use golden section search to find exact minimum
-        if nerr < perr:
-            cf = [nf, nf, nf]
-            cerr = [nerr, nerr, nerr]
-            cb = [nb, nb, nb]
+    # Samples with negligible weight are ignored.
+    WTol = 1e-8
+    L = int(np.count_nonzero(rw / np.max(rw) >= WTol))
+    T = L / fs
+    t = np.arange(L) / fs
 
-        elif abs(nf - pf - FTol) < eps:
-            cf = [pf, pf, pf]
-            cerr = [perr, perr, perr]
-            cb = [pb, pb, pb]
+    rw = rw[-L:]
+    Y = Y[-L:]
 
-        else:
-            cf = [0, pf, nf]
-            cerr = [0, perr, nerr]
-            cb = [np.zeros(len(pb), 1), pb, nb]
-            cf[1] = pf - df / rr / rr
-            FM = [np.ones(L, 1), np.cos(2 * np.pi * cf[1] * t), np.sin(2 * np.pi * cf[1] * t)]
-            if not isempty(rw):
-                FM = FM * (rw * np.ones(1, 3))
-            cb[1] = np.linalg.lstsq(FM, Y)  # level3
-            cerr[1] = np.std(Y - FM * cb[1])
-
-        while (cf[2] - cf[1] > FTol and cf[3] - cf[2] > FTol):
-            tf = cf[1] + cf[3] - cf[2]
-            FM = [np.ones(L, 1), np.cos(2 * np.pi * tf * t), np.sin(2 * np.pi * tf * t)]
-            if not isempty(rw):
-                FM = FM * (rw * np.ones(1, 3))
-            tb = np.linalg.lstsq(FM, Y)
-            terr = np.std(Y - FM * tb)
-
-            if terr < cerr[2] and tf < cf[2]:  # TODO: fix all indices
-                cf = [cf(1), tf, cf(2)]
-                cerr = [cerr(1), terr, cerr(2)]
-                cb = [cb[1], tb[:], cb[:2]]
-            if terr < cerr[2] and tf > cf[2]:
-                cf = [cf[2], tf, cf[3]]
-                cerr = [cerr[2], terr, cerr[3]]
-                cb = [cb[2], tb[:], cb[:3]]
-            if terr > cerr[2] and tf < cf[2]:
-                cf = [tf, cf(2), cf(3)]
-                cerr = [terr, cerr[2], cerr[3]]
-                cb = [tb[:], cb[2], cb[3]]
-            if terr > cerr[2] and tf > cf[2]:
-                cf = [cf[1], cf[2], tf]
-                cerr = [cerr[1], cerr[2], terr]
-                cb = [cb[1], cb[2], tb[:]]
-
-        # Forward values.
-        fcf = cf[1]
-        fcb = cb[1]  # level2
-        fcerr = cerr[1]
-
-        # Backward search
-
-        vf = ftfr[imax]
-
-        if not isempty(rw):
-            FM = FM * np.ones((1, 3))
-
-        nb = backslash(FM, Y)  # level3
-
-        s = FM @ nb
-        nerr = np.std(Y - s)
-
-        df = FTol
-        perr = np.inf
-        while nerr < perr:
-            if abs(nf - FTol) < eps:
-                break
-            pf = nf
-            perr = nerr
-            pb = nb
-            nf = np.max([pf - df, FTol])
-
-            FM1 = np.ones(L + 1, dtype=np.float64)
-            FM2 = np.cos(2 * np.pi * nf * t)
-            FM3 = np.sin(2 * np.pi * nf * t)
-            FM = np.asarray([FM1, FM2, FM3], dtype=np.float64)
-
-            if not isempty(rw):
-                temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-                FM = FM.transpose() * temp
-
-            nb = backslash(FM, Y)
-            nerr = np.std(Y - FM @ nb)
-            df = df * rr
-
-        # TODO: fix repeating code
-        # Use golden section search to find exact minimum
-        if nerr < perr:
-            cf = [nf, nf, nf]
-            cerr = [nerr, nerr, nerr]
-            cb = [nb, nb, nb]
-
-        elif abs(nf - pf - FTol) < eps:
-            cf = [pf, pf, pf]
-            cerr = [perr, perr, perr]
-            cb = [pb, pb, pb]
+    MaxOrder = int(min(MaxOrder, np.floor(L / 3)))
 
-        else:
-            cf = [0, pf, nf]
-            cerr = [0, perr, nerr]
-            cb = [np.zeros((len(pb), 1)), pb, nb]
-            cf[1] = pf - df / rr / rr
-
-            FM1 = np.ones(L + 1, dtype=np.float64)
-            FM2 = np.cos(2 * np.pi * nf * t)
-            FM3 = np.sin(2 * np.pi * nf * t)
-            FM = np.asarray([FM1, FM2, FM3], dtype=np.float64)
-
-            if not isempty(rw):
-                temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-                FM = FM.transpose() * temp
-
-            cb[1] = backslash(FM, Y)  # level3
-            cerr[1] = np.std(Y - FM @ cb[1])
-
-        while (cf[2] - cf[1] > FTol and cf[3] - cf[2] > FTol):
-            tf = cf[1] + cf[3] - cf[2]
-            FM = [np.ones(L, 1), np.cos(2 * np.pi * tf * t), np.sin(2 * np.pi * tf * t)]
-            if not isempty(rw):
-                FM = FM * (rw * np.ones(1, 3))
-            tb = np.linalg.lstsq(FM, Y)
-            terr = np.std(Y - FM * tb)
-
-            if terr < cerr[2] and tf < cf[2]:  # TODO: fix all indices
-                cf = [cf(1), tf, cf(2)]
-                cerr = [cerr(1), terr, cerr(2)]
-                cb = [cb[1], tb[:], cb[:2]]
-            if terr < cerr[2] and tf > cf[2]:
-                cf = [cf[2], tf, cf[3]]
-                cerr = [cerr[2], terr, cerr[3]]
-                cb = [cb[2], tb[:], cb[:3]]
-            if terr > cerr[2] and tf < cf[2]:
-                cf = [tf, cf(2), cf(3)]
-                cerr = [terr, cerr[2], cerr[3]]
-                cb = [tb[:], cb[2], cb[3]]
-            if terr > cerr[2] and tf > cf[2]:
-                cf = [cf[1], cf[2], tf]
-                cerr = [cerr[1], cerr[2], terr]
-                cb = [cb[1], cb[2], tb[:]]
-        bcf = cf[2]
-        bcb = cb[2]
-        bcerr = cerr[2]
-
-        # Assign values and subtract
-        if fcerr < bcerr:
-            cf = fcf
-            cb = fcb
-            cerr = fcerr
-        else:
-            cf = bcf
-            cb = bcb
-            cerr = bcerr
-
-        frq[itn + 1] = cf
-        amp[itn + 1] = np.sqrt(cb[1] ** 2 + cb[2] ** 2)
-        phi[itn + 1] = np.arctan2(-cb[2], cb[1])
-        amp[1] = amp[0] + cb[0]
-        v[itn] = cerr
-
-        FM1 = np.ones(L + 1, dtype=np.float64)
-        FM2 = np.cos(2 * np.pi * nf * t)
-        FM3 = np.sin(2 * np.pi * nf * t)
-        FM = np.asarray([FM1, FM2, FM3], dtype=np.float64)
-
-        # if not isempty(rw):
-        #     temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-        #     FM = FM.transpose() * temp
-
-        if not isempty(rw):
-            temp = rw.reshape(len(rw), 1) * np.ones((1, 3), dtype=np.float64)
-            FM = FM.transpose() * temp
-            # FM = FM * (rw @ np.ones((1, 3)))
-            Y = Y - FM @ cb
-
-        CK = 3 * itn + 1
-        cic = L * np.log(cerr) + CK * np.log(L)
-
-        ic[itn] = cic
-        if v[itn] / orstd < 2 * eps:
-            break
-        if itn > 2 and cic > ic[itn - 1] and cic[itn - 1] > ic[itn - 2]:
-            break
+    FTol = 0.01 / T  # Accuracy of the frequencies.
+    eps = np.finfo(np.float64).eps
 
+    Nq = int(np.ceil((L + 1) / 2))
+    orstd = np.std(Y)
 
-    frq = frq[1:itn + 1]
-    amp = amp[1:itn + 1]
-    phi = phi[1:itn + 1]
-    v = v[1:itn]
-    ic = ic[1:itn]
+    fit = _SinusoidFit(t, rw, len(_fcast_grid))
 
-    fsig = np.zeros(np.int(NP))
-    nt = (np.arange(T, T + (NP - 1), 1 / fs) / fs).transpose()
+    # The first component is the constant term, which accumulates each fit's offset.
+    frq, amp, phi = [0.0], [0.0], [0.0]
+    ic = []
 
-    if (sig.shape[1] if len(sig.shape) > 1 else 1) > sig.shape[0]:
-        fsig = fsig.transpose()
-        nt = nt.transpose()
-    for k in range(1, len(frq)):
-        if frq[k] > fint(1) and frq(k) < fint(2):
-            fsig = fsig + amp(k) * np.cos(twopi * frq(k) * nt + phi(k))
-        else:
-            fsig = fsig + amp(k) * np.cos(twopi * frq(k) * (T - 1 / fs) + phi(k))
+    for itn in range(1, MaxOrder + 1):
+        aftsig = np.abs(np.fft.fft(Y))
+        imax = np.argmax(aftsig[1:Nq]) + 1
 
-    return fsig
+        # If the peak of the FFT is a minimum of the error to within FTol, it is used
+        # directly. Otherwise, the frequencies within one FFT bin of the peak are searched,
+        # and the best is refined with parabolic interpolation until it is accurate to FTol.
+        peak = imax * fs / L
+        candidates = np.clip(peak + FTol * _fcast_unit, FTol, fs / 2 - FTol)
+        cb, cerr = fit(candidates, Y)
+        best = np.argmin(cerr)
 
+        if best != 1:
+            step = fs / L / (len(_fcast_grid) // 2)
+            candidates = peak + step * _fcast_grid
 
-def aminterp(X, Y, Z, XI, YI, method):
-    ZI = np.zeros(np.size(Z, 1), len(XI)) * np.NaN
-    xstep = np.mean(np.diff(XI))
-    xind = 1 + np.floor((1 / 2) + (X - XI(1)) / xstep)
-    xpnt = np.asarray([0], [0], [0])  # level3 TODO: add later
+            while True:
+                candidates = np.clip(candidates, FTol, fs / 2 - FTol)
+                cb, cerr = fit(candidates, Y)
+                best = np.argmin(cerr)
 
-    if method == "max":
-        for xn in range(1, len(xpnt)):
-            xid1 = xpnt[xn - 1] + 1
-            xid2 = xpnt[xn]
-            ZI[xind[xid1]] = np.max(Z[xid1:xid2], 2)
-    else:
-        for xn in range(1, len(xpnt)):
-            xid1 = xpnt[xn - 1] + 1
-            xid2 = xpnt[xn + 1]
-            ZI[xind[xid1]] = np.mean(Z[xid1:xid2], 2)
-    Z = ZI
-
-    ZI = np.zeros(len(YI), np.size(Z, 2)) * np.NaN
-    ystep = np.mean(np.diff(YI))
-    yind = 1 + np.floor((1 / 2) + (Y - YI(1)) / ystep)
-    ypnt = [[0], [0], [0]]  # level3 TODO: add later
-
-    if method == "max":
-        for yn in range(1, len(ypnt)):
-            yid1 = ypnt[yn - 1] + 1
-            yid2 = ypnt[yn]
-            ZI[yind[yid1]] = np.max(Z[yid1:yid2], 2)
-    else:
-        for yn in range(1, len(ypnt)):
-            yid1 = xpnt[yn - 1] + 1
-            yid2 = xpnt[yn + 1]
-            ZI[yind[yid1]] = np.mean(Z[yid1:yid2], 2)
+                if step <= FTol:
+                    break
 
-    return ZI
+                cf = candidates[best]
+                if 0 < best < len(candidates) - 1:
+                    nearby = slice(best - 1, best + 2)
+                    cf = _parabola_vertex(candidates[nearby], cerr[nearby])
 
+                step /= 4
+                candidates = cf + step * _fcast_unit
 
-if __name__ == "__main__":
-    """Test the function if this file is run directly."""
-    fs = 20
-    t = np.arange(0, 50, 1 / fs)
-    signal = np.cos(twopi * 3 * t + 0.75 * np.sin(twopi * t / 5))
+        cf, cb = candidates[best], cb[best]
+
+        frq.append(cf)
+        amp.append(np.sqrt(cb[1] ** 2 + cb[2] ** 2))
+        phi.append(np.arctan2(-cb[2], cb[1]))
+        amp[0] += cb[0]
+
+        Y = Y - fit.model(cf, cb)
+        cerr = np.std(Y)
+
+        # Bayesian information criterion.
+        ic.append(L * np.log(cerr) + (3 * itn + 1) * np.log(L))
+
+        if cerr / orstd < 2 * eps:
+            break
+        if itn > 2 and ic[-1] > ic[-2] > ic[-3]:
+            break
+
+    frq, amp, phi = np.array(frq), np.array(amp), np.array(phi)
+    nt = T + np.arange(NP) / fs
+
+    # Sinusoids outside the allowed range are continued as constants.
+    inside = (frq > fint[0]) & (frq < fint[1])
+    fsig = amp[inside] @ np.cos(
+        2 * np.pi * np.outer(frq[inside], nt) + phi[inside, None]
+    )
+    fsig += np.sum(
+        amp[~inside] * np.cos(2 * np.pi * frq[~inside] * (T - 1 / fs) + phi[~inside])
+    )
+
+    return fsig
 
-    w, f = wft(signal, fs)
 
-    plt.pcolormesh(t, f, np.abs(w))
-    # plt.show()
+# Offsets, in units of the search step, of the frequencies tried by `fcast` within one FFT
+# bin of the peak, and around the best frequency while it is refined.
+_fcast_grid = np.arange(-4, 5, dtype=np.float64)
+_fcast_unit = np.array([-1.0, 0.0, 1.0])
+
+
+class _SinusoidFit:
+    """
+    Weighted least-squares fit of a constant plus a sinusoid, for many trial frequencies at
+    once. The design matrices are allocated once and reused for every call.
+    """
+
+    def __init__(self, t: ndarray, rw: ndarray, max_candidates: int):
+        """
+        :param t: the times of the samples
+        :param rw: the square root of the weight of each sample
+        :param max_candidates: the maximum number of frequencies in one call
+        """
+        self.t = t
+        self.rw = rw
+        self.cos = np.empty((max_candidates, len(t)))
+        self.sin = np.empty((max_candidates, len(t)))
+
+    def __call__(self, freq: ndarray, Y: ndarray) -> Tuple[ndarray, ndarray]:
+        """
+        Fits each frequency to the weighted signal.
+
+        :param freq: the trial frequencies
+        :param Y: the weighted signal
+        :return: the coefficients of the constant, cosine and sine for each frequency, and
+        the standard deviation of the residual
+        """
+        K = len(freq)
+        rw = self.rw
+
+        phase = np.multiply.outer(2 * np.pi * freq, self.t, out=self.cos[:K])
+        S = np.sin(phase, out=self.sin[:K])
+        C = np.cos(phase, out=phase)
+        C *= rw
+        S *= rw
+
+        # Normal equations, with one 3x3 system for each frequency.
+        gram = np.empty((K, 3, 3))
+        gram[:, 0, 0] = rw @ rw
+        gram[:, 0, 1] = gram[:, 1, 0] = C @ rw
+        gram[:, 0, 2] = gram[:, 2, 0] = S @ rw
+        gram[:, 1, 1] = np.einsum("ij,ij->i", C, C)
+        gram[:, 2, 2] = np.einsum("ij,ij->i", S, S)
+        gram[:, 1, 2] = gram[:, 2, 1] = np.einsum("ij,ij->i", C, S)
+
+        rhs = np.stack((np.full(K, rw @ Y), C @ Y, S @ Y), axis=1)
+        b = (np.linalg.pinv(gram) @ rhs[:, :, None])[:, :, 0]
+
+        # Variance of the residual, from the sum of its squares and its mean.
+        L = len(Y)
+        sum_squares = Y @ Y - 2 * np.sum(b * rhs, axis=1)
+        sum_squares += np.einsum("ki,kij,kj->k", b, gram, b)
+
+        column_sums = np.stack((np.full(K, np.sum(rw)), C.sum(axis=1), S.sum(axis=1)))
+        mean = (np.sum(Y) - np.sum(b * column_sums.T, axis=1)) / L
+
+        return b, np.sqrt(np.maximum(sum_squares / L - mean ** 2, 0))
+
+    def model(self, f: float, b: ndarray) -> ndarray:
+        """
+        Returns the fitted weighted signal for one frequency and its coefficients.
+        """
+        phase = 2 * np.pi * f * self.t
+        return self.rw * (b[0] + b[1] * np.cos(phase) + b[2] * np.sin(phase))
+
+
+def _parabola_vertex(x: ndarray, y: ndarray) -> float:
+    """
+    Returns the position of the minimum of the parabola through three equally spaced points,
+    or the middle point if the parabola has no minimum between the outer points.
+    """
+    curvature = y[0] - 2 * y[1] + y[2]
+    if curvature <= 0:
+        return x[1]
+
+    vertex = x[1] + (x[1] - x[0]) * (y[0] - y[2]) / (2 * curvature)
+    return float(np.clip(vertex, x[0], x[2]))
@@ -13,7 +13,8 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-from typing import Any, Optional, List
+import array
+from typing import Any, Optional, List, Tuple
 
 import numpy as np
 from numpy import ndarray
@@ -22,6 +23,12 @@ from numpy import ndarray
 File containing useful numerical functions.
 """
 
+# Maximum number of elements in each block reduced by `avg_ampl_pow()`.
+_block_elements = 2 ** 16
+
+# Maximum number of columns in each block reduced by `avg_ampl_pow()`.
+_block_columns = 2 ** 12
+
 
 def float_or_none(var: Any) -> Optional[float]:
     """
@@ -117,15 +124,60 @@ def calc_subset_count(arr):
 
 def matlab_to_numpy(arr) -> ndarray:
     """
-    Converts a matlab array to a numpy array.
-    Can be much faster than simply calling "np.asarray()",
-    but does not appear to be faster for complex arrays.
+    Converts a MATLAB array to a numpy array.
+
+    The data of a MATLAB array is stored in `array.array` objects (`_data`, or `_real` and
+    `_imag` for complex arrays) in column-major order. These support the buffer protocol,
+    so they are copied directly instead of being iterated element by element. Newer
+    versions of the MATLAB engine, which support the buffer protocol themselves, are
+    converted with `np.asarray()`.
     """
+    if isinstance(arr, ndarray):
+        return arr
+
     try:
-        # Should work for real arrays, maybe not for complex arrays.
-        result = np.array(arr._data).reshape(arr.size, order="F")
-    except:
-        result = np.array(arr)
+        if getattr(arr, "_is_complex", False):
+            real = np.asarray(memoryview(arr._real))
+            result = np.empty(real.shape, dtype=np.result_type(real, np.complex64))
+            result.real = real
+            result.imag = np.asarray(memoryview(arr._imag))
+        else:
+            result = np.array(memoryview(arr._data))
+
+        return result.reshape(arr.size, order="F")
+    except (AttributeError, TypeError, ValueError):
+        return np.asarray(arr)
+
+
+def numpy_to_matlab(arr: Any) -> Any:
+    """
+    Converts a numpy array (or a list) to a `matlab.double`. A 1D array becomes a row
+    vector, as with `matlab.double(list)`.
+
+    The data is copied directly into the storage of the MATLAB array, instead of being
+    converted to a list of Python floats. Newer versions of the MATLAB engine accept
+    numpy arrays directly, which is used when the storage is not an `array.array`.
+
+    Must only be called in a process where the MATLAB Runtime can be imported.
+    """
+    import matlab
+
+    arr = np.asarray(arr)
+    if arr.ndim < 2:
+        arr = arr.reshape(1, -1)
+
+    is_complex = np.iscomplexobj(arr)
+    result = matlab.double(size=arr.shape, is_complex=is_complex)
+
+    parts = {"_real": arr.real, "_imag": arr.imag} if is_complex else {"_data": arr}
+    if not all(isinstance(getattr(result, k, None), array.array) for k in parts):
+        return matlab.double(arr, is_complex=is_complex)
+
+    for key, values in parts.items():
+        data = array.array("d")
+        data.frombytes(np.asarray(values, dtype=np.float64).tobytes(order="F"))
+        setattr(result, key, data)
+
     return result
 
 
@@ -138,3 +190,68 @@ def multi_matlab_to_numpy(*args) -> List[ndarray]:
         out.append(matlab_to_numpy(arr))
 
     return out
+
+
+def avg_ampl_pow(amplitude: ndarray) -> Tuple[ndarray, ndarray]:
+    """
+    Calculates the time-averaged amplitude and power for each frequency of a transform,
+    ignoring any values which are not finite (e.g. NaNs outside the cone of influence).
+
+    The array is reduced in blocks of rows and columns, so that the temporary arrays stay
+    small enough to remain in the CPU cache. Only the rows of a block which contain values
+    that are not finite are masked.
+
+    Parameters
+    ----------
+    amplitude : ndarray
+        [2D array] The amplitudes of the transform, with frequency along the first axis.
+
+    Returns
+    -------
+    avg_ampl : ndarray
+        [1D array] The mean of the finite amplitudes in each row.
+    avg_pow : ndarray
+        [1D array] The mean of the squares of the finite amplitudes in each row.
+    """
+    amplitude = np.asanyarray(amplitude)
+    rows = amplitude.shape[0]
+    cols = amplitude.size // rows if rows else 0
+
+    total = np.zeros(rows, dtype=np.float64)
+    total_sq = np.zeros(rows, dtype=np.float64)
+    count = np.zeros(rows, dtype=np.int64)
+
+    block_cols = max(1, min(cols, _block_columns))
+    block_rows = max(1, _block_elements // block_cols)
+
+    # Sums of rows containing inf and -inf are NaN, and rows without any finite values
+    # have no meaningful average.
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for r0 in range(0, rows, block_rows):
+            r1 = min(r0 + block_rows, rows)
+
+            for c0 in range(0, cols, block_cols):
+                c1 = min(c0 + block_cols, cols)
+                block = np.asarray(amplitude[r0:r1, c0:c1], dtype=np.float64)
+
+                block_sum = block.sum(axis=1)
+                block_sq = np.einsum("ij,ij->i", block, block)
+                block_count = np.full(r1 - r0, c1 - c0)
+
+                # The sums of rows containing NaN or inf are not finite, so only these
+                # rows need to be masked.
+                masked = ~(np.isfinite(block_sum) & np.isfinite(block_sq))
+                if masked.any():
+                    sub = block[masked]
+                    finite = np.isfinite(sub)
+                    values = np.where(finite, sub, 0)
+
+                    block_sum[masked] = values.sum(axis=1)
+                    block_sq[masked] = np.einsum("ij,ij->i", values, values)
+                    block_count[masked] = np.count_nonzero(finite, axis=1)
+
+                total[r0:r1] += block_sum
+                total_sq[r0:r1] += block_sq
+                count[r0:r1] += block_count
+
+        return total / count, total_sq / count
@@ -28,6 +28,9 @@ class BAParams:
         surr_count: int,
         alpha: float,
         opt: dict,
+        surr_seed: int = None,
+        implementation: str = "matlab",
+        keep_surrogates: bool = False,
     ):
         self.signals = signals
         self.fmin = fmin
@@ -36,7 +39,12 @@ class BAParams:
         self.preprocess = preprocess
         self.nv = nv
         self.surr_count = surr_count
+        self.surr_seed = surr_seed
         self.alpha = alpha
+        self.implementation = implementation
+
+        # Whether to return every surrogate bispectrum, instead of only the significance thresholds.
+        self.keep_surrogates = keep_surrogates
         self.fs = signals.frequency
 
         # The MATLAB algorithm returns a struct, `opt`, which is converted to this dict.
@@ -41,6 +41,8 @@ class PCParams(TFParams):
         surr_count=0,
         surr_method="RP",
         surr_preproc=False,
+        surr_percentile=None,
+        surr_seed=None,
     ):
         if not surr_enabled:
             surr_count = 0
@@ -49,6 +51,12 @@ class PCParams(TFParams):
         self.surr_method = surr_method
         self.surr_preproc = surr_preproc
 
+        # Percentile of the surrogates used as a significance threshold, or None.
+        self.surr_percentile = surr_percentile
+
+        # Seed of the surrogates; if None, the surrogates are different every time.
+        self.surr_seed = surr_seed
+
         super().__init__(
             signals,
             fmin,
@@ -68,5 +76,10 @@ class PCParams(TFParams):
     def items_to_save(self) -> Dict:
         tf = super().items_to_save()
 
-        out = {"surr_count": self.surr_count, "surr_type": self.surr_method, **tf}
+        out = {
+            "surr_count": self.surr_count,
+            "surr_type": self.surr_method,
+            "surr_percentile": self.surr_percentile,
+            **tf,
+        }
         return sanitise(out)
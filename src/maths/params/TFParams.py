@@ -16,6 +16,7 @@
 from typing import Type, Dict
 
 from maths.signals.Signals import Signals
+from utils import args
 from utils.dict_utils import sanitise
 
 # Keys for the dictionary that is supplied to the Matlab function.
@@ -65,6 +66,8 @@ class TFParams:
         rel_tolerance=0.01,
         transform=_wft,
         implementation: str = "python",
+        block_size: int = None,
+        wft_implementation: str = None,
     ):
         """
         Constructor which takes the desired parameters and converts
@@ -84,6 +87,11 @@ class TFParams:
         :param wavelet: the wavelet type to use in the WT - Lognorm, Morlet, Bump or Morse-a.
         :param preprocess: whether to perform preprocessing on the signal
         :param rel_tolerance: relative tolerance, specifying the cone of influence
+        :param block_size: if the signal is longer than this number of samples, the wavelet
+        transform will be calculated in overlapping blocks and written to a memory-mapped file;
+        defaults to the value of the '--wt-block-size' argument
+        :param wft_implementation: the implementation of the WFT, "matlab" or "python"; defaults
+        to "matlab" unless the '--python-wft' argument is supplied
         """
         if transform == _wt and fmin == 0:
             fmin = None
@@ -92,6 +100,12 @@ class TFParams:
         self.fs: float = float(signals.frequency)
         self.transform: str = transform
 
+        # Not passed to Matlab, so not included in the data dictionary.
+        self.block_size: int = block_size or args.wt_block_size()
+        self.wft_implementation: str = wft_implementation or (
+            "python" if args.python_wft() else "matlab"
+        )
+
         self.data = {
             _fmin: float(fmin) if fmin is not None else None,
             _fmax: float(fmax) if fmax else self.fs / 2.0,
@@ -129,9 +143,11 @@ class TFParams:
         if self.transform == _wft:
             window_type_name = "window_type"
             window_type = self.get_item("Window")
+            implementation = self.wft_implementation
         else:
             window_type_name = "wavelet_type"
             window_type = self.get_item("Wavelet")
+            implementation = self.get_item("implementation")
 
         out = {
             "transform_type": self.transform.upper(),
@@ -142,7 +158,7 @@ class TFParams:
             "cut_edges": self.get_item(_cut_edges),
             "fr": self.get_item(_f0),
             "preprocessing": self.get_item(_preprocess),
-            "implementation": self.get_item("implementation"),
+            "implementation": implementation,
         }
         return sanitise(out)
 
@@ -13,7 +13,7 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
-from typing import Dict
+from typing import Dict, Optional, Tuple
 
 from dataclasses import dataclass
 from numpy import ndarray
@@ -50,17 +50,20 @@ class BAOutputData:
     bispxpp: ndarray
     bisppxx: ndarray
 
-    # Surrogates.
-    surrxxx: ndarray
-    surrppp: ndarray
-    surrxpp: ndarray
-    surrpxx: ndarray
+    # Significance thresholds calculated from the surrogates.
+    thrxxx: ndarray
+    thrppp: ndarray
+    thrxpp: ndarray
+    thrpxx: ndarray
 
     opt: dict
 
     biamp: Dict[float, ndarray]
     biphase: Dict[float, ndarray]
 
+    # Surrogate bispectra (xxx, ppp, xpp, pxx), only kept when requested in the params.
+    surrogates: Optional[Tuple[ndarray, ndarray, ndarray, ndarray]] = None
+
     def invalidate(self):
         amp_wt1: ndarray = None
         pow_wt1: ndarray = None
@@ -76,10 +79,11 @@ class BAOutputData:
         bispppp: ndarray = None
         bispxpp: ndarray = None
         bisppxx: ndarray = None
-        surrxxx: ndarray = None
-        surrppp: ndarray = None
-        surrxpp: ndarray = None
-        surrpxx: ndarray = None
+        thrxxx: ndarray = None
+        thrppp: ndarray = None
+        thrxpp: ndarray = None
+        thrpxx: ndarray = None
         opt: dict = None
         biamp: Dict[float, ndarray] = None
         biphase: Dict[float, ndarray] = None
+        surrogates: Tuple[ndarray, ndarray, ndarray, ndarray] = None
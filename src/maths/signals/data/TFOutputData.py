@@ -13,46 +13,54 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
 from numpy import ndarray
 
+from maths.num_utils import avg_ampl_pow
+
 
 class TFOutputData:
     """
     A class which contains the output data from calculations.
+
+    Only the values of the transform are stored when the object is created; the amplitudes,
+    powers and their averages are calculated when first accessed, and can be freed with
+    `release()`.
+
+    The arrays may be memory-mapped buffers returned by a worker process (see
+    `processes.shared_arrays`); they are used directly, without copying.
     """
 
     def __init__(
             self,
             times: ndarray,
             values: ndarray,
-            ampl: ndarray,
             freq: ndarray,
-            powers: ndarray,
-            avg_ampl: ndarray,
-            avg_pow: ndarray,
             transform: str = "wt",
             overall_coherence: ndarray = None,
             phase_coherence: ndarray = None,
             phase_diff: ndarray = None,
     ):
         self.transform = transform  # The name of the transform (e.g. WT or WFT).
+
+        # Derived data, which is calculated from the values when first accessed.
+        self._ampl: ndarray = None
+        self._powers: ndarray = None
+        self._avg_ampl: ndarray = None
+        self._avg_pow: ndarray = None
+
         self.values = values  # The values of the transform (complex numbers).
 
         # Data plotted in main color mesh in time-frequency common.
         self.times = times
         self.freq = freq
-        self.ampl = ampl
-        self.powers = powers
-
-        # Data plotted on the RHS of the main color-mesh plot.
-        self.avg_ampl = avg_ampl
-        self.avg_pow = avg_pow
 
         # Wavelet phase coherence data.
         self.overall_coherence = overall_coherence
         self.phase_coherence = phase_coherence
         self.phase_diff = phase_diff
         self.surrogate_avg = None
+        self.surrogate_threshold = None
 
         # Ridge extraction data.
         self.filtered_signal = None
@@ -64,9 +72,88 @@ class TFOutputData:
         # Set to false when the data is invalidated.
         self.valid = True
 
+    @property
+    def values(self) -> ndarray:
+        return self._values
+
+    @values.setter
+    def values(self, values: ndarray) -> None:
+        # The derived data is no longer valid if the values change.
+        self.release()
+        self._values = values
+
+    @property
+    def ampl(self) -> ndarray:
+        """The amplitudes of the transform, calculated on first access."""
+        if self._ampl is None and self._values is not None:
+            self._ampl = _elementwise(np.abs, self._values)
+
+        return self._ampl
+
+    @ampl.setter
+    def ampl(self, ampl: ndarray) -> None:
+        self._ampl = ampl
+
+    @property
+    def powers(self) -> ndarray:
+        """The powers of the transform, calculated on first access."""
+        if self._powers is None and self.ampl is not None:
+            self._powers = _elementwise(np.square, self.ampl)
+
+        return self._powers
+
+    @powers.setter
+    def powers(self, powers: ndarray) -> None:
+        self._powers = powers
+
+    @property
+    def avg_ampl(self) -> ndarray:
+        """The time-averaged amplitudes of the transform, calculated on first access."""
+        if self._avg_ampl is None:
+            self._calc_averages()
+
+        return self._avg_ampl
+
+    @avg_ampl.setter
+    def avg_ampl(self, avg_ampl: ndarray) -> None:
+        self._avg_ampl = avg_ampl
+
+    @property
+    def avg_pow(self) -> ndarray:
+        """The time-averaged powers of the transform, calculated on first access."""
+        if self._avg_pow is None:
+            self._calc_averages()
+
+        return self._avg_pow
+
+    @avg_pow.setter
+    def avg_pow(self, avg_pow: ndarray) -> None:
+        self._avg_pow = avg_pow
+
+    def _calc_averages(self) -> None:
+        if self.ampl is None:
+            return
+
+        self._avg_ampl, self._avg_pow = avg_ampl_pow(self.ampl)
+
+    def release(self) -> None:
+        """
+        Releases the derived data (amplitudes, powers and their averages) to free memory.
+        They will be recalculated from the values if accessed again.
+        """
+        self._ampl = None
+        self._powers = None
+        self._avg_ampl = None
+        self._avg_pow = None
+
     def is_valid(self) -> bool:
         """Returns whether the data is valid and should be plotted."""
-        return self.valid and len(self.times) > 0 and len(self.freq) > 0 and len(self.ampl) > 0
+        return (
+            self.valid
+            and len(self.times) > 0
+            and len(self.freq) > 0
+            and len(self.values) > 0
+        )
 
     def invalidate(self):
         """
@@ -76,11 +163,7 @@ class TFOutputData:
         self.valid = False
         self.times = None
         self.values = None
-        self.ampl = None
         self.freq = None
-        self.powers = None
-        self.avg_ampl = None
-        self.avg_pow = None
         self.filtered_signal = None
         self.re_transform = None  # TODO: remove???
         self.ridge_data = {}
@@ -116,4 +199,29 @@ class TFOutputData:
         """
         Creates an instance of this class with only empty lists as data.
         """
-        return TFOutputData(*[[] for _ in range(7)])
+        return TFOutputData(*[[] for _ in range(3)])
+
+
+def _elementwise(func, arr: ndarray, out: ndarray = None) -> ndarray:
+    """
+    Applies an element-wise function to a 2D array. If the array is memory-mapped (e.g. a
+    transform which was too large to calculate in memory), it is read in blocks of columns.
+
+    :param func: the element-wise function
+    :param arr: the array
+    :param out: the array to write the result to, e.g. a memory-mapped array if the result
+    should not be kept in memory; by default, the result is an in-memory array
+    :return: the result
+    """
+    if np.ndim(arr) != 2 or (out is None and not isinstance(arr, np.memmap)):
+        return func(arr)
+
+    rows, cols = arr.shape
+    if out is None:
+        out = np.empty(arr.shape, func(arr[:1, :1]).dtype)
+
+    step = max(1, (1 << 22) // max(1, rows))
+    for start in range(0, cols, step):
+        out[:, start : start + step] = func(arr[:, start : start + step])
+
+    return out
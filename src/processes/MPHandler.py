@@ -13,10 +13,12 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import copy
 import functools
 from typing import Callable, List, Tuple, Union, Optional, Dict
 
 import multiprocess as mp
+import numpy as np
 import pymodalib
 from numpy import ndarray
 from scheduler.Scheduler import Scheduler
@@ -27,12 +29,26 @@ from maths.algorithms.multiprocessing.bayesian_inference import (
     _dynamic_bayesian_inference,
 )
 from maths.algorithms.multiprocessing.bispectrum_analysis import (
-    _bispectrum_analysis,
-    _biphase,
+    _biphases,
+    _bispectra,
+    _bispectrum_output,
+    _surrogate_bispectra,
+    bispectrum_combinations,
+    is_unique_pair,
+)
+from maths.algorithms.multiprocessing.phase_coherence import (
+    _phase_coherence,
+    _surrogate_phase_coherence,
+)
+from maths.algorithms.multiprocessing.ridge_extraction import (
+    _ridge_extraction,
+    _matlab_ridge_extraction,
+    _ridge_options,
+    _direct_constants,
 )
-from maths.algorithms.multiprocessing.phase_coherence import _phase_coherence
-from maths.algorithms.multiprocessing.ridge_extraction import _ridge_extraction
 from maths.algorithms.multiprocessing.time_frequency import _time_frequency
+from maths.algorithms.running_stats import RunningStats
+from maths.algorithms.surrogates import surrogate_chunks, spawn_seeds
 from maths.params.BAParams import BAParams
 from maths.params.DHParams import DHParams
 from maths.params.PCParams import PCParams
@@ -41,6 +57,9 @@ from maths.params.TFParams import TFParams, _fmin, _fmax
 from maths.signals.SignalPairs import SignalPairs
 from maths.signals.Signals import Signals
 from maths.signals.TimeSeries import TimeSeries
+from processes import WorkerPool, shared_arrays
+from processes.shared_arrays import resolve_all
+from utils import args as _args
 from utils.os_utils import OS
 
 
@@ -54,6 +73,9 @@ class MPHandler:
       being garbage collected before tasks have completed.
     - Calling any function on a running MPHandler will stop any tasks
       currently in progress.
+    - If `use_pool` is True, tasks run on a shared `WorkerPool` whose processes
+      stay alive between calculations; otherwise, a new `Scheduler` is created
+      for each calculation.
     """
 
     # On Linux, we don't need to run in a thread because processes can be forked; we also need to avoid
@@ -63,21 +85,76 @@ class MPHandler:
     # On macOS, multiprocess has issues so we need to use threads for everything.
     only_threads = OS.is_mac_os()
 
-    def __init__(self):
+    def __init__(self, use_pool: bool = None):
+        """
+        :param use_pool: whether to use the persistent worker pool; if None, the
+        value of the '--worker-pool' argument is used
+        """
         self.scheduler: Scheduler = None
 
-    async def coro_transform(
-        self, params: TFParams, on_progress: Callable[[int, int], None]
+        if use_pool is None:
+            use_pool = _args.worker_pool()
+
+        # The pool cannot be used when everything must run in threads.
+        self.use_pool: bool = bool(use_pool) and not self.only_threads
+        self.pool_batch: Optional[int] = None
+
+    async def _map(
+        self,
+        target: Callable,
+        args: List[Tuple],
+        on_progress: Callable[[int, int], None],
+        subtasks: int = 0,
     ) -> List[Tuple]:
         """
-        Performs a wavelet transform or windowed Fourier transform of signals.
-        Used in "time-frequency analysis".
+        Runs a function once for each item in `args`, using the worker pool if
+        enabled or a new Scheduler otherwise.
 
-        :param params: the parameters which are used in the algorithm
+        :param target: the function to run in a separate process
+        :param args: list containing the arguments for each task as a tuple
         :param on_progress: progress callback
+        :param subtasks: the number of subtasks per task
         :return: list containing the output from each process
         """
         self.stop()
+
+        # Files shared by the tasks are deleted when their results are opened; if the
+        # results will not be used, the files are deleted here.
+        batch = shared_arrays.new_batch()
+        target = shared_arrays.in_batch(batch, target)
+
+        try:
+            result = await self._map_batch(target, args, on_progress, subtasks)
+        except BaseException:
+            shared_arrays.remove_batch(batch)
+            raise
+
+        # The result is empty if the tasks were cancelled.
+        if not result:
+            shared_arrays.remove_batch(batch)
+
+        return result
+
+    async def _map_batch(
+        self,
+        target: Callable,
+        args: List[Tuple],
+        on_progress: Callable[[int, int], None],
+        subtasks: int,
+    ) -> List[Tuple]:
+        if self.use_pool:
+
+            def on_submitted(batch: int) -> None:
+                self.pool_batch = batch
+
+            return await WorkerPool.get_pool().map(
+                target,
+                args,
+                subtasks=subtasks,
+                progress_callback=on_progress,
+                on_submitted=on_submitted,
+            )
+
         self.scheduler = Scheduler(
             progress_callback=on_progress,
             raise_exceptions=True,
@@ -85,16 +162,46 @@ class MPHandler:
             only_threads=self.only_threads,
         )
 
+        return await self.scheduler.map(
+            target=target,
+            args=args,
+            subtasks=subtasks,
+            process_type=mp.Process,
+            queue_type=mp.Queue,
+        )
+
+    def _process_count(self) -> int:
+        """
+        Returns the number of tasks which `_map` can run at the same time.
+        """
+        if self.use_pool:
+            return WorkerPool.get_pool().process_count
+
+        return Scheduler.optimal_process_count()
+
+    async def coro_transform(
+        self, params: TFParams, on_progress: Callable[[int, int], None]
+    ) -> List[Tuple]:
+        """
+        Performs a wavelet transform or windowed Fourier transform of signals.
+        Used in "time-frequency analysis".
+
+        :param params: the parameters which are used in the algorithm
+        :param on_progress: progress callback
+        :return: list containing the output from each process
+        """
         signals: Signals = params.signals
-        params.remove_signals()  # Don't want to pass large unneeded object to other process.
+        params.remove_signals()
 
-        return await self.scheduler.map(
+        results = await self._map(
             target=_time_frequency,
             args=[(time_series, params, True) for time_series in signals],
-            process_type=mp.Process,
-            queue_type=mp.Queue,
+            on_progress=on_progress,
         )
 
+        # The transform arrays are memory-mapped rather than copied from the worker processes.
+        return [resolve_all(r) for r in results]
+
     async def coro_harmonics(
         self,
         signals: Signals,
@@ -142,59 +249,156 @@ class MPHandler:
         :param on_progress: progress callback
         :return: list containing the output from each process
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
-        )
+        pairs = signals.get_pairs()
+        surr_count = params.surr_count
+        total = len(pairs) * (1 + surr_count)
 
-        return await self.scheduler.map(
+        results = await self._map(
             target=_phase_coherence,
-            args=[(pair, params) for pair in signals.get_pairs()],
-            subtasks=params.surr_count,
-            process_type=mp.Process,
-            queue_type=mp.Queue,
+            args=[(pair, params) for pair in pairs],
+            on_progress=lambda done, _: on_progress(done, total),
         )
+        if not results or surr_count == 0:
+            return [(*r, [], None) for r in results]
+
+        # Surrogates are split into ranges of chunks, which run as separate tasks so that all
+        # pairs share the same workers. Each task returns running statistics rather than every
+        # surrogate's coherence. The transform and signal are exported once per pair, instead
+        # of being pickled for every task.
+        chunks = surrogate_chunks(surr_count, self._process_count())
+        seeds = spawn_seeds(params.surr_seed, len(pairs))
+
+        exported = []
+        args = []
+        try:
+            for (s1, _), seed in zip(pairs, seeds):
+                wt = shared_arrays.export(s1.output_data.values)
+                sig = shared_arrays.export(s1.signal)
+                exported.extend([wt, sig])
+
+                args.extend([(wt, sig, params, seed, c) for c in chunks])
+
+            surrogates = await self._map(
+                target=_surrogate_phase_coherence,
+                args=args,
+                on_progress=lambda done, _: on_progress(
+                    len(pairs) + done * surr_count // len(chunks), total
+                ),
+            )
+        finally:
+            for e in exported:
+                shared_arrays.remove(e)
+
+        if not surrogates:
+            return []
+
+        out = []
+        for i, (pair, tpc, pc, pdiff) in enumerate(results):
+            stats = RunningStats()
+            for s in surrogates[i * len(chunks) : (i + 1) * len(chunks)]:
+                stats.merge(s)
+
+            threshold = None
+            if params.surr_percentile is not None:
+                threshold = stats.percentile(params.surr_percentile)
+
+            out.append((pair, tpc, pc, pdiff, stats.mean(), threshold))
+
+        return out
 
     async def coro_ridge_extraction(
-        self, params: REParams, on_progress: Callable[[int, int], None]
+        self,
+        params: REParams,
+        on_progress: Callable[[int, int], None],
+        transform_params: TFParams = None,
     ) -> List[Tuple]:
         """
         Performs ridge extraction on wavelet transforms. Used in "ridge extraction and filtering".
 
+        The transform of each signal, which was already calculated by the time-frequency
+        analysis, is exported once and shared by the tasks for all its intervals. Each
+        task reads only the rows inside its interval.
+
+        If the transforms were calculated with different parameters, their window or wavelet
+        is not implemented in Python, or the options of the ridge extraction are only
+        supported by MATLAB, the MATLAB-packaged library calculates a wavelet transform for
+        each signal and interval, and extracts the ridges from it.
+
         :param params: the parameters which are used in the algorithm
         :param on_progress: progress callback
+        :param transform_params: the parameters which were used to calculate the transforms
         :return: list containing the output from each process
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
-        )
-
         signals = params.signals
-        num_transforms = len(signals)
         intervals = params.intervals
+        params.remove_signals()  # Don't want to pass large unneeded object to other process.
 
-        for i in range(num_transforms):
-            for j in range(len(intervals)):
-                fmin, fmax = intervals[j]
+        norm = _direct_constants(params, transform_params)
+        if norm is None:
+            print(
+                "The transforms cannot be used for ridge extraction in Python; "
+                "using the MATLAB-packaged library."
+            )
+            return await self._matlab_ridge_extraction(signals, params, on_progress)
+
+        # Options which are not implemented in Python are left to the MATLAB-packaged library.
+        try:
+            _ridge_options(params)
+        except ValueError as e:
+            print(f"{e} Using the MATLAB-packaged library.")
+            return await self._matlab_ridge_extraction(signals, params, on_progress)
+
+        exported = []
+        args = []
+        try:
+            for s in signals:
+                data = s.output_data
+
+                # Signals which have not been transformed have no ridges.
+                if not data.is_valid():
+                    continue
+
+                freq = np.asarray(data.freq, dtype=np.float64).flatten()
+
+                transform = shared_arrays.export(data.values)
+                exported.append(transform)
+
+                args.extend(
+                    [
+                        (s.name, transform, freq, tuple(i), params, norm)
+                        for i in intervals
+                    ]
+                )
 
-                params.set_item(_fmin, fmin)
-                params.set_item(_fmax, fmax)
+            return await self._map(
+                target=_ridge_extraction, args=args, on_progress=on_progress
+            )
+        finally:
+            for e in exported:
+                shared_arrays.remove(e)
 
-                self.scheduler.add(
-                    target=_ridge_extraction,
-                    args=(signals[i], params),
-                    process_type=mp.Process,
-                    queue_type=mp.Queue,
-                )
+    async def _matlab_ridge_extraction(
+        self,
+        signals: Signals,
+        params: REParams,
+        on_progress: Callable[[int, int], None],
+    ) -> List[Tuple]:
+        """
+        Performs ridge extraction with the MATLAB-packaged library, which calculates a new
+        wavelet transform for each signal and interval.
+        """
+        args = []
+        for s in signals:
+            for fmin, fmax in params.intervals:
+                p = copy.deepcopy(params)
+                p.set_item(_fmin, fmin)
+                p.set_item(_fmax, fmax)
 
-        return await self.scheduler.run()
+                args.append((s, p))
+
+        return await self._map(
+            target=_matlab_ridge_extraction, args=args, on_progress=on_progress
+        )
 
     async def coro_bandpass_filter(
         self,
@@ -210,26 +414,16 @@ class MPHandler:
         :param on_progress: progress callback
         :return: list containing the output from each process
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
-        )
-
+        args = []
         for s in signals:
             fs = s.frequency
             for i in range(len(intervals)):
                 fmin, fmax = intervals[i]
-                self.scheduler.add(
-                    target=_bandpass_filter,
-                    args=(s, fmin, fmax, fs),
-                    process_type=mp.Process,
-                    queue_type=mp.Queue,
-                )
+                args.append((s, fmin, fmax, fs))
 
-        return await self.scheduler.run()
+        return await self._map(
+            target=_bandpass_filter, args=args, on_progress=on_progress
+        )
 
     async def coro_bayesian(
         self,
@@ -245,25 +439,11 @@ class MPHandler:
         :param on_progress: progress callback
         :return: list containing the output from each process
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
+        args = [(*pair, params) for params in paramsets for pair in signals.get_pairs()]
+        return await self._map(
+            target=_dynamic_bayesian_inference, args=args, on_progress=on_progress
         )
 
-        for params in paramsets:
-            for pair in signals.get_pairs():
-                self.scheduler.add(
-                    target=_dynamic_bayesian_inference,
-                    args=(*pair, params),
-                    process_type=mp.Process,
-                    queue_type=mp.Queue,
-                )
-
-        return await self.scheduler.run()
-
     async def coro_bispectrum_analysis(
         self,
         signals: SignalPairs,
@@ -279,54 +459,105 @@ class MPHandler:
         :param on_progress: progress callback
         :return: list containing the output from each process
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
+        pairs = signals.get_pairs()
+        ns = params.surr_count or 0
+
+        # All bispectra of a pair are calculated by the same task. The Python implementation
+        # reuses the wavelet transforms of each signal; the MATLAB Runtime can hang when the
+        # bispectra of a pair are calculated in parallel processes, so they run serially.
+        combinations = []
+        tasks = []
+        for s1, s2 in pairs:
+            c = bispectrum_combinations
+            if not is_unique_pair(s1.signal, s2.signal):
+                c = c[:1]
+
+            combinations.append(c)
+            tasks.append((s1.signal, s2.signal, params, c))
+
+        surrogate_count = sum(len(c) * ns for c in combinations)
+        total = len(tasks) + surrogate_count
+
+        results = await self._map(
+            target=_bispectra,
+            args=tasks,
+            on_progress=lambda done, _: on_progress(done, total),
         )
+        if not results:
+            return []
+
+        bispectra = [b for r in results for b in r]
+
+        # The surrogates of each pair are split into ranges of chunks, which run as separate
+        # tasks. With the MATLAB implementation, the surrogates of a pair run serially.
+        surrogates = []
+        chunks = []
+        if ns > 0:
+            parts = self._process_count() if params.implementation == "python" else 1
+            chunks = surrogate_chunks(ns, parts)
+            seeds = spawn_seeds(params.surr_seed, len(pairs))
+
+            surrogates = await self._map(
+                target=_surrogate_bispectra,
+                args=[
+                    (s1.signal, s2.signal, params, seed, c)
+                    for (s1, s2), seed in zip(pairs, seeds)
+                    for c in chunks
+                ],
+                on_progress=lambda done, _: on_progress(
+                    len(tasks) + done * surrogate_count // (len(pairs) * len(chunks)),
+                    total,
+                ),
+            )
+            if not surrogates:
+                return []
+
+        out = []
+        for i, ((s1, _), c) in enumerate(zip(pairs, combinations)):
+            start = sum(len(x) for x in combinations[:i])
+
+            out.append(
+                _bispectrum_output(
+                    s1.name,
+                    params,
+                    bispectra[start : start + len(c)],
+                    surrogates[i * len(chunks) : (i + 1) * len(chunks)],
+                )
+            )
 
-        return await self.scheduler.map(
-            target=_bispectrum_analysis,
-            args=[(*pair, params) for pair in signals.get_pairs()],
-            subtasks=4,
-            process_type=mp.Process,
-            queue_type=mp.Queue,
-        )
+        return out
 
     async def coro_biphase(
         self,
         signals: SignalPairs,
-        fs: float,
-        f0: float,
-        fr: Tuple[float, float],
+        params: BAParams,
+        points: List[Tuple[float, float]],
         on_progress: Callable[[int, int], None],
     ) -> List[Tuple]:
         """
-        Calculates biphase and biamplitude. Used in "wavelet bispectrum analysis".
+        Calculates biphase and biamplitude at several pairs of frequencies.
+        Used in "wavelet bispectrum analysis".
 
         :param signals: the signal pairs
-        :param fs: the sampling frequency
-        :param f0: the resolution
-        :param fr: 'x' and 'y' frequencies
+        :param params: the params which were used to calculate the bispectra
+        :param points: the 'x' and 'y' frequencies of each point
         :param on_progress: progress callback
-        :return: list containing the output from each process
+        :return: list containing the output for each point of each signal pair
         """
-        self.stop()
-        self.scheduler = Scheduler(
-            progress_callback=on_progress,
-            raise_exceptions=True,
-            capture_stdout=True,
-            only_threads=self.only_threads,
-        )
-
+        pairs = signals.get_pairs()
         args = [
-            (s1, s2, fs, f0, fr, s1.output_data.opt) for s1, s2 in signals.get_pairs()
+            (s1.signal, s2.signal, params, points, s1.output_data.opt)
+            for s1, s2 in pairs
+        ]
+
+        results = await self._map(target=_biphases, args=args, on_progress=on_progress)
+
+        # All points of a signal pair are calculated by the same task.
+        return [
+            (s1.name, *point)
+            for (s1, _), result in zip(pairs, results)
+            for point in result
         ]
-        return await self.scheduler.map(
-            target=_biphase, args=args, process_type=mp.Process, queue_type=mp.Queue
-        )
 
     async def coro_group_coherence(
         self,
@@ -544,10 +775,28 @@ class MPHandler:
     def stop(self):
         """
         Stops the tasks in progress. The MPHandler instance can be reused.
+
+        When the worker pool is in use, only this handler's tasks are cancelled;
+        the pool's processes stay alive.
         """
         if self.scheduler:
             self.scheduler.terminate()
 
+        if self.pool_batch is not None:
+            WorkerPool.get_pool().cancel(self.pool_batch)
+            self.pool_batch = None
+
+    @staticmethod
+    def pool_stats() -> Optional[WorkerPool.PoolStats]:
+        """
+        Returns statistics about the shared worker pool, or None if it has not been created.
+        """
+        pool = WorkerPool._pool
+        if pool is None or pool.closed:
+            return None
+
+        return pool.stats()
+
 
 def harmonic_wrapper(preprocess, signal, params, *args, **kwargs):
     if preprocess:
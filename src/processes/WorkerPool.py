@@ -0,0 +1,487 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import logging
+import sys
+import time
+import traceback
+from collections import deque
+from typing import Callable, Iterable, List, Tuple, Any, Dict, Optional, Deque
+
+import multiprocess as mp
+from dataclasses import dataclass
+from scheduler.Scheduler import Scheduler
+from scheduler.utils import StdOut, TaskFailedException
+
+from maths.algorithms.matlabwrappers import packages
+from processes.mp_utils import setup_matlab_runtime
+
+"""
+A long-lived pool of worker processes which can be shared by `MPHandler` instances.
+
+Unlike `Scheduler`, which creates a new process for every task, the workers in a
+`WorkerPool` stay alive between calculations. Modules imported by a task (e.g. PyMODAlib,
+scipy or MATLAB-packaged libraries) therefore remain loaded for subsequent tasks.
+
+Each worker communicates with the main process through its own pipe, and is sent one task
+at a time by the main process. The main process therefore always knows which task each
+worker is executing, and terminating a worker cannot affect the communication with any
+other worker.
+"""
+
+# Message types sent from a worker to the main process.
+_finished = "finished"
+_failed = "failed"
+_stdout = "stdout"
+
+
+@dataclass
+class PoolStats:
+    """
+    Data class containing statistics about a `WorkerPool`.
+    """
+
+    # Number of worker processes, and how many are currently executing a task.
+    workers: int
+    busy_workers: int
+
+    # Number of tasks waiting to be started by a worker.
+    pending_tasks: int
+
+    # Totals since the pool was created.
+    submitted: int
+    completed: int
+    failed: int
+    cancelled: int
+
+    # Number of workers which were replaced after being terminated mid-task.
+    respawned: int
+
+    # Total time, in seconds, that workers have spent executing tasks.
+    busy_time: float
+
+
+class _Batch:
+    """
+    The state of the tasks submitted by a single call to `WorkerPool.map()`.
+    """
+
+    def __init__(self, batch_id: int, task_ids: List[int]):
+        self.id = batch_id
+        self.task_ids = task_ids
+        self.output: Dict[int, Any] = {}
+        self.exception: Optional[Exception] = None
+        self.cancelled = False
+
+    def finished(self) -> bool:
+        return len(self.output) == len(self.task_ids)
+
+
+class _Worker:
+    """
+    A worker process, the main process' end of its pipe, and the task it is executing.
+    """
+
+    def __init__(self):
+        self.conn, child_conn = mp.Pipe()
+        self.process = mp.Process(target=_worker, args=(child_conn,))
+        self.process.start()
+
+        # The worker's end of the pipe must be closed in the main process, so that
+        # reading from the pipe fails if the worker exits.
+        child_conn.close()
+
+        # The (batch id, task id) of the task being executed, if any.
+        self.task: Optional[Tuple[int, int]] = None
+        self.start_time = 0.0
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.join(timeout=1)
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    A pool of persistent worker processes.
+
+    Tasks are submitted with `map()`, which is a coroutine with the same semantics as
+    `Scheduler.map()`: it returns an ordered list containing the output of each task, or an
+    empty list if the tasks were cancelled.
+
+    Each call to `map()` creates a batch of tasks. Calling `cancel()` with the batch id discards
+    the batch's pending tasks and terminates only the workers which are busy with one of its tasks;
+    these workers are replaced immediately, so the pool remains usable by other batches.
+    """
+
+    def __init__(self, processes: int = None, update_interval: float = 0.05):
+        """
+        :param processes: the number of worker processes; defaults to `Scheduler.optimal_process_count()`
+        :param update_interval: the time between consecutive checks for results, in seconds
+        """
+        self.process_count: int = processes or Scheduler.optimal_process_count()
+        self.update_interval = update_interval
+
+        # Tasks which have not been sent to a worker, as (batch id, task id, target, args).
+        self.pending: Deque[Tuple[int, int, Callable, tuple]] = deque()
+
+        self.workers: List[_Worker] = []
+        self.batches: Dict[int, _Batch] = {}
+
+        self.next_batch_id = 0
+        self.next_task_id = 0
+        self.closed = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.respawned = 0
+        self.busy_time = 0.0
+
+        for _ in range(self.process_count):
+            self.workers.append(_Worker())
+
+    def submit(self, target: Callable, args: Iterable = ()) -> int:
+        """
+        Submits a batch of tasks without waiting for the result. Each item of `args` will be
+        used as the arguments for a single task.
+
+        :param target: the function to run in a worker process
+        :param args: an iterable of tuples, each containing the arguments for a single task
+        :return: the id of the batch, which can be passed to `cancel()`
+        """
+        if self.closed:
+            raise RuntimeError(
+                "Tasks cannot be submitted to a WorkerPool which has been shut down."
+            )
+
+        batch_id = self.next_batch_id
+        self.next_batch_id += 1
+
+        task_ids = []
+        for _args in args:
+            task_id = self.next_task_id
+            self.next_task_id += 1
+
+            self.pending.append((batch_id, task_id, target, tuple(_args)))
+            task_ids.append(task_id)
+
+        self.submitted += len(task_ids)
+        self.batches[batch_id] = _Batch(batch_id, task_ids)
+
+        self._dispatch()
+        return batch_id
+
+    async def map(
+        self,
+        target: Callable,
+        args: Iterable = (),
+        subtasks: int = 0,
+        progress_callback: Callable[[int, int], None] = None,
+        on_submitted: Callable[[int], None] = None,
+    ) -> List[Any]:
+        """
+        Maps arguments over a single function, running each item of `args` as a task on the pool.
+
+        :param target: the function to run in a worker process
+        :param args: an iterable of tuples, each containing the arguments for a single task
+        :param subtasks: the number of subtasks per task, used only when reporting progress
+        :param progress_callback: a function taking the number of finished tasks and the total number of tasks
+        :param on_submitted: a function which is passed the batch id once the tasks have been submitted
+        :return: an ordered list containing the output of each task, or an empty list if cancelled
+        """
+        batch_id = self.submit(target, args)
+        batch = self.batches[batch_id]
+
+        if on_submitted:
+            on_submitted(batch_id)
+
+        total = len(batch.task_ids) * (1 + subtasks)
+        reported = -1
+
+        try:
+            while not batch.finished():
+                if batch.cancelled:
+                    return []
+
+                if batch.exception:
+                    raise batch.exception
+
+                done = len(batch.output)
+                if progress_callback and done != reported:
+                    reported = done
+                    progress_callback(done * (1 + subtasks), total)
+
+                await asyncio.sleep(self.update_interval)
+                self._update()
+
+            if progress_callback:
+                progress_callback(total, total)
+
+            return [batch.output[i] for i in batch.task_ids]
+        finally:
+            self.batches.pop(batch_id, None)
+
+    def cancel(self, batch_id: int) -> None:
+        """
+        Cancels the pending and in-flight tasks of a batch. Pending tasks are discarded, and workers
+        which are executing one of the batch's tasks are terminated and replaced by new workers.
+        """
+        batch = self.batches.get(batch_id)
+        if batch is None or batch.cancelled or batch.exception:
+            return
+
+        batch.cancelled = True
+        self.cancelled += self._discard(batch_id)
+
+    def stats(self) -> PoolStats:
+        """
+        Returns statistics about the pool.
+        """
+        return PoolStats(
+            workers=len([w for w in self.workers if w.process.is_alive()]),
+            busy_workers=len([w for w in self.workers if w.task]),
+            pending_tasks=len(self.pending),
+            submitted=self.submitted,
+            completed=self.completed,
+            failed=self.failed,
+            cancelled=self.cancelled,
+            respawned=self.respawned,
+            busy_time=self.busy_time,
+        )
+
+    def shutdown(self) -> None:
+        """
+        Stops all worker processes. The pool cannot be used afterwards.
+        """
+        if self.closed:
+            return
+
+        self.closed = True
+        for batch_id in list(self.batches.keys()):
+            self.cancel(batch_id)
+
+        for worker in self.workers:
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+
+        for worker in self.workers:
+            worker.process.join(timeout=1)
+            worker.stop()
+
+        self.workers = []
+
+    def _discard(self, batch_id: int) -> int:
+        """
+        Removes the pending tasks of a batch, and replaces the workers which are executing
+        one of its tasks.
+
+        :return: the number of tasks which were discarded
+        """
+        count = len(self.pending)
+        self.pending = deque(item for item in self.pending if item[0] != batch_id)
+        count -= len(self.pending)
+
+        for worker in list(self.workers):
+            if worker.task and worker.task[0] == batch_id:
+                self._finish_task(worker)
+                self._replace_worker(worker)
+                count += 1
+
+        self._dispatch()
+        return count
+
+    def _dispatch(self) -> None:
+        """
+        Sends pending tasks to the idle workers.
+        """
+        for worker in list(self.workers):
+            if not self.pending:
+                break
+
+            if worker.task:
+                continue
+
+            batch_id, task_id, target, args = self.pending.popleft()
+            try:
+                worker.conn.send((task_id, target, args))
+            except OSError:
+                # The worker has exited; the task will be sent to its replacement.
+                self.pending.appendleft((batch_id, task_id, target, args))
+                self._replace_worker(worker)
+                continue
+
+            worker.task = (batch_id, task_id)
+            worker.start_time = time.time()
+
+    def _update(self) -> None:
+        """
+        Reads all available messages from the workers, and passes results to their batches.
+        """
+        for worker in list(self.workers):
+            # The worker may have been replaced while reading from another worker.
+            if worker not in self.workers:
+                continue
+
+            try:
+                while worker.conn.poll():
+                    self._on_message(worker, *worker.conn.recv())
+            except (EOFError, OSError):
+                self._on_worker_exited(worker)
+
+        self._dispatch()
+
+    def _on_message(self, worker: _Worker, msg_type: str, task_id: int, data) -> None:
+        if msg_type == _stdout:
+            sys.stdout.write(data)
+            return
+
+        batch_id, _ = self._finish_task(worker)
+        batch = self.batches.get(batch_id)
+
+        # Ignore results of batches which are no longer running.
+        if batch is None or batch.cancelled or batch.exception:
+            return
+
+        if msg_type == _finished:
+            self.completed += 1
+            batch.output[task_id] = data
+
+        elif msg_type == _failed:
+            self._fail(batch, TaskFailedException(data))
+
+    def _on_worker_exited(self, worker: _Worker) -> None:
+        """
+        Called when a worker has exited unexpectedly, e.g. because it was killed by the OS.
+        """
+        task = worker.task
+        self._finish_task(worker)
+        self._replace_worker(worker)
+
+        batch = self.batches.get(task[0]) if task else None
+        if batch and not batch.cancelled and not batch.exception:
+            self._fail(
+                batch,
+                TaskFailedException(
+                    f"The worker process exited with code {worker.process.exitcode}."
+                ),
+            )
+
+    def _fail(self, batch: _Batch, exception: Exception) -> None:
+        """
+        Marks a batch as failed, and discards its remaining tasks, as `Scheduler` does when
+        `raise_exceptions` is True. The failed task is counted only as failed.
+        """
+        logging.error(exception)
+
+        self.failed += 1
+        batch.exception = exception
+        self.cancelled += self._discard(batch.id)
+
+    def _finish_task(self, worker: _Worker) -> Tuple[int, int]:
+        """
+        Marks a worker as idle, and returns the (batch id, task id) of its task.
+        """
+        task, worker.task = worker.task, None
+        if task:
+            self.busy_time += time.time() - worker.start_time
+
+        return task or (None, None)
+
+    def _replace_worker(self, worker: _Worker) -> None:
+        worker.stop()
+
+        self.workers.remove(worker)
+        self.respawned += 1
+        self.workers.append(_Worker())
+
+
+class _PipeOutput:
+    """
+    Sends text written by a worker to the main process. Used as the queue of a `StdOut`.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def put(self, text: str) -> None:
+        self.conn.send((_stdout, None, text))
+
+
+def _worker(conn) -> None:
+    """
+    The function executed by each worker process. Runs the tasks received through the pipe
+    until `None` is received or the pipe is closed.
+    """
+    setup_matlab_runtime()
+
+    stdout = StdOut(_PipeOutput(conn))
+    sys.stdout = stdout
+    sys.stderr = stdout
+
+    while True:
+        try:
+            item = conn.recv()
+        except EOFError:
+            break
+
+        if item is None:
+            break
+
+        task_id, target, args = item
+
+        try:
+            result = target(*args)
+            msg = (_finished, task_id, result)
+        except Exception as e:
+            msg = (_failed, task_id, _format_exception(e))
+
+        stdout.update(force=True)
+
+        try:
+            conn.send(msg)
+        except OSError:
+            break
+        except Exception as e:
+            # The result could not be pickled; the message is pickled before anything is sent.
+            conn.send((_failed, task_id, _format_exception(e)))
+
+    # Worker processes exit without running `atexit` handlers.
+    packages.terminate_all()
+
+
+def _format_exception(e: Exception) -> str:
+    return f"{type(e)}\n" + "".join(traceback.format_tb(e.__traceback__)) + f"\n{e}"
+
+
+_pool: Optional[WorkerPool] = None
+
+
+def get_pool() -> WorkerPool:
+    """
+    Returns the shared `WorkerPool`, creating it if necessary.
+    """
+    global _pool
+    if _pool is None or _pool.closed:
+        import atexit
+
+        _pool = WorkerPool()
+        atexit.register(_pool.shutdown)
+
+    return _pool
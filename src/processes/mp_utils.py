@@ -19,6 +19,7 @@ import traceback
 from timeit import default_timer as timer
 from typing import Optional
 
+from maths.algorithms.matlabwrappers import packages
 from utils import log_utils
 from utils.args import matlab_runtime
 from utils.os_utils import OS
@@ -39,9 +40,21 @@ def process(func):
         # TODO: remove, since PyMODAlib handles it?
         setup_matlab_runtime()
 
+        init_start = packages.total_init_time()
         start = timer()
         result = func(*args, **kwargs)
-        print(f"Time taken to calculate result: {timer() - start:.1f} seconds.")
+
+        # Initialising MATLAB-packaged libraries only happens once per process, so it is
+        # reported separately from the calculation.
+        elapsed = timer() - start
+        init = packages.total_init_time() - init_start
+        if init > 0:
+            print(
+                f"Time taken to calculate result: {max(elapsed - init, 0):.1f} seconds "
+                f"(plus {init:.1f} seconds to initialise MATLAB packages)."
+            )
+        else:
+            print(f"Time taken to calculate result: {elapsed:.1f} seconds.")
 
         return result
 
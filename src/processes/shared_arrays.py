@@ -0,0 +1,388 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import atexit
+import functools
+import os
+import tempfile
+from collections import OrderedDict
+from typing import Any, Callable, List, Tuple, Union
+
+import multiprocess as mp
+import numpy as np
+import psutil
+from dataclasses import dataclass
+from numpy import ndarray
+
+"""
+Contains functions which allow large arrays to be returned from a process without
+pickling them.
+
+Instead of sending an array through a `Queue`, a worker process writes it to a
+memory-mapped temporary file and returns a small `SharedArray` descriptor. The main
+process then maps the same file, so the array data is never copied through a pipe.
+
+Memory-mapped files are used rather than `multiprocessing.shared_memory`, which is
+not available before Python 3.8.
+
+The name of each file contains the batch of tasks which created it (see `new_batch()`),
+which starts with the id of the main process. The files of a batch whose results are
+not used - because it was cancelled or failed - are deleted with `remove_batch()`, and
+files left by processes which are no longer running are deleted by `sweep()`.
+"""
+
+# Arrays smaller than this (in bytes) are cheaper to pickle than to share.
+min_shared_bytes = 1024 * 1024
+
+# Number of exported arrays which each process keeps mapped by `open_exported()`.
+max_opened_exports = 4
+
+# Exported arrays which are mapped in this process, by path.
+_opened_exports: "OrderedDict[str, np.memmap]" = OrderedDict()
+
+# The batch of tasks which the current process is running, as set by `in_batch()`.
+_batch = ""
+
+# Number of batches created by `new_batch()` in this process.
+_batch_count = 0
+
+# Files which could not be deleted when they were opened (e.g. on Windows, where
+# a file cannot be deleted while it is mapped).
+_undeleted_files: List[str] = []
+
+
+@dataclass(frozen=True)
+class SharedArray:
+    """
+    A picklable descriptor for an array which has been written to a memory-mapped file.
+    """
+
+    path: str
+    dtype: str
+    shape: Tuple[int, ...]
+
+    # The position of the array in the file, in bytes.
+    offset: int = 0
+
+    # Whether the file is temporary. Files which are not temporary (e.g. cache entries)
+    # are mapped in copy-on-write mode and are not deleted.
+    temporary: bool = True
+
+    def open(self) -> np.memmap:
+        """
+        Maps the array into the current process. Temporary files are deleted as soon as
+        possible, so each descriptor should only be opened once.
+        """
+        if not self.temporary:
+            return np.memmap(
+                self.path,
+                dtype=self.dtype,
+                mode="c",
+                shape=self.shape,
+                offset=self.offset,
+            )
+
+        arr = np.memmap(self.path, dtype=self.dtype, mode="r+", shape=self.shape)
+
+        # On Unix-like systems, the mapping stays valid after the file is unlinked.
+        _delete(self.path)
+
+        return arr
+
+
+def _shared_dir() -> str:
+    path = os.path.join(tempfile.gettempdir(), "pymoda-shared")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _new_file(kind: str) -> str:
+    """
+    Creates a new, empty file in the shared directory, whose name contains the current batch.
+
+    :param kind: the first part of the file name
+    :return: the path to the file
+    """
+    batch = _batch or new_batch()
+    fd, path = tempfile.mkstemp(
+        suffix=".dat", prefix=f"{kind}-{batch}-", dir=_shared_dir()
+    )
+    os.close(fd)
+    return path
+
+
+def _delete(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError:
+        _undeleted_files.append(path)
+
+
+def new_batch() -> str:
+    """
+    Returns a unique name for a batch of tasks, which starts with the id of the current process.
+    """
+    global _batch_count
+    _batch_count += 1
+    return f"{os.getpid()}.{_batch_count}"
+
+
+def in_batch(batch: str, target: Callable) -> Callable:
+    """
+    Wraps a task so that the files created by `share()`, `create()` and `export()` while it
+    runs belong to a batch, and can be deleted by `remove_batch()`.
+
+    :param batch: the name of the batch, returned by `new_batch()`
+    :param target: the function which runs the task
+    :return: a picklable function which can be run in a worker process instead of `target`
+    """
+    return functools.partial(_run_in_batch, batch, target)
+
+
+def _run_in_batch(batch: str, target: Callable, *args: Any) -> Any:
+    global _batch
+    _batch = batch
+    try:
+        return target(*args)
+    finally:
+        _batch = ""
+
+
+def remove_batch(batch: str) -> None:
+    """
+    Deletes the files of a batch which have not been deleted, e.g. because the batch was
+    cancelled or failed before its results were opened.
+    """
+    directory = _shared_dir()
+    prefixes = tuple(f"{kind}-{batch}-" for kind in ("array", "export"))
+
+    for name in os.listdir(directory):
+        if name.startswith(prefixes):
+            _opened_exports.pop(os.path.join(directory, name), None)
+            _delete(os.path.join(directory, name))
+
+
+def sweep() -> None:
+    """
+    Deletes the files in the shared directory which were created by processes that are no
+    longer running, e.g. because PyMODA crashed or was killed. Should be called at startup.
+    """
+    directory = _shared_dir()
+
+    for name in os.listdir(directory):
+        try:
+            pid = int(name.split("-")[1].split(".")[0])
+        except (IndexError, ValueError):
+            # The file was created by a version which did not name files by batch.
+            pid = None
+
+        if pid is None or not psutil.pid_exists(pid):
+            _delete(os.path.join(directory, name))
+
+
+def _in_worker() -> bool:
+    """
+    Returns whether the current code is running in a separate process. When tasks
+    run in threads, sharing arrays would only add overhead.
+    """
+    return mp.current_process().name != "MainProcess"
+
+
+def create(shape: Tuple[int, ...], dtype: Any) -> np.memmap:
+    """
+    Creates a new memory-mapped array, which can be filled gradually (e.g. by a
+    calculation whose result does not fit in memory) and then passed to `share()`
+    without being copied.
+
+    :param shape: the shape of the array
+    :param dtype: the data type of the array
+    :return: the memory-mapped array
+    """
+    path = _new_file("array")
+    arr = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+
+    if not _in_worker():
+        # The array will not be shared, so the file is not needed after it is mapped.
+        _delete(path)
+
+    return arr
+
+
+def discard(arr: Any) -> None:
+    """
+    Deletes the file of an array created by `create()` in a worker process, when the array
+    will not be shared (e.g. the transform of a surrogate, which is only used by the task
+    which calculated it). Other objects are ignored.
+    """
+    if _is_shared_file(arr):
+        _delete(arr.filename)
+
+
+def share(arr: Any) -> Union[SharedArray, Any]:
+    """
+    Writes an array to a memory-mapped file if it is large enough to benefit,
+    and the current code is running in a worker process.
+
+    Arrays which were created by `create()`, and other memory-mapped files (such as
+    cache entries), are not copied.
+
+    :param arr: the array to share; other objects are returned unchanged
+    :return: a `SharedArray` describing the array, or the original object
+    """
+    if _is_shared_file(arr):
+        arr.flush()
+        return SharedArray(
+            path=arr.filename, dtype=arr.dtype.str, shape=tuple(arr.shape)
+        )
+
+    if _is_mapped_file(arr):
+        return SharedArray(
+            path=arr.filename,
+            dtype=arr.dtype.str,
+            shape=tuple(arr.shape),
+            offset=arr.offset,
+            temporary=False,
+        )
+
+    if (
+        not isinstance(arr, ndarray)
+        or arr.nbytes < min_shared_bytes
+        or arr.dtype.hasobject
+        or not _in_worker()
+    ):
+        return arr
+
+    path = _new_file("array")
+    mapped = np.memmap(path, dtype=arr.dtype, mode="w+", shape=arr.shape)
+    mapped[:] = arr
+    mapped.flush()
+    del mapped
+
+    return SharedArray(path=path, dtype=arr.dtype.str, shape=tuple(arr.shape))
+
+
+def _is_shared_file(arr: Any) -> bool:
+    """
+    Returns whether an array is a complete memory-mapped file created by `create()`.
+    """
+    return (
+        isinstance(arr, np.memmap)
+        and _in_worker()
+        and arr.filename is not None
+        and os.path.dirname(arr.filename) == _shared_dir()
+        and arr.offset == 0
+        and arr.flags.c_contiguous
+        and arr.nbytes == os.path.getsize(arr.filename)
+    )
+
+
+def _is_mapped_file(arr: Any) -> bool:
+    """
+    Returns whether an array is a complete, unmodified view of a memory-mapped file.
+    """
+    return (
+        isinstance(arr, np.memmap)
+        and _in_worker()
+        and arr.filename is not None
+        and arr.flags.c_contiguous
+        and arr.offset + arr.nbytes == os.path.getsize(arr.filename)
+    )
+
+
+def export(arr: ndarray) -> SharedArray:
+    """
+    Writes an array to a memory-mapped file so that it can be read by many tasks, without
+    being pickled for each task. Unlike `share()`, the file is not deleted when it is opened;
+    it must be deleted with `remove()` when all tasks have finished.
+
+    :param arr: the array to export
+    :return: a `SharedArray` describing the array, which should be opened with `open_exported()`
+    """
+    arr = np.asarray(arr)
+
+    path = _new_file("export")
+    mapped = np.memmap(path, dtype=arr.dtype, mode="w+", shape=arr.shape)
+    mapped[:] = arr
+    mapped.flush()
+    del mapped
+
+    return SharedArray(
+        path=path, dtype=arr.dtype.str, shape=tuple(arr.shape), temporary=False
+    )
+
+
+def open_exported(descriptor: SharedArray) -> np.memmap:
+    """
+    Maps an exported array in read-only mode. The most recently used arrays stay mapped,
+    so a process which runs several tasks with the same array only opens it once.
+    """
+    arr = _opened_exports.pop(descriptor.path, None)
+    if arr is None:
+        arr = np.memmap(
+            descriptor.path,
+            dtype=descriptor.dtype,
+            mode="r",
+            shape=descriptor.shape,
+            offset=descriptor.offset,
+        )
+
+    _opened_exports[descriptor.path] = arr
+    while len(_opened_exports) > max_opened_exports:
+        _opened_exports.popitem(last=False)
+
+    return arr
+
+
+def remove(descriptor: SharedArray) -> None:
+    """
+    Deletes the file of an exported array.
+    """
+    _opened_exports.pop(descriptor.path, None)
+    _delete(descriptor.path)
+
+
+def share_all(items: Tuple) -> Tuple:
+    """
+    Calls `share()` on each item in a tuple.
+    """
+    return tuple(share(i) for i in items)
+
+
+def resolve(item: Any) -> Any:
+    """
+    Opens an item if it is a `SharedArray`, or returns it unchanged.
+    """
+    if isinstance(item, SharedArray):
+        return item.open()
+
+    return item
+
+
+def resolve_all(items: Tuple) -> Tuple:
+    """
+    Calls `resolve()` on each item in a tuple.
+    """
+    return tuple(resolve(i) for i in items)
+
+
+@atexit.register
+def _cleanup() -> None:
+    for path in _undeleted_files:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
@@ -0,0 +1,39 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import sys
+import tempfile
+
+import pytest
+
+from utils import args
+
+
+@pytest.fixture
+def default_args(monkeypatch):
+    """
+    Makes PyMODA's arguments take their default values, rather than parsing pytest's.
+    """
+    monkeypatch.setattr(sys, "argv", ["pymoda"])
+    monkeypatch.setattr(args, "args", None)
+
+
+@pytest.fixture
+def shared_dir(monkeypatch, tmp_path):
+    """
+    Makes shared arrays use an empty temporary directory, and returns its path.
+    """
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    return tmp_path / "pymoda-shared"
@@ -0,0 +1,148 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+
+import numpy as np
+import pytest
+
+from maths.algorithms import bispectrum
+from maths.params.BAParams import BAParams
+from maths.signals.SignalPairs import SignalPairs
+from maths.signals.TimeSeries import TimeSeries
+from processes.MPHandler import MPHandler
+
+# Logarithmically spaced frequencies, as in a wavelet transform.
+freq = 0.1 * 2 ** (np.arange(30) / 6)
+L = 300
+
+
+def _transform(seed, contiguous):
+    """A random transform with NaN coefficients outside a cone of influence."""
+    rng = np.random.default_rng(seed)
+    wt = rng.standard_normal((len(freq), L)) + 1j * rng.standard_normal((len(freq), L))
+
+    if contiguous:
+        # The cone of influence is widest at the lowest frequency.
+        width = np.round(40 * freq[0] / freq).astype(int)
+        for row, w in enumerate(width):
+            wt[row, :w] = np.nan
+            wt[row, L - w :] = np.nan
+        wt[0] = np.nan
+    else:
+        wt[rng.random(wt.shape) < 0.1] = np.nan
+
+    return wt
+
+
+def _brute_force_bispectrum(wt1, wt2):
+    """Calculates each element of the bispectrum separately."""
+    n = len(freq)
+    bisp = np.zeros((n, n), dtype=np.complex128)
+
+    for j in range(n):
+        for k in range(n):
+            f3 = freq[j] + freq[k]
+            if f3 > freq[-1]:
+                continue
+
+            k3 = np.flatnonzero(freq <= f3)[-1]
+            product = wt1[j] * wt2[k] * np.conj(wt2[k3])
+
+            finite = np.isfinite(product)
+            bisp[j, k] = np.mean(product[finite]) if np.any(finite) else np.nan
+
+    return bisp
+
+
+@pytest.mark.parametrize("contiguous", [True, False])
+@pytest.mark.parametrize("block_elements", [2**22, 1000])
+def test_bispectrum_matches_brute_force(contiguous, block_elements, monkeypatch):
+    monkeypatch.setattr(bispectrum, "_block_elements", block_elements)
+
+    wt1, wt2 = _transform(0, contiguous), _transform(1, contiguous)
+    bisp = bispectrum.wavelet_bispectrum(wt1, wt2, freq)
+    expected = _brute_force_bispectrum(wt1, wt2)
+
+    assert np.array_equal(np.isnan(bisp), np.isnan(expected))
+    assert np.allclose(bisp, expected, equal_nan=True)
+
+
+def test_auto_bispectrum_is_symmetric():
+    wt = _transform(2, True)
+    bisp = bispectrum.wavelet_bispectrum(wt, wt, freq)
+
+    # Matching the sum of the frequencies does not depend on their order.
+    assert np.allclose(bisp, bisp.T, equal_nan=True)
+
+
+def test_biphase_matches_triple_product():
+    wt1, wt2 = _transform(3, True), _transform(4, True)
+    points = np.array([[0.2, 0.3], [freq[5], freq[7]], [0.41, 0.17]])
+
+    biamp, biphase = bispectrum.wavelet_biphase(wt1, wt2, freq, points)
+
+    for row, (f1, f2) in enumerate(points):
+        j, k = np.argmin(np.abs(freq - f1)), np.argmin(np.abs(freq - f2))
+        k3 = np.flatnonzero(freq <= freq[j] + freq[k])[-1]
+        product = wt1[j] * wt2[k] * np.conj(wt2[k3])
+
+        finite = np.isfinite(product)
+        assert np.array_equal(np.isfinite(biphase[row]), finite)
+        assert np.allclose(biamp[row][finite], np.abs(product[finite]))
+        assert np.allclose(biphase[row][finite], np.unwrap(np.angle(product[finite])))
+
+
+def _bispectrum_tasks(monkeypatch, implementation):
+    """
+    Returns the arguments of the tasks which `coro_bispectrum_analysis` runs for two
+    pairs of signals, without running them.
+    """
+    rng = np.random.default_rng(0)
+    signals = SignalPairs(*[TimeSeries(rng.standard_normal(100)) for _ in range(4)])
+    signals.set_frequency(10)
+    params = BAParams(signals, 0.5, 5, 1, False, 1, 19, 0.05, {}, 0, implementation)
+
+    calls = []
+
+    async def record(self, target, args, on_progress, subtasks=0):
+        calls.append(args)
+
+        # Bispectra of each combination in each task; the surrogates are then cancelled.
+        return [[None] * len(a[3]) for a in args] if len(calls) == 1 else []
+
+    monkeypatch.setattr(MPHandler, "_map", record)
+    monkeypatch.setattr(MPHandler, "_process_count", lambda self: 4)
+
+    coro = MPHandler(use_pool=False).coro_bispectrum_analysis(
+        signals, params, lambda *_: None
+    )
+    assert asyncio.new_event_loop().run_until_complete(coro) == []
+
+    return calls
+
+
+@pytest.mark.parametrize("implementation", ["matlab", "python"])
+def test_bispectra_of_a_pair_run_in_one_task(monkeypatch, implementation):
+    bispectra, surrogates = _bispectrum_tasks(monkeypatch, implementation)
+
+    assert [len(a[3]) for a in bispectra] == [4, 4]
+
+    # The MATLAB Runtime can hang if the bispectra of a pair are calculated in parallel.
+    chunks = [a[4] for a in surrogates]
+    if implementation == "matlab":
+        assert chunks == [range(5), range(5)]
+    else:
+        assert chunks == [range(0, 2), range(2, 3), range(3, 4), range(4, 5)] * 2
@@ -0,0 +1,154 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import itertools
+import os
+import sys
+
+import numpy as np
+import pytest
+
+from maths.algorithms.multiprocessing import time_frequency
+from maths.params.TFParams import TFParams, _wt
+from maths.signals.Signals import Signals
+from utils import args, cache
+from utils.cache import Cache
+
+
+@pytest.fixture
+def cache_dir(monkeypatch, tmp_path):
+    """
+    Makes the cache use a folder in an empty temporary directory, and returns its path.
+    """
+    monkeypatch.chdir(tmp_path)
+
+    # Entries stored or loaded in quick succession must have different access times.
+    clock = itertools.count(1000)
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(clock)))
+
+    return tmp_path / "cache"
+
+
+def _entries(directory):
+    return sorted(os.listdir(directory / "entries"))
+
+
+def test_key_depends_on_contents():
+    arr = np.arange(10.0)
+
+    assert Cache.key("wt", arr, {"a": 1, "b": 2}) == Cache.key(
+        "wt", arr.copy(), {"b": 2, "a": 1}
+    )
+    assert Cache.key("wt", arr) != Cache.key("wt", arr + 1)
+    assert Cache.key("wt", arr) != Cache.key("wt", arr.astype(np.float32))
+    assert Cache.key("wt", arr) != Cache.key("wft", arr)
+
+
+def test_store_and_load(cache_dir):
+    c = Cache()
+    wt = np.arange(20, dtype=np.complex128).reshape(4, 5)
+    key = Cache.key("wt", wt)
+
+    assert c.load(key) is None
+
+    c.store(key, source={"fs": 10}, wt=wt, freq=np.arange(4.0), opt={"fmin": 1})
+    entry = c.get_entry(key)
+    assert entry.source == {"fs": 10}
+    assert entry.size == c.total_size() > 0
+
+    items = c.load(key)
+    assert isinstance(items["wt"], np.memmap)
+    assert np.array_equal(items["wt"], wt)
+    assert np.array_equal(items["freq"], np.arange(4.0))
+    assert items["opt"] == {"fmin": 1}
+    assert c.get_entry(key).accessed > entry.accessed
+
+    # The index is shared by other instances.
+    assert np.array_equal(Cache().load(key)["wt"], wt)
+
+
+def test_damaged_entry_is_removed(cache_dir):
+    c = Cache()
+    key = Cache.key("damaged")
+    c.store(key, arr=np.ones(10))
+
+    os.remove(cache_dir / "entries" / key / "items.pickle")
+
+    assert c.load(key) is None
+    assert c.get_entry(key) is None
+    assert _entries(cache_dir) == []
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir):
+    c = Cache()
+    keys = [Cache.key(i) for i in range(3)]
+
+    for k in keys:
+        c.store(k, arr=np.zeros(1000))
+    size = c.get_entry(keys[0]).size
+
+    c.load(keys[0])
+    c.max_size = 2 * size
+    c.store(Cache.key(3), arr=np.zeros(1000))
+
+    # The first entry was used more recently than the second and third.
+    assert c.get_entry(keys[1]) is None
+    assert c.get_entry(keys[2]) is None
+    assert c.get_entry(keys[0]) is not None
+    assert c.total_size() == 2 * size
+    assert _entries(cache_dir) == sorted([keys[0], Cache.key(3)])
+
+
+def test_zero_size_keeps_nothing(cache_dir):
+    c = Cache(max_size=0)
+    key = Cache.key("wt")
+
+    c.store(key, arr=np.ones(10))
+
+    assert c.load(key) is None
+    assert c.total_size() == 0
+    assert _entries(cache_dir) == []
+
+
+def _tf_params(monkeypatch, argv):
+    monkeypatch.setattr(sys, "argv", ["pymoda", *argv])
+    monkeypatch.setattr(args, "args", None)
+
+    signals = Signals()
+    signals.set_frequency(10)
+    return TFParams(signals, fmin=0.5, transform=_wt)
+
+
+def test_wt_cache_disabled_by_default(monkeypatch, cache_dir):
+    signal = np.sin(np.arange(500) / 3)
+    params = _tf_params(monkeypatch, [])
+
+    assert time_frequency._wt_cache() is None
+
+    time_frequency._wt_func(signal, params, False)
+    assert not cache_dir.exists()
+
+
+def test_wt_cache(monkeypatch, cache_dir):
+    signal = np.sin(np.arange(500) / 3)
+    params = _tf_params(monkeypatch, ["--wt-cache-size", "10"])
+
+    wt, freq, _ = time_frequency._wt_func(signal, params, False)
+    assert len(_entries(cache_dir)) == 1
+
+    cached, cached_freq, _ = time_frequency._wt_func(signal, params, False)
+    assert isinstance(cached, np.memmap)
+    assert np.array_equal(cached, wt)
+    assert np.array_equal(cached_freq, freq)
@@ -0,0 +1,115 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+
+from maths.algorithms.modwt import modwt, imodwt, imodwt_step, modwt_filters
+
+wavelets = ["haar", "db2", "sym4"]
+
+
+def _signal(L, seed=0):
+    rng = np.random.default_rng(seed)
+    return np.cumsum(rng.standard_normal(L)) + np.sin(np.arange(L) / 7)
+
+
+def _upsample(f, factor):
+    """Upsamples a periodic filter by a power of 2, inserting zeros between its taps."""
+    L = len(f)
+    out = np.zeros(L)
+    np.add.at(out, (np.arange(L) * factor) % L, f)
+    return out
+
+
+def _circular_convolution(x, f):
+    L = len(x)
+    return np.array([np.sum(f * x[(k - np.arange(L)) % L]) for k in range(L)])
+
+
+@pytest.mark.parametrize("wavelet", wavelets)
+@pytest.mark.parametrize("L", [16, 101, 500, 1024])
+def test_round_trip(wavelet, L):
+    x = _signal(L)
+    w = modwt(x, wavelet)
+
+    assert w.shape == (int(np.floor(np.log2(L))) + 1, L)
+    assert np.allclose(imodwt(w, wavelet), x, atol=1e-10)
+
+
+@pytest.mark.parametrize("wavelet", wavelets)
+def test_energy_is_preserved(wavelet):
+    x = _signal(300)
+    w = modwt(x, wavelet, levels=5)
+
+    assert np.isclose(np.sum(w**2), np.sum(x**2))
+
+
+def test_batch_matches_single_signals():
+    x = np.array([_signal(200, seed) for seed in range(3)])
+    w = modwt(x, levels=4)
+
+    for i in range(len(x)):
+        assert np.allclose(w[i], modwt(x[i], levels=4))
+
+    assert np.allclose(imodwt(w), x)
+
+
+@pytest.mark.parametrize("wavelet", wavelets)
+@pytest.mark.parametrize("level", [1, 2, 3])
+def test_wavelet_coefficients_match_circular_convolution(wavelet, level):
+    L = 64
+    x = _signal(L)
+    w = modwt(x, wavelet, levels=level)
+
+    # The filters at the level, calculated in the time domain by convolving the
+    # upsampled scaling filters of the previous levels with the upsampled wavelet filter.
+    h, g = modwt_filters(L, 1, wavelet)
+    h_time = np.fft.irfft(h, n=L)
+    g_time = np.fft.irfft(g, n=L)
+
+    response = np.zeros(L)
+    response[0] = 1
+    for j in range(1, level):
+        response = _circular_convolution(response, _upsample(g_time, 2 ** (j - 1)))
+    response = _circular_convolution(response, _upsample(h_time, 2 ** (level - 1)))
+
+    expected = _circular_convolution(x, response)
+    assert np.allclose(w[level - 1], expected)
+
+
+def test_haar_first_level():
+    x = _signal(50)
+    w = modwt(x, "haar", levels=1)
+
+    assert np.allclose(w[0], (x - np.roll(x, 1)) / 2)
+    assert np.allclose(w[1], (x + np.roll(x, 1)) / 2)
+
+
+def test_inverse_one_level_at_a_time():
+    x = _signal(128)
+    w = modwt(x, levels=3)
+
+    fv = np.fft.rfft(w[3])
+    for j in range(3, 0, -1):
+        fv = imodwt_step(fv, np.fft.rfft(w[j - 1]), 128, j)
+
+    # The scaling coefficients at level 0 are the signal.
+    assert np.allclose(np.fft.irfft(fv, n=128), x)
+
+
+def test_unknown_wavelet():
+    with pytest.raises(ValueError):
+        modwt(_signal(32), "db10")
@@ -0,0 +1,223 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import array
+import sys
+import types
+import warnings
+
+import numpy as np
+import pytest
+
+from maths import num_utils
+from maths.num_utils import avg_ampl_pow, matlab_to_numpy, numpy_to_matlab
+
+
+def _avg_ampl_pow_loop(amplitude):
+    """The previous implementation, which loops over each row."""
+    length = len(amplitude)
+
+    avg_ampl = np.empty(length, dtype=np.float64)
+    avg_pow = np.empty(length, dtype=np.float64)
+
+    for i in range(length):
+        arr = amplitude[i]
+        row = arr[np.isfinite(arr)]
+
+        avg_ampl[i] = np.mean(row)
+        avg_pow[i] = np.mean(np.square(row))
+
+    return avg_ampl, avg_pow
+
+
+def _amplitude(rows, cols):
+    rng = np.random.default_rng(4)
+    amplitude = np.abs(rng.normal(size=(rows, cols)))
+
+    # NaNs at the edges, like the cone of influence of a wavelet transform.
+    for i in range(rows):
+        edge = i * cols // (2 * rows)
+        amplitude[i, :edge] = np.nan
+        amplitude[i, cols - edge :] = np.nan
+
+    amplitude[1] = np.nan
+    amplitude[2, rng.integers(cols, size=5)] = np.inf
+    amplitude[3, rng.integers(cols, size=5)] = -np.inf
+    amplitude[4, 0] = np.inf
+    amplitude[4, -1] = -np.inf
+    amplitude[5, rng.integers(cols, size=cols // 2)] = np.nan
+
+    return amplitude
+
+
+@pytest.mark.parametrize(
+    "block_elements,block_columns", [(2**16, 2**12), (64, 16), (100, 7), (1, 1)]
+)
+@pytest.mark.parametrize("shape", [(12, 300), (40, 33), (7, 1000)])
+def test_avg_ampl_pow_matches_loop(monkeypatch, shape, block_elements, block_columns):
+    monkeypatch.setattr(num_utils, "_block_elements", block_elements)
+    monkeypatch.setattr(num_utils, "_block_columns", block_columns)
+    amplitude = _amplitude(*shape)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        expected = _avg_ampl_pow_loop(amplitude)
+
+    result = avg_ampl_pow(amplitude)
+
+    for e, r in zip(expected, result):
+        assert r.shape == (shape[0],)
+        assert np.allclose(r, e, rtol=1e-12, equal_nan=True)
+
+    # Only the rows without finite values have no average.
+    assert np.flatnonzero(np.isnan(result[0])).tolist() == [1]
+
+
+def test_avg_ampl_pow_memmap(tmp_path):
+    amplitude = _amplitude(10, 500)
+    mapped = np.memmap(
+        tmp_path / "ampl.dat", dtype=np.float32, mode="w+", shape=(10, 500)
+    )
+    mapped[:] = amplitude
+
+    expected = avg_ampl_pow(mapped[:].astype(np.float64))
+    result = avg_ampl_pow(mapped)
+
+    for e, r in zip(expected, result):
+        assert np.allclose(r, e, equal_nan=True)
+
+
+def test_avg_ampl_pow_empty():
+    avg_ampl, avg_pow = avg_ampl_pow(np.empty((0, 10)))
+    assert avg_ampl.shape == avg_pow.shape == (0,)
+
+
+class _StubDouble:
+    """
+    Stores its data like `matlab.double` in the MATLAB engines which do not support the
+    buffer protocol: in `array.array` objects, in column-major order.
+    """
+
+    def __init__(self, initializer=None, size=None, is_complex=False):
+        if initializer is not None:
+            raise AssertionError("The data should be copied directly, not from a list.")
+
+        count = int(np.prod(size))
+        self.size = tuple(size)
+        self._is_complex = is_complex
+
+        if is_complex:
+            self._real = array.array("d", bytes(8 * count))
+            self._imag = array.array("d", bytes(8 * count))
+        else:
+            self._data = array.array("d", bytes(8 * count))
+
+
+class _StubBufferDouble:
+    """
+    Stores its data like `matlab.double` in the MATLAB engines which support numpy arrays.
+    """
+
+    def __init__(self, initializer=None, size=None, is_complex=False):
+        if initializer is None:
+            self.size = tuple(size)
+            self._data = None
+        else:
+            self._array = np.array(initializer, dtype=complex if is_complex else float)
+            self.size = self._array.shape
+
+    def __array__(self, dtype=None):
+        return np.asarray(self._array, dtype=dtype)
+
+
+def _stub_matlab(monkeypatch, double):
+    """
+    Replaces the `matlab` module with a stub, so that the conversions can be tested without
+    the MATLAB Runtime.
+    """
+    module = types.ModuleType("matlab")
+    module.double = double
+    monkeypatch.setitem(sys.modules, "matlab", module)
+
+
+@pytest.fixture(params=[_StubDouble, _StubBufferDouble])
+def stub_matlab(request, monkeypatch):
+    _stub_matlab(monkeypatch, request.param)
+    return request.param
+
+
+_arrays = [
+    np.arange(7, dtype=np.float64),
+    np.arange(12, dtype=np.float64).reshape(3, 4),
+    np.arange(12).reshape(4, 3) * (1 - 2j),
+    np.asfortranarray(np.arange(6.0).reshape(2, 3)),
+    np.arange(20, dtype=np.float32).reshape(4, 5)[:, ::2],
+]
+
+
+@pytest.mark.parametrize("arr", _arrays)
+def test_matlab_round_trip(stub_matlab, arr):
+    m = numpy_to_matlab(arr)
+    assert isinstance(m, stub_matlab)
+
+    # A 1D array becomes a row vector.
+    expected = arr.reshape(1, -1) if arr.ndim == 1 else arr
+    assert m.size == expected.shape
+
+    result = matlab_to_numpy(m)
+    assert result.shape == expected.shape
+    assert np.iscomplexobj(result) == np.iscomplexobj(arr)
+    np.testing.assert_array_equal(result, expected)
+
+
+def test_matlab_storage_is_column_major(monkeypatch):
+    _stub_matlab(monkeypatch, _StubDouble)
+    arr = np.arange(6.0).reshape(2, 3) + 1j * np.arange(6.0).reshape(2, 3)[::-1]
+    m = numpy_to_matlab(arr)
+
+    assert list(m._real) == [0, 3, 1, 4, 2, 5]
+    assert list(m._imag) == [3, 0, 4, 1, 5, 2]
+
+
+def test_matlab_to_numpy_reads_buffers():
+    m = _StubDouble(size=(2, 3))
+    m._data = array.array("d", [0, 3, 1, 4, 2, 5])
+
+    result = matlab_to_numpy(m)
+    assert result.dtype == np.float64
+    np.testing.assert_array_equal(result, [[0, 1, 2], [3, 4, 5]])
+
+    # The result does not share memory with the MATLAB array.
+    m._data[0] = 10
+    assert result[0, 0] == 0
+
+    c = _StubDouble(size=(1, 2), is_complex=True)
+    c._real = array.array("d", [1, 2])
+    c._imag = array.array("d", [-1, 0.5])
+    np.testing.assert_array_equal(matlab_to_numpy(c), [[1 - 1j, 2 + 0.5j]])
+
+
+def test_matlab_to_numpy_returns_numpy_arrays():
+    arr = np.ones((2, 2))
+    assert matlab_to_numpy(arr) is arr
+    np.testing.assert_array_equal(matlab_to_numpy([[1, 2]]), [[1, 2]])
+
+
+@pytest.mark.parametrize("arr", _arrays)
+def test_matlab_round_trip_with_matlab(arr):
+    pytest.importorskip("matlab")
+
+    result = matlab_to_numpy(numpy_to_matlab(arr))
+    np.testing.assert_array_equal(result, arr.reshape(1, -1) if arr.ndim == 1 else arr)
@@ -0,0 +1,98 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from maths.algorithms.matlabwrappers import packages
+
+
+class _StubPackage:
+    def __init__(self):
+        self.terminated = False
+
+    def terminate(self):
+        self.terminated = True
+
+
+@pytest.fixture
+def stub_package(monkeypatch):
+    """
+    Replaces the registry with an empty one, and adds a stub MATLAB-packaged library whose
+    initialisation is slow. Returns the list of initialised instances.
+    """
+    monkeypatch.setattr(packages, "_packages", {})
+    monkeypatch.setattr(packages, "init_times", {})
+
+    instances = []
+
+    def initialize():
+        time.sleep(0.05)
+        instances.append(_StubPackage())
+        return instances[-1]
+
+    module = types.ModuleType("stubPackage")
+    module.initialize = initialize
+    monkeypatch.setitem(sys.modules, "stubPackage", module)
+
+    return instances
+
+
+def test_package_is_initialised_once(stub_package):
+    package = packages.get_package("stubPackage")
+
+    assert packages.get_package("stubPackage") is package
+    assert stub_package == [package]
+    assert packages.total_init_time() == packages.init_times["stubPackage"] >= 0.05
+
+
+def test_package_is_initialised_once_by_threads(stub_package):
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(packages.get_package("stubPackage"))
+        )
+        for _ in range(8)
+    ]
+
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(stub_package) == 1
+    assert results == stub_package * 8
+
+
+def test_packages_are_terminated(stub_package):
+    package = packages.get_package("stubPackage")
+
+    packages.terminate_all()
+
+    assert package.terminated
+    assert packages.get_package("stubPackage") is not package
+    assert len(stub_package) == 2
+
+
+def test_missing_package_is_not_registered(stub_package):
+    with pytest.raises(ImportError):
+        packages.get_package("missingPackage")
+
+    assert "missingPackage" not in packages._packages
+    assert packages.total_init_time() == 0
@@ -0,0 +1,62 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+
+from maths.algorithms.multiprocessing.phase_coherence import (
+    _surrogate_phase_coherence,
+)
+from maths.algorithms.multiprocessing.time_frequency import _wt_func
+from maths.algorithms.surrogates import surrogate_chunks
+from maths.params.PCParams import PCParams
+from maths.params.TFParams import _wt
+from maths.signals.Signals import Signals
+from processes import shared_arrays
+
+fs = 10
+
+
+def test_surrogates_in_blocks_leave_no_files(default_args, shared_dir, monkeypatch):
+    t = np.arange(2000) / fs
+    signal = np.sin(2 * np.pi * t) + 0.5 * np.sin(2 * np.pi * 0.7 * t)
+
+    signals = Signals()
+    signals.set_frequency(fs)
+    params = PCParams(
+        signals,
+        fmin=0.5,
+        transform=_wt,
+        surr_enabled=True,
+        surr_count=3,
+        surr_method="FT",
+    )
+    params.block_size = 500
+
+    wt, freq, _ = _wt_func(signal, params, False, use_cache=False)
+
+    # Run the task as if it was in a worker process, whose transforms are memory-mapped.
+    monkeypatch.setattr(shared_arrays, "_in_worker", lambda: True)
+    exported = [shared_arrays.export(wt), shared_arrays.export(signal)]
+    seed = np.random.SeedSequence(0)
+
+    (chunks,) = surrogate_chunks(params.surr_count, 1)
+    stats = _surrogate_phase_coherence(*exported, params, seed, chunks)
+
+    for e in exported:
+        shared_arrays.remove(e)
+
+    assert np.all(stats.count == 3)
+    assert np.size(stats.mean()) == len(freq)
+    assert list(shared_dir.iterdir()) == []
@@ -0,0 +1,152 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import itertools
+
+import numpy as np
+import pytest
+
+from maths.algorithms import ridges, windowed_fourier
+from maths.algorithms.multiprocessing.ridge_extraction import _ridge_options
+from maths.params.REParams import REParams
+from maths.params.TFParams import TFParams
+from maths.signals.Signals import Signals
+from processes.MPHandler import MPHandler
+
+fs = 20.0
+t = np.arange(4000) / fs
+
+# A chirp from 1 Hz to 1.6 Hz, and a weaker tone which crosses its frequency.
+chirp_freq = 1 + 0.003 * t
+chirp_phase = 2 * np.pi * (t + 0.0015 * t**2)
+signal = np.cos(chirp_phase) + 0.15 * np.cos(2 * np.pi * 1.3 * t + 1)
+
+# Times far enough from the edges that the padding has no effect.
+inside = slice(400, -400)
+
+
+def _wft(x):
+    return windowed_fourier.wft(x, fs, fmin=0.5, fmax=2.5, f0=2, preprocess=False)
+
+
+def test_ecurve_follows_chirp():
+    rng = np.random.default_rng(0)
+    wft, freq = _wft(signal + 0.3 * rng.standard_normal(len(t)))
+
+    ridge = ridges.ecurve(wft, freq)
+
+    assert np.all(ridge >= 0)
+    step = freq[1] - freq[0]
+    assert np.max(np.abs(freq[ridge] - chirp_freq)[inside]) <= 2 * step
+
+
+def test_direct_reconstruction_of_chirp():
+    wft, freq = _wft(np.cos(chirp_phase))
+    wp = windowed_fourier.window_functions(windowed_fourier.gaussian, 2)
+
+    iamp, iphi, ifreq = ridges.ridge_extraction(
+        wft, freq, ridges.window_constants(wp.twf)
+    )
+
+    assert np.allclose(iamp[inside], 1, atol=1e-3)
+    assert np.allclose(ifreq[inside], chirp_freq[inside], atol=1e-3)
+
+    phase_error = np.angle(np.exp(1j * (iphi - chirp_phase)))
+    assert np.max(np.abs(phase_error[inside])) < 1e-3
+
+
+def _brute_force_path(utility, peak_freq, dmean, dstd, alpha):
+    """Finds the optimal path by trying every path through the table of peaks."""
+    T, M = utility.shape
+
+    best, best_path = -np.inf, None
+    for path in itertools.product(range(M), repeat=T):
+        f = peak_freq[np.arange(T), path]
+        score = np.sum(utility[np.arange(T), path]) - alpha * np.sum(
+            ((np.diff(f) - dmean) / dstd) ** 2
+        )
+        if score > best:
+            best, best_path = score, path
+
+    return np.array(best_path)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("block_edges", [2**22, 20])
+def test_optimal_path_matches_brute_force(seed, block_edges, monkeypatch):
+    monkeypatch.setattr(ridges, "_block_edges", block_edges)
+
+    rng = np.random.default_rng(seed)
+    utility = rng.standard_normal((7, 3))
+    peak_freq = rng.random((7, 3))
+
+    # Padding of the table, where there are fewer peaks.
+    utility[rng.random(utility.shape) < 0.3] = -np.inf
+    utility[:, 0] = rng.standard_normal(7)
+
+    path = ridges._optimal_path(utility, peak_freq, 0.05, 0.2, 1.5)
+    expected = _brute_force_path(utility, peak_freq, 0.05, 0.2, 1.5)
+
+    assert np.array_equal(path, expected)
+
+
+@pytest.mark.parametrize("options", [dict(method=1), dict(normalize=True)])
+def test_unsupported_options_are_rejected(options, default_args):
+    signals = Signals()
+    signals.set_frequency(fs)
+
+    with pytest.raises(ValueError):
+        _ridge_options(REParams(signals, **options))
+
+
+def _ridge_extraction_path(monkeypatch, **options):
+    """
+    Returns whether `coro_ridge_extraction` extracts the ridges in Python or with the
+    MATLAB-packaged library, without running either.
+    """
+    signals = Signals()
+    signals.set_frequency(fs)
+
+    async def python(self, target, args, on_progress, subtasks=0):
+        return "python"
+
+    async def matlab(self, signals, params, on_progress):
+        return "matlab"
+
+    monkeypatch.setattr(MPHandler, "_map", python)
+    monkeypatch.setattr(MPHandler, "_matlab_ridge_extraction", matlab)
+
+    params = REParams(signals, intervals=[(1, 2)], **options)
+    coro = MPHandler(use_pool=False).coro_ridge_extraction(
+        params, lambda *_: None, TFParams(signals)
+    )
+    return asyncio.new_event_loop().run_until_complete(coro)
+
+
+@pytest.mark.parametrize(
+    "options,path",
+    [
+        (dict(), "python"),
+        (dict(max_iterations=5, path_opt=False), "python"),
+        (dict(method=1), "matlab"),
+        (dict(normalize=True), "matlab"),
+        (dict(window="Bump"), "matlab"),
+    ],
+)
+def test_options_only_supported_by_matlab_fall_back(
+    options, path, monkeypatch, default_args
+):
+    assert _ridge_extraction_path(monkeypatch, **options) == path
@@ -0,0 +1,110 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+
+from maths.algorithms.running_stats import RunningStats, RunningOrderStatistic
+
+shape = (3, 4)
+
+
+def _arrays(n, seed=0):
+    """Arrays of values in [0, 1], with a different distribution at each position."""
+    rng = np.random.default_rng(seed)
+    power = np.arange(1, 13).reshape(shape) / 4
+    return rng.random((n, *shape)) ** power
+
+
+def _stats(arrays, **kwargs):
+    stats = RunningStats(track_percentiles=True, **kwargs)
+    for a in arrays:
+        stats.add(a)
+    return stats
+
+
+@pytest.mark.parametrize("q", [1, 5, 50, 95, 99])
+def test_percentile_matches_numpy(q):
+    arrays = _arrays(2000)
+    stats = _stats(arrays)
+    estimate = stats.percentile(q)
+
+    # Percentiles are accurate to the width of a bin, and the definitions of the percentile
+    # only differ by the spacing of the values next to it.
+    width = 1 / stats.bins
+    values = np.sort(arrays, axis=0)
+    i = q / 100 * (len(arrays) - 1)
+    lower = values[max(int(np.floor(i)) - 1, 0)] - width
+    upper = values[min(int(np.ceil(i)) + 1, len(arrays) - 1)] + width
+
+    assert np.all((lower <= estimate) & (estimate <= upper))
+    assert np.allclose(estimate, np.percentile(arrays, q, axis=0), atol=0.005)
+    assert np.allclose(stats.mean(), np.mean(arrays, axis=0))
+
+
+def test_merge_matches_single_instance():
+    arrays = _arrays(1000)
+    expected = _stats(arrays)
+
+    merged = RunningStats(track_percentiles=True)
+    for chunk in np.array_split(arrays, [10, 400, 401]):
+        merged.merge(_stats(chunk))
+
+    assert np.array_equal(merged.count, expected.count)
+    assert np.array_equal(merged.histogram, expected.histogram)
+    assert np.allclose(merged.mean(), expected.mean())
+    assert np.allclose(merged.percentile(95), expected.percentile(95))
+
+
+def test_nan_values_are_ignored():
+    arrays = _arrays(1000)
+    arrays[::3, 0, 0] = np.nan
+    arrays[:, 1, 1] = np.nan
+
+    stats = _stats(arrays)
+
+    assert stats.count[0, 0] == 1000 - len(arrays[::3])
+    assert np.isclose(stats.mean()[0, 0], np.nanmean(arrays[:, 0, 0]))
+    assert np.isclose(
+        stats.percentile(50)[0, 0], np.nanpercentile(arrays[:, 0, 0], 50), atol=0.005
+    )
+
+    # No finite values were added at this position.
+    assert np.isnan(stats.mean()[1, 1])
+    assert np.isnan(stats.percentile(50)[1, 1])
+
+
+def test_percentile_needs_histogram():
+    stats = RunningStats()
+    stats.add(np.zeros(shape))
+
+    with pytest.raises(ValueError):
+        stats.percentile(95)
+
+
+@pytest.mark.parametrize("k", [1, 5, 50])
+def test_order_statistic_is_exact(k):
+    arrays = _arrays(200)
+    arrays[::7, 2, 3] = np.nan
+
+    first, second = RunningOrderStatistic(k), RunningOrderStatistic(k)
+    for a in arrays[:120]:
+        first.add(a)
+    for a in arrays[120:]:
+        second.add(a)
+    first.merge(second)
+
+    expected = -np.sort(-np.nan_to_num(arrays, nan=-np.inf), axis=0)[k - 1]
+    assert np.array_equal(first.value(), expected)
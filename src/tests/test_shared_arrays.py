@@ -0,0 +1,157 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from processes import shared_arrays
+
+
+@pytest.fixture
+def worker(monkeypatch, shared_dir):
+    """
+    Makes the current process behave like a worker process, which shares large arrays.
+    """
+    monkeypatch.setattr(shared_arrays, "_in_worker", lambda: True)
+    monkeypatch.setattr(shared_arrays, "min_shared_bytes", 0)
+    monkeypatch.setattr(
+        shared_arrays, "_opened_exports", type(shared_arrays._opened_exports)()
+    )
+    return shared_dir
+
+
+def _files(directory):
+    return sorted(os.listdir(directory))
+
+
+def _dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_share_and_open_delete_file(worker):
+    arr = np.arange(1000, dtype=np.float64).reshape(10, 100)
+
+    descriptor = shared_arrays.share(arr)
+    assert isinstance(descriptor, shared_arrays.SharedArray)
+    assert _files(worker) == [os.path.basename(descriptor.path)]
+
+    opened = shared_arrays.resolve(descriptor)
+    assert _files(worker) == []
+    assert np.array_equal(opened, arr)
+
+
+def test_created_array_is_shared_without_copy(worker):
+    arr = shared_arrays.create((4, 50), np.complex128)
+    arr[:] = 1 + 2j
+
+    descriptor = shared_arrays.share(arr)
+    assert descriptor.path == arr.filename
+    assert len(_files(worker)) == 1
+
+    assert np.all(descriptor.open() == 1 + 2j)
+    assert _files(worker) == []
+
+
+def test_discard_deletes_created_array(worker):
+    arr = shared_arrays.create((4, 50), np.float64)
+    other = np.ones(10)
+
+    shared_arrays.discard(arr)
+    shared_arrays.discard(other)
+
+    assert _files(worker) == []
+
+
+def test_small_arrays_are_not_shared(worker, monkeypatch):
+    monkeypatch.setattr(shared_arrays, "min_shared_bytes", 1024)
+    arr = np.ones(10)
+
+    assert shared_arrays.share(arr) is arr
+    assert not worker.exists() or _files(worker) == []
+
+
+def test_main_process_does_not_share(shared_dir):
+    arr = np.ones(10**6)
+
+    assert shared_arrays.share(arr) is arr
+    assert shared_arrays.create((10,), np.float64).shape == (10,)
+    assert _files(shared_dir) == []
+
+
+def test_export_open_exported_remove(worker):
+    arr = np.random.default_rng(0).normal(size=(3, 200))
+
+    descriptor = shared_arrays.export(arr)
+    for _ in range(2):
+        opened = shared_arrays.open_exported(descriptor)
+        assert np.array_equal(opened, arr)
+        assert not opened.flags.writeable
+
+    # Exported files stay until they are removed.
+    assert _files(worker) == [os.path.basename(descriptor.path)]
+
+    shared_arrays.remove(descriptor)
+    assert _files(worker) == []
+    assert descriptor.path not in shared_arrays._opened_exports
+
+
+def test_open_exported_keeps_recent_arrays(worker, monkeypatch):
+    monkeypatch.setattr(shared_arrays, "max_opened_exports", 2)
+    descriptors = [shared_arrays.export(np.full(10, i)) for i in range(3)]
+
+    for d in descriptors:
+        shared_arrays.open_exported(d)
+
+    assert list(shared_arrays._opened_exports) == [d.path for d in descriptors[1:]]
+
+
+def test_remove_batch_only_removes_own_files(worker):
+    def make_files():
+        return (
+            shared_arrays.share(np.ones(100)),
+            shared_arrays.export(np.zeros(100)),
+        )
+
+    batch, other = shared_arrays.new_batch(), shared_arrays.new_batch()
+    removed = shared_arrays.in_batch(batch, make_files)()
+    kept = shared_arrays.in_batch(other, make_files)()
+
+    for d in removed + kept:
+        assert os.path.exists(d.path)
+
+    shared_arrays.remove_batch(batch)
+
+    assert _files(worker) == sorted(os.path.basename(d.path) for d in kept)
+    assert all(os.path.basename(d.path).split("-")[1] == other for d in kept)
+
+
+def test_sweep_removes_files_of_dead_processes(shared_dir):
+    shared_dir.mkdir()
+
+    live = f"array-{os.getpid()}.1-live.dat"
+    dead = f"array-{_dead_pid()}.1-dead.dat"
+    old = "array-unnamed.dat"
+    for name in (live, dead, old):
+        (shared_dir / name).touch()
+
+    shared_arrays.sweep()
+
+    assert _files(shared_dir) == [live]
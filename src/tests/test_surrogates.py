@@ -0,0 +1,435 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+
+from maths.algorithms import surrogates
+from maths.algorithms.surrogates import (
+    spawn_seeds,
+    surrogate_calc,
+    surrogate_chunks,
+    surrogate_stream,
+)
+
+
+def _signal(L: int = 512) -> np.ndarray:
+    rng = np.random.default_rng(1)
+    t = np.arange(L) / 10
+    return np.sin(2 * np.pi * 0.8 * t) + 0.5 * rng.standard_normal(L)
+
+
+def test_wiaaft_uses_iaaft2_at_each_level(monkeypatch):
+    calls = []
+    iaaft = surrogates._iterative_amplitude_adjusted
+
+    def record(sig, n, rng, exact_spectrum, max_iterations, initial=None):
+        calls.append((initial is None, exact_spectrum))
+        return iaaft(sig, n, rng, exact_spectrum, max_iterations, initial)
+
+    monkeypatch.setattr(surrogates, "_iterative_amplitude_adjusted", record)
+    surrogate_calc(_signal(), 2, "WIAAFT", False, 10, seed=0)
+
+    # The coefficients at each level use IAAFT2; the final iterations, which start from the
+    # inverse transform, restore the exact distribution of the signal (IAAFT1).
+    levels = [exact for first, exact in calls if first]
+    assert levels and all(levels)
+    assert calls[-1] == (False, False)
+
+
+def test_wiaaft_is_reproducible_and_has_exact_distribution():
+    sig = _signal()
+
+    surr1, _ = surrogate_calc(sig, 3, "WIAAFT", False, 10, seed=42)
+    surr2, _ = surrogate_calc(sig, 3, "WIAAFT", False, 10, seed=42)
+
+    np.testing.assert_array_equal(surr1, surr2)
+    np.testing.assert_array_equal(np.sort(surr1, axis=1), np.tile(np.sort(sig), (3, 1)))
+
+
+def _loop_preprocessing(sig: np.ndarray, fs: float):
+    """
+    The previous implementation of `preprocessing`, which calculated the mismatch for every
+    pair of windows in a loop (with the index calculations corrected).
+    """
+    sig = sig - np.mean(sig)
+    L = len(sig)
+    t = np.linspace(0, L / fs, L)
+
+    p = 10
+    K1 = int(np.round(L / 100))
+    k1 = sig[:K1]
+    K2 = int(np.round(L / 10))
+    k2 = sig[L - K2 :]
+
+    if len(k1) <= p:
+        p = len(k1) - 1
+
+    d = np.zeros((len(k1) - p, len(k2) - p))
+    for j in range(len(k1) - p):
+        for k in range(len(k2) - p):
+            d[j, k] = np.sum(np.abs(k1[j : j + p]) - k2[k : k + p])
+
+    abs_d = np.abs(d)
+    v = np.min(abs_d, axis=1)
+    I = np.argmin(abs_d, axis=1)
+    I2 = np.argmin(v)
+
+    kstart = I2
+    kend = I[I2] + L - K2
+    return sig[kstart:kend], t[kstart:kend], kstart, kend
+
+
+@pytest.mark.parametrize("L", [100, 150, 500, 999, 1000, 1001, 1100, 2048, 5000])
+def test_preprocessing_matches_loop(L):
+    for seed in range(5):
+        sig = np.random.default_rng(seed).standard_normal(L)
+
+        expected = _loop_preprocessing(sig, 10)
+        result = surrogates.preprocessing(sig, 10)
+
+        assert result[2:] == expected[2:]
+        np.testing.assert_array_equal(result[0], expected[0])
+        np.testing.assert_array_equal(result[1], expected[1])
+
+
+@pytest.mark.parametrize("method", ["RP", "FT", "IAAFT1"])
+def test_surrogates_of_preprocessed_signal(method):
+    sig = _signal(1000) + 3
+    cut, time, kstart, kend = surrogates.preprocessing(sig, 10)
+
+    surr, params = surrogate_calc(sig, 3, method, True, 10, seed=0)
+    expected, _ = surrogate_calc(cut, 3, method, False, 10, seed=0)
+
+    assert params.preprocessing
+    assert (params.sigstart, params.sigend) == (kstart, kend)
+    np.testing.assert_array_equal(params.cutsig, cut)
+    np.testing.assert_array_equal(params.time, time)
+    np.testing.assert_array_equal(surr, expected)
+
+    # The mean is removed by pre-processing.
+    assert abs(np.mean(cut)) < 0.5
+
+
+def _phase_signal(L: int = 2000) -> np.ndarray:
+    rng = np.random.default_rng(2)
+    frequency = 0.5 + 0.1 * rng.standard_normal(L)
+    return np.cumsum(2 * np.pi * frequency / 10)
+
+
+@pytest.mark.parametrize("method", ["RP", "FT", "AAFT", "tshift", "CPP"])
+def test_generators_are_reproducible(method):
+    sig = _phase_signal() if method == "CPP" else _signal()
+
+    surr1, _ = surrogate_calc(sig, 5, method, False, 10, seed=7)
+    surr2, _ = surrogate_calc(sig, 5, method, False, 10, seed=np.random.SeedSequence(7))
+    surr3, _ = surrogate_calc(sig, 5, method, False, 10, seed=8)
+
+    assert surr1.shape == (5, len(sig))
+    np.testing.assert_array_equal(surr1, surr2)
+    assert not np.array_equal(surr1, surr3)
+
+    # Each surrogate is different.
+    assert len({s.tobytes() for s in surr1}) == 5
+
+
+@pytest.mark.parametrize("L", [511, 512])
+def test_ft_preserves_power_spectrum(L):
+    sig = _signal(L)
+    surr, _ = surrogate_calc(sig, 4, "FT", False, 10, seed=0)
+
+    expected = np.abs(np.fft.rfft(sig))
+    result = np.abs(np.fft.rfft(surr, axis=1))
+
+    # As in MODA, the Nyquist term of a signal with even length is removed.
+    if L % 2 == 0:
+        assert np.allclose(result[:, -1], 0)
+        expected, result = expected[:-1], result[:, :-1]
+
+    assert np.allclose(result, expected)
+    assert not np.allclose(surr, sig)
+
+
+@pytest.mark.parametrize("method", ["RP", "AAFT"])
+def test_distribution_is_preserved(method):
+    sig = _signal()
+    surr, _ = surrogate_calc(sig, 4, method, False, 10, seed=0)
+
+    np.testing.assert_array_equal(np.sort(surr, axis=1), np.tile(np.sort(sig), (4, 1)))
+
+
+def test_aaft_in_blocks_preserves_distribution(monkeypatch):
+    # With one surrogate per block, the random numbers are used in a different order, so
+    # only the distribution of the surrogates is compared.
+    sig = _signal()
+    monkeypatch.setattr(surrogates, "_block_elements", 1)
+    surr, _ = surrogate_calc(sig, 3, "AAFT", False, 10, seed=0)
+
+    np.testing.assert_array_equal(np.sort(surr, axis=1), np.tile(np.sort(sig), (3, 1)))
+
+
+def test_rp_and_ft_are_independent_of_block_size(monkeypatch):
+    sig = _signal()
+    expected = [surrogate_calc(sig, 5, m, False, 10, seed=3)[0] for m in ("RP", "FT")]
+
+    monkeypatch.setattr(surrogates, "_block_elements", 2 * len(sig))
+    result = [surrogate_calc(sig, 5, m, False, 10, seed=3)[0] for m in ("RP", "FT")]
+
+    for e, r in zip(expected, result):
+        np.testing.assert_array_equal(r, e)
+
+
+def test_tshift_is_cyclic_shift():
+    sig = _signal()
+    surr, _ = surrogate_calc(sig, 10, "tshift", False, 10, seed=0)
+
+    for s in surr:
+        shifts = [k for k in range(1, len(sig)) if np.array_equal(s, np.roll(sig, -k))]
+        assert len(shifts) == 1
+
+
+def _cycles(phase: np.ndarray):
+    """
+    Splits a phase, wrapped to [0, 2 pi), at the points where it decreases by more than pi.
+    """
+    wrapped = np.mod(phase, 2 * np.pi)
+    points = ((wrapped[1:] - wrapped[:-1]) < -np.pi).nonzero()[0]
+    return wrapped, points, [wrapped[a:b] for a, b in zip(points[:-1], points[1:])]
+
+
+def test_cpp_permutes_cycles():
+    sig = _phase_signal()
+    surr, _ = surrogate_calc(sig, 4, "CPP", False, 10, seed=0)
+
+    wrapped, points, cycles = _cycles(sig)
+
+    for s in surr:
+        # The surrogate is a continuous phase.
+        assert np.all(np.abs(np.diff(s)) < np.pi)
+
+        # The values before the first and after the last cycle are kept.
+        s, s_points, s_cycles = _cycles(s)
+        np.testing.assert_allclose(s[: points[0]], wrapped[: points[0]])
+        np.testing.assert_allclose(s[points[-1] :], wrapped[points[-1] :])
+
+        # Each cycle of the surrogate is a different cycle of the signal.
+        remaining = list(cycles)
+        for c in s_cycles:
+            i = next(
+                i
+                for i, r in enumerate(remaining)
+                if len(r) == len(c) and np.allclose(r, c)
+            )
+            remaining.pop(i)
+
+        assert not remaining
+        assert not np.array_equal(s_points, points)
+
+
+def _iaaft_step(sig: np.ndarray, surr: np.ndarray) -> np.ndarray:
+    """
+    One IAAFT iteration: imposes the amplitude spectrum, and then the values, of the signal.
+    """
+    spectrum = np.fft.rfft(surr)
+    f = np.fft.irfft(
+        np.abs(np.fft.rfft(sig)) * np.exp(1j * np.angle(spectrum)), n=len(sig)
+    )
+
+    result = np.empty_like(f)
+    result[np.argsort(f)] = np.sort(sig)
+    return result
+
+
+def test_iaaft1_converges_with_exact_distribution():
+    sig = _signal()
+    surr, params = surrogate_calc(sig, 5, "IAAFT1", False, 10, seed=0)
+
+    np.testing.assert_array_equal(np.sort(surr, axis=1), np.tile(np.sort(sig), (5, 1)))
+
+    # Each surrogate is a fixed point of the iterations.
+    assert params.iterations.shape == (5,)
+    assert np.all((params.iterations > 1) & (params.iterations < 1000))
+    for s in surr:
+        np.testing.assert_array_equal(_iaaft_step(sig, s), s)
+
+    # The spectrum is close to that of the signal, but not exact.
+    amplitude = np.abs(np.fft.rfft(sig))
+    error = np.abs(np.abs(np.fft.rfft(surr, axis=1)) - amplitude)
+    assert np.mean(error) < 0.2 * np.mean(amplitude)
+
+
+def test_iaaft2_has_exact_spectrum():
+    sig = _signal()
+    surr, params = surrogate_calc(sig, 5, "IAAFT2", False, 10, seed=0)
+
+    np.testing.assert_allclose(
+        np.abs(np.fft.rfft(surr, axis=1)), np.tile(np.abs(np.fft.rfft(sig)), (5, 1))
+    )
+    assert params.iterations.shape == (5,)
+
+
+def test_iaaft_is_reproducible():
+    sig = _signal()
+
+    for method in ("IAAFT1", "IAAFT2"):
+        surr1, params1 = surrogate_calc(sig, 3, method, False, 10, seed=5)
+        surr2, params2 = surrogate_calc(sig, 3, method, False, 10, seed=5)
+
+        np.testing.assert_array_equal(surr1, surr2)
+        np.testing.assert_array_equal(params1.iterations, params2.iterations)
+
+
+@pytest.mark.parametrize("max_iterations", [2, 5])
+def test_iaaft_honours_max_iterations(max_iterations):
+    sig = _signal()
+    _, params = surrogate_calc(
+        sig, 4, "IAAFT1", False, 10, seed=0, max_iterations=max_iterations
+    )
+
+    # As in MODA, the iterations stop when the counter reaches the maximum.
+    assert np.all(params.iterations == max_iterations - 1)
+
+
+def test_iaaft_active_set_matches_single_surrogates():
+    sig = _signal()
+    rng = np.random.default_rng(0)
+    initial = np.array([sig[rng.permutation(len(sig))] for _ in range(6)])
+
+    for exact_spectrum in (False, True):
+        surr, iterations = surrogates._iterative_amplitude_adjusted(
+            sig, 6, rng, exact_spectrum, 1000, initial=initial
+        )
+
+        # The surrogates converge after different numbers of iterations, so they leave the
+        # batch at different times.
+        assert len(set(iterations)) > 1
+
+        for k in range(6):
+            single, single_iterations = surrogates._iterative_amplitude_adjusted(
+                sig, 1, rng, exact_spectrum, 1000, initial=initial[k : k + 1]
+            )
+
+            np.testing.assert_allclose(single[0], surr[k], rtol=0, atol=1e-12)
+            assert single_iterations[0] == iterations[k]
+
+
+def _state(seed: np.random.SeedSequence) -> np.ndarray:
+    return seed.generate_state(4)
+
+
+@pytest.mark.parametrize("N", [1, 4, 10, 17])
+def test_surrogate_stream_matches_chunks(N):
+    sig = _signal(200)
+    seed = np.random.SeedSequence(3)
+    size = surrogates.surrogate_chunk_size
+
+    result = np.array(list(surrogate_stream(sig, N, "FT", False, 10, seed=seed)))
+    assert result.shape == (N, len(sig))
+
+    # Each chunk is generated by `surrogate_calc` from its own child seed.
+    seeds = spawn_seeds(seed, len(range(0, N, size)))
+    for c, start in enumerate(range(0, N, size)):
+        n = min(size, N - start)
+        expected, _ = surrogate_calc(sig, n, "FT", False, 10, seeds[c])
+        np.testing.assert_array_equal(result[start : start + n], expected)
+
+
+@pytest.mark.parametrize("method", ["RP", "AAFT", "IAAFT2"])
+def test_surrogate_stream_does_not_depend_on_parts(method):
+    sig = _signal(200)
+    N = 10
+
+    expected = np.array(list(surrogate_stream(sig, N, method, False, 10, seed=11)))
+
+    for parts in range(1, 6):
+        chunks = surrogate_chunks(N, parts)
+        result = np.array(
+            [
+                s
+                for c in chunks
+                for s in surrogate_stream(sig, N, method, False, 10, 11, chunks=c)
+            ]
+        )
+
+        np.testing.assert_array_equal(result, expected)
+
+
+def test_surrogate_stream_is_reproducible():
+    sig = _signal(200)
+
+    def stream(seed):
+        return np.array(list(surrogate_stream(sig, 6, "RP", False, 10, seed=seed)))
+
+    np.testing.assert_array_equal(stream(1), stream(np.random.SeedSequence(1)))
+    assert not np.array_equal(stream(1), stream(2))
+    assert not np.array_equal(stream(None), stream(None))
+
+
+def test_surrogate_stream_passes_options():
+    sig = _signal(200)
+    (seed,) = spawn_seeds(0, 1)
+
+    surr = np.array(
+        list(surrogate_stream(sig, 3, "IAAFT1", True, 10, seed=0, max_iterations=2))
+    )
+    expected, params = surrogate_calc(
+        sig, 3, "IAAFT1", True, 10, seed, max_iterations=2
+    )
+    converged, _ = surrogate_calc(sig, 3, "IAAFT1", True, 10, seed)
+
+    # The signal is cut by pre-processing.
+    assert surr.shape == (3, params.sigend - params.sigstart)
+    np.testing.assert_array_equal(surr, expected)
+    assert not np.array_equal(surr, converged)
+
+
+@pytest.mark.parametrize("N", [0, 1, 4, 5, 30, 101])
+@pytest.mark.parametrize("parts", [1, 2, 3, 8, 100])
+def test_surrogate_chunks_cover_all_chunks(N, parts):
+    count = len(range(0, N, surrogates.surrogate_chunk_size))
+    chunks = surrogate_chunks(N, parts)
+
+    assert 1 <= len(chunks) <= max(1, min(count, parts))
+    assert [c for r in chunks for c in r] == list(range(count))
+
+    # The parts are balanced.
+    sizes = [len(r) for r in chunks]
+    assert max(sizes) - min(sizes) <= 1
+
+
+def test_spawn_seeds_do_not_depend_on_previous_spawns():
+    seed = np.random.SeedSequence(5)
+    expected = [_state(s) for s in spawn_seeds(seed, 3)]
+
+    seed.spawn(2)
+    result = [_state(s) for s in spawn_seeds(seed, 3)]
+    longer = [_state(s) for s in spawn_seeds(5, 6)]
+
+    np.testing.assert_array_equal(result, expected)
+    np.testing.assert_array_equal(longer[:3], expected)
+
+
+def test_spawn_seeds_are_independent():
+    seeds = spawn_seeds(5, 4)
+    grandchildren = spawn_seeds(seeds[0], 4)
+    states = {_state(s).tobytes() for s in seeds + grandchildren}
+
+    assert len(states) == 8
+    assert _state(np.random.SeedSequence(5)).tobytes() not in states
+
+    # Without a seed, fresh entropy is used.
+    assert not np.array_equal(
+        _state(spawn_seeds(None, 1)[0]), _state(spawn_seeds(None, 1)[0])
+    )
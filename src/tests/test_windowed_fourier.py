@@ -0,0 +1,102 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import numpy as np
+import pytest
+
+from maths.algorithms import windowed_fourier
+from maths.params.TFParams import _fmax, _fmin, _f0, _padding, _preprocess, _window
+
+fs = 20.0
+t = np.arange(2000) / fs
+
+# Two tones and a chirp, whose frequencies are well inside the range of the transform.
+signal = (
+    np.cos(2 * np.pi * 1.1 * t)
+    + 0.5 * np.sin(2 * np.pi * 2.3 * t + 0.4)
+    + 0.3 * np.cos(2 * np.pi * (0.5 * t + 0.01 * t**2))
+)
+
+
+@pytest.mark.parametrize(
+    "window, tolerance",
+    [
+        ("Gaussian", 1e-10),
+        ("Hann", 1e-4),
+        ("Blackman", 1e-4),
+        # The spectrum of the Kaiser window decays slowly, so it is truncated at the
+        # relative tolerance.
+        ("Kaiser-3", 0.02),
+    ],
+)
+def test_wft_matches_direct_sum(window, tolerance):
+    wft, freq = windowed_fourier.wft(
+        signal, fs, fmin=0.5, fmax=4, window=window, padding=0, preprocess=False
+    )
+    wp = windowed_fourier.window_parameters(window, 1, 0.01)
+
+    # Times far enough from the edges that the padding has no effect.
+    cols = np.arange(400, 1600, 97)
+
+    expected = np.empty((len(freq), len(cols)), dtype=np.complex128)
+    for i, k in enumerate(cols):
+        u = t - t[k]
+        expected[:, i] = (
+            (signal * wp.twf(u)) @ np.exp(-2j * np.pi * np.outer(u, freq)) / fs
+        )
+
+    error = np.max(np.abs(wft[:, cols] - expected)) / np.max(np.abs(expected))
+    assert error < tolerance
+
+
+@pytest.mark.parametrize("window", ["Kaiser-a", "Kaiser", "Kaiser-"])
+def test_kaiser_window_requires_shape_parameter(window):
+    with pytest.raises(ValueError):
+        windowed_fourier.window_functions(window, 1)
+
+
+def test_wft_matches_matlab():
+    """
+    Compares the transform with the MATLAB-packaged WFT, when the MATLAB Runtime is available.
+    """
+    pytest.importorskip("matlab")
+
+    from maths.algorithms.matlabwrappers.packages import get_package
+    from maths.num_utils import numpy_to_matlab, matlab_to_numpy
+
+    try:
+        package = get_package("WFT")
+    except Exception as e:
+        pytest.skip(f"The MATLAB-packaged WFT is not available: {e}")
+
+    params = {
+        _fmin: 0.5,
+        _fmax: 4.0,
+        _f0: 1.0,
+        _window: "Gaussian",
+        _padding: "predictive",
+        _preprocess: "on",
+    }
+    expected, expected_freq = package.wft(
+        numpy_to_matlab(signal), fs, params, nargout=2
+    )
+    expected = matlab_to_numpy(expected)
+    expected_freq = matlab_to_numpy(expected_freq).flatten()
+
+    wft, freq = windowed_fourier.wft(signal, fs, fmin=0.5, fmax=4, f0=1)
+
+    np.testing.assert_allclose(freq, expected_freq, rtol=1e-9)
+    error = np.max(np.abs(wft - expected)) / np.max(np.abs(expected))
+    assert error < 1e-3
@@ -0,0 +1,116 @@
+#  PyMODA, a Python implementation of MODA (Multiscale Oscillatory Dynamics Analysis).
+#  Copyright (C) 2020 Lancaster University
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import asyncio
+import os
+import time
+
+import pytest
+from scheduler.utils import TaskFailedException
+
+from processes.WorkerPool import WorkerPool
+
+
+def _square(x, delay=0.0):
+    time.sleep(delay)
+    return x * x
+
+
+def _raise(message):
+    raise ValueError(message)
+
+
+@pytest.fixture
+def pool(default_args):
+    pool = WorkerPool(processes=3, update_interval=0.01)
+    yield pool
+    pool.shutdown()
+
+
+def _run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_results_are_in_task_order(pool):
+    # Later tasks finish first.
+    args = [(i, 0.05 * (9 - i) / 9) for i in range(10)]
+
+    assert _run(pool.map(_square, args)) == [i * i for i in range(10)]
+
+    stats = pool.stats()
+    assert (stats.submitted, stats.completed, stats.failed, stats.cancelled) == (
+        10,
+        10,
+        0,
+        0,
+    )
+    assert stats.pending_tasks == 0 and stats.busy_workers == 0
+    assert stats.busy_time > 0
+
+
+def test_cancel_replaces_busy_workers(pool):
+    async def cancel_after_start():
+        batch_ids = []
+        task = asyncio.ensure_future(
+            pool.map(
+                _square, [(i, 60) for i in range(5)], on_submitted=batch_ids.append
+            )
+        )
+
+        # The first three tasks are running, and two are pending.
+        await asyncio.sleep(0.2)
+        assert pool.stats().busy_workers == 3
+        assert pool.stats().pending_tasks == 2
+
+        pool.cancel(batch_ids[0])
+        return await task
+
+    start = time.time()
+    assert _run(cancel_after_start()) == []
+    assert time.time() - start < 30
+
+    stats = pool.stats()
+    assert stats.cancelled == 5 and stats.respawned == 3
+    assert stats.workers == 3 and stats.busy_workers == 0 and stats.pending_tasks == 0
+
+    # The replacement workers run the next batch.
+    assert _run(pool.map(_square, [(i,) for i in range(6)])) == [0, 1, 4, 9, 16, 25]
+    assert pool.stats().completed == 6
+
+
+def test_task_error_is_raised(pool):
+    args = [("first",), ("second",)] + [(f"{i}",) for i in range(4)]
+
+    with pytest.raises(TaskFailedException, match="ValueError"):
+        _run(pool.map(_raise, args))
+
+    stats = pool.stats()
+    assert stats.failed == 1
+    assert stats.submitted == stats.completed + stats.failed + stats.cancelled
+
+    # The pool is still usable.
+    assert _run(pool.map(_square, [(3,)])) == [9]
+
+
+def test_exited_worker_fails_task(pool):
+    with pytest.raises(TaskFailedException, match="exited"):
+        _run(pool.map(os._exit, [(1,)]))
+
+    stats = pool.stats()
+    assert stats.failed == 1 and stats.respawned == 1 and stats.workers == 3
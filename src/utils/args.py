@@ -87,6 +87,68 @@ def parser() -> ArgumentParser:
         default=False,
         help="Switch to the Python implementation of the wavelet transform.",
     )
+    p.add_argument(
+        "--python-wft",
+        action="store_true",
+        default=False,
+        help="Switch to the Python implementation of the windowed Fourier transform.",
+    )
+    p.add_argument(
+        "--worker-pool",
+        action="store_true",
+        default=False,
+        help="Keep a pool of worker processes alive between calculations, instead of "
+        "starting new processes for every calculation.",
+    )
+    p.add_argument(
+        "--wt-block-size",
+        action="store",
+        type=int,
+        default=None,
+        help="Calculate the wavelet transform of signals longer than this number of samples "
+        "in overlapping blocks, writing the result to disk instead of keeping it in memory.",
+    )
+    p.add_argument(
+        "--wt-cache-size",
+        action="store",
+        type=float,
+        default=0,
+        help="The maximum size of the cache of wavelet transforms, in MB. Transforms are cached "
+        "so that they are not recalculated with the same signal and parameters. The cache is "
+        "disabled by default (0).",
+    )
+    p.add_argument(
+        "--biphase-grid",
+        action="store",
+        type=int,
+        default=0,
+        help="In bispectrum analysis, calculate the biphase and biamplitude for a grid of this "
+        "many frequencies on each axis after the bispectra, so that selecting a point near the "
+        "grid is instant. Uses memory proportional to the square of the grid size.",
+    )
+    p.add_argument(
+        "--surr-percentile",
+        action="store",
+        type=float,
+        default=None,
+        help="In phase coherence, calculate this percentile of the coherence of the surrogates "
+        "as a significance threshold, which is saved with the results.",
+    )
+    p.add_argument(
+        "--surr-seed",
+        action="store",
+        type=int,
+        default=None,
+        help="The seed of the surrogates in phase coherence and bispectrum analysis, so that "
+        "repeated calculations give the same results.",
+    )
+    p.add_argument(
+        "--keep-surrogates",
+        action="store_true",
+        default=False,
+        help="In bispectrum analysis, keep the bispectrum of every surrogate and save them with "
+        "the results. Uses memory proportional to the number of surrogates.",
+    )
     p.add_argument(
         "--create-shortcut",
         action="store_true",
@@ -247,3 +309,93 @@ def from_shortcut() -> bool:
     Returns whether the --from-shortcut argument was passed.
     """
     return args and args.from_shortcut
+
+
+@initargs
+def python_wft() -> bool:
+    """
+    Returns
+    -------
+    bool
+        Whether to use the Python implementation of the windowed Fourier transform.
+    """
+    return args and args.python_wft
+
+
+@initargs
+def worker_pool() -> bool:
+    """
+    Returns
+    -------
+    bool
+        Whether to use a persistent pool of worker processes for calculations.
+    """
+    return args and args.worker_pool
+
+
+@initargs
+def wt_block_size() -> Optional[int]:
+    """
+    Returns
+    -------
+    Optional[int]
+        The signal length, in samples, above which the wavelet transform is calculated in blocks.
+    """
+    return args and args.wt_block_size
+
+
+@initargs
+def wt_cache_size() -> float:
+    """
+    Returns
+    -------
+    float
+        The maximum size of the cache of wavelet transforms, in MB. If 0, the cache is disabled.
+    """
+    return args.wt_cache_size if args else 0
+
+
+@initargs
+def biphase_grid() -> int:
+    """
+    Returns
+    -------
+    int
+        The number of frequencies on each axis of the grid of precalculated biphases, or 0
+        if biphases are only calculated when a point is selected.
+    """
+    return args.biphase_grid if args else 0
+
+
+@initargs
+def surr_percentile() -> Optional[float]:
+    """
+    Returns
+    -------
+    Optional[float]
+        The percentile of the surrogates used as a significance threshold in phase coherence,
+        or None if only the mean of the surrogates is calculated.
+    """
+    return args.surr_percentile if args else None
+
+
+@initargs
+def surr_seed() -> Optional[int]:
+    """
+    Returns
+    -------
+    Optional[int]
+        The seed of the surrogates, or None if the surrogates are different every time.
+    """
+    return args.surr_seed if args else None
+
+
+@initargs
+def keep_surrogates() -> bool:
+    """
+    Returns
+    -------
+    bool
+        Whether to keep the bispectrum of every surrogate in bispectrum analysis.
+    """
+    return args and args.keep_surrogates
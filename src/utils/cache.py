@@ -13,10 +13,20 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program. If not, see <https://www.gnu.org/licenses/>.
+import contextlib
+import hashlib
+import json
 import os
+import pickle
 import shutil
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, Iterator, List, Optional
 
-import scipy.io
+import numpy as np
+from dataclasses import dataclass
+from numpy import ndarray
 
 
 def clear():
@@ -24,14 +34,59 @@ def clear():
     c.clear_all()
 
 
+@dataclass
+class CacheEntry:
+    """
+    The metadata of an entry in the cache index.
+    """
+
+    key: str
+
+    # Path of the file or folder, relative to the cache folder.
+    path: str
+
+    # Size in bytes.
+    size: int
+
+    # Creation time and last access time, in seconds since the epoch.
+    created: float
+    accessed: float
+
+    # The parameters which produced the entry, if provided.
+    source: Optional[Dict]
+
+
 class Cache:
+    """
+    Class which handles the cache folder.
+
+    The cache is a content-addressed store: an entry is saved with `store()` under a key created
+    by `key()`, which is a hash of the inputs which produced it. Arrays in an entry are saved in
+    ".npy" format, so they can be loaded as memory-mapped arrays.
+
+    All files are recorded in an SQLite index, which contains the size, creation time, last access
+    time and source parameters of each entry. When the total size exceeds `max_size`, the least
+    recently used entries are removed.
+    """
 
-    def __init__(self):
+    _index_name = "index.sqlite"
+
+    def __init__(self, max_size: Optional[int] = None):
+        """
+        :param max_size: the maximum total size of the cache, in bytes; if None, there is no limit
+        """
         self.cache = self.get_cache_location()
-        try:
-            os.mkdir(self.cache)
-        except:
-            pass
+        self.entries = os.path.join(self.cache, "entries")
+        self.index = os.path.join(self.cache, self._index_name)
+        self.max_size = max_size
+
+        for d in (self.cache, self.entries):
+            try:
+                os.mkdir(d)
+            except:
+                pass
+
+        self._init_index()
 
     @staticmethod
     def get_cache_location() -> str:
@@ -47,29 +102,9 @@ class Cache:
     def get_file_names(self) -> list:
         return os.listdir(self.cache)
 
-    def generate_file_name(self, extension=".mat") -> str:
-        # Get names of existing files without their file extensions.
-        names = [".".join(name.split(".")[:-1]) for name in self.get_file_names()]
-
-        i = -1
-        while True:
-            i += 1
-            n = self._name_template(i)
-
-            if n not in names:
-                break
-
-        return f"{n}{extension}"
-
     def get_path_to(self, file: str) -> str:
         return f"{self.cache}/{file}"
 
-    def save_data(self, **kwargs) -> str:
-        name = self.generate_file_name()
-        path = self.get_path_to(name)
-        scipy.io.savemat(path, kwargs)
-        return path
-
     def clear_all(self):
         """
         Removes the cache folder and all its contents.
@@ -82,3 +117,260 @@ class Cache:
     @staticmethod
     def _name_template(index) -> str:
         return f"data{index}"
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        """
+        Creates a key from the inputs of a calculation. Arrays are hashed by their contents;
+        other objects must be representable as JSON (dictionary keys are sorted).
+
+        :param parts: the inputs of the calculation
+        :return: the key, as a hexadecimal string
+        """
+        h = hashlib.blake2b(digest_size=20)
+
+        for part in parts:
+            if isinstance(part, ndarray):
+                arr = np.ascontiguousarray(part)
+                h.update(f"{arr.dtype.str}{arr.shape}".encode())
+                h.update(memoryview(arr).cast("B"))
+            else:
+                h.update(json.dumps(part, sort_keys=True, default=str).encode())
+
+            h.update(b"|")
+
+        return h.hexdigest()
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Loads an entry from the store. Arrays are memory-mapped in read-only mode.
+
+        :param key: the key of the entry
+        :return: dictionary containing the items of the entry, or None if there is no entry
+        with the key
+        """
+        entry = self.get_entry(key)
+        if entry is None:
+            return None
+
+        path = self.get_path_to(entry.path)
+
+        try:
+            with open(os.path.join(path, "items.pickle"), "rb") as f:
+                items: Dict[str, Any] = pickle.load(f)
+
+            for name in os.listdir(path):
+                if name.endswith(".npy"):
+                    items[name[:-4]] = np.load(os.path.join(path, name), mmap_mode="r")
+        except (OSError, EOFError, pickle.UnpicklingError, ValueError):
+            # The entry was removed or damaged outside of the cache.
+            self._remove_entries([entry])
+            return None
+
+        with self._connect() as db:
+            db.execute(
+                "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key)
+            )
+
+        return items
+
+    def store(self, key: str, source: Dict = None, **items: Any) -> None:
+        """
+        Saves an entry in the store. If an entry with the same key exists, it is not replaced.
+
+        :param key: the key of the entry
+        :param source: the parameters which produced the entry, which will be stored in the index
+        :param items: the items to save; arrays are saved in ".npy" format and other items
+        are pickled
+        """
+        relative = f"entries/{key}"
+        path = self.get_path_to(relative)
+
+        if os.path.exists(path):
+            # The entry may be missing from the index if a process was stopped after saving it.
+            if self.get_entry(key) is None:
+                self._add_entry(key, relative, _size_of(path), source)
+            return
+
+        # Write to a temporary folder first, so that other processes never see a partial entry.
+        tmp = tempfile.mkdtemp(prefix=f".{key}-", dir=self.entries)
+        try:
+            other = {}
+            for name, value in items.items():
+                if isinstance(value, ndarray) and value.dtype != object:
+                    np.save(os.path.join(tmp, f"{name}.npy"), value)
+                else:
+                    other[name] = value
+
+            with open(os.path.join(tmp, "items.pickle"), "wb") as f:
+                pickle.dump(other, f)
+
+            size = _size_of(tmp)
+            os.rename(tmp, path)
+        except Exception:
+            # Another process may have stored the same entry, the disk may be full,
+            # or an item may not be picklable. The cache must never cause a calculation to fail.
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        self._add_entry(key, relative, size, source)
+        self.evict()
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """
+        Returns the metadata of an entry, or None if there is no entry with the key.
+        """
+        with self._connect() as db:
+            row = db.execute(
+                "SELECT key, path, size, created, accessed, source FROM entries WHERE key = ?",
+                (key,),
+            ).fetchone()
+
+        return _to_entry(row) if row else None
+
+    def total_size(self) -> int:
+        """
+        Returns the total size of all entries in the index, in bytes.
+        """
+        with self._connect() as db:
+            row = db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+
+        return row[0]
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries until the total size is at most `max_size`.
+        """
+        if self.max_size is None:
+            return
+
+        total = self.total_size()
+        while total > self.max_size:
+            with self._connect() as db:
+                rows = db.execute(
+                    "SELECT key, path, size, created, accessed, source FROM entries "
+                    "ORDER BY accessed LIMIT 64"
+                ).fetchall()
+
+            if not rows:
+                break
+
+            remove = []
+            for row in rows:
+                if total <= self.max_size:
+                    break
+
+                entry = _to_entry(row)
+                remove.append(entry)
+                total -= entry.size
+
+            self._remove_entries(remove)
+
+    def _add_entry(
+        self, key: str, path: str, size: int, source: Optional[Dict]
+    ) -> None:
+        now = time.time()
+        source = json.dumps(source, default=str) if source is not None else None
+
+        with self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO entries (key, path, size, created, accessed, source) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, path, size, now, now, source),
+            )
+
+    def _remove_entries(self, entries: List[CacheEntry]) -> None:
+        for e in entries:
+            path = self.get_path_to(e.path)
+
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._connect() as db:
+            db.executemany(
+                "DELETE FROM entries WHERE key = ?", [(e.key,) for e in entries]
+            )
+
+    @contextlib.contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Context manager which opens a connection to the index, commits the transaction on exit,
+        and closes the connection. Connections are not kept open, because they cannot be shared
+        with other processes and worker processes may never close them.
+        """
+        db = sqlite3.connect(self.index, timeout=30)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _init_index(self) -> None:
+        """
+        Creates the index if it does not exist. Files which were already in the cache folder
+        are added to the new index.
+        """
+        exists = os.path.exists(self.index)
+
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL, source TEXT)"
+            )
+            db.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)"
+            )
+
+        if not exists:
+            self._index_existing_files()
+
+    def _index_existing_files(self) -> None:
+        rows = []
+
+        for name in os.listdir(self.entries):
+            if not name.startswith("."):
+                rows.append((name, f"entries/{name}"))
+
+        for name in os.listdir(self.cache):
+            if name.startswith(self._name_template("")):
+                rows.append((name, name))
+
+        with self._connect() as db:
+            for key, path in rows:
+                full_path = self.get_path_to(path)
+                mtime = os.stat(full_path).st_mtime
+
+                db.execute(
+                    "INSERT OR IGNORE INTO entries (key, path, size, created, accessed, source) "
+                    "VALUES (?, ?, ?, ?, ?, NULL)",
+                    (key, path, _size_of(full_path), mtime, mtime),
+                )
+
+
+def _size_of(path: str) -> int:
+    """
+    Returns the size of a file, or the total size of the files in a folder.
+    """
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+
+def _to_entry(row: tuple) -> CacheEntry:
+    key, path, size, created, accessed, source = row
+
+    return CacheEntry(
+        key=key,
+        path=path,
+        size=size,
+        created=created,
+        accessed=accessed,
+        source=json.loads(source) if source else None,
+    )